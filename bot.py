@@ -1,6 +1,14 @@
 """Главный файл бота"""
+import argparse
 import asyncio
 import logging
+import os
+import signal
+import time
+from contextlib import suppress
+from datetime import timedelta
+from typing import Optional
+from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import Update
@@ -8,13 +16,33 @@ from aiogram.exceptions import TelegramBadRequest
 
 import config
 import database
-from handlers import start, profile, matches, help
+from handlers import start, profile, matches, help, admin
+from middlewares.callback_answer import EarlyCallbackAnswerMiddleware
+from middlewares.dedup import DeduplicationMiddleware
+from middlewares.in_flight import InFlightMiddleware
+from middlewares.log_context import LogContextMiddleware
+from middlewares.profiler import ProfilerMiddleware
+from middlewares.tracing import BotApiTracingMiddleware, TracingMiddleware
+from middlewares.update_tracker import UpdateTracker
+from utils.backup import BackupScheduler
+from utils.bot_session import create_bot_session
+from utils.change_feed import ChangeFeed, ExternalWriteWatcher
+from utils.debounce import keyboard_debouncer
+from utils.logs import configure_from_config
+from utils.loop_monitor import LoopWatchdog
+from utils.maintenance import MaintenanceScheduler
+from utils.match_index import match_index
+from utils.match_queue import recheck_queue
+from utils.metrics import MetricsReporter
+from utils.memory import MemoryMonitor, register_fsm_storage, register_store
+from utils.notifications import match_notifier
+from utils.profiler import profiler
+from utils.snapshot import load_snapshot, save_snapshot
+from utils.groups import catalog
+from utils.sweep import run_periodic_sweep
+from utils.tracing import JsonlExporter, OTLPExporter, tracer
+from utils.traffic import TrafficRecorder
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 
@@ -33,39 +61,350 @@ async def handle_errors(update: Update, exception: Exception):
             
             try:
                 await database.delete_user(user_id)
-                logger.info(f"Пользователь {user_id} заблокировал бота, удалён из базы")
+                logger.info("Пользователь %s заблокировал бота, удалён из базы", user_id)
             except Exception as e:
-                logger.error(f"Ошибка при удалении пользователя {user_id}: {e}")
+                logger.error("Ошибка при удалении пользователя %s: %s", user_id, e)
     
     return True
 
 
-async def main():
-    """Главная функция запуска бота"""
-    # Инициализация бота и диспетчера
-    bot = Bot(token=config.BOT_TOKEN)
-    dp = Dispatcher(storage=MemoryStorage())
-    
-    # Регистрация обработчика ошибок
+async def save_match_index_snapshot(change_feed: Optional[ChangeFeed] = None,
+                                    watcher: Optional[ExternalWriteWatcher] = None):
+    """
+    Снимок индекса мэтчей для быстрого следующего запуска.
+    Другие воркеры могут писать в БД до последнего момента: счётчик читается до финального
+    чтения журнала, поэтому все изменения, которые он учитывает, уже есть в индексе.
+    Более поздние изменения сдвинут счётчик, и при запуске снимок не подойдёт.
+    Без журнала индекс знает только свои записи: если после последней проверки watcher
+    БД меняли в обход бота (manage.py import, restore), снимок не сохраняется.
+    """
+    if not match_index.ready:
+        return
+    try:
+        change_counter = await database.get_change_counter()
+        if change_feed is not None:
+            await change_feed.poll()
+        elif watcher is not None:
+            foreign = await watcher.external_changes()
+            if foreign:
+                logger.warning(
+                    "Снимок индекса мэтчей не сохранён: БД изменена в обход бота (%s изменений), "
+                    "при запуске индекс загрузится из БД", foreign
+                )
+                with suppress(FileNotFoundError):
+                    os.remove(config.MATCH_INDEX_SNAPSHOT_PATH)
+                return
+        size = save_snapshot(match_index, config.MATCH_INDEX_SNAPSHOT_PATH, change_counter)
+        logger.info("Снимок индекса мэтчей сохранён (%s байт)", size)
+    except Exception as e:
+        logger.error("Не удалось сохранить снимок индекса мэтчей: %s", e)
+
+
+def install_signal_handlers(stop_requested: asyncio.Event):
+    """
+    SIGTERM/SIGINT: первый сигнал запускает мягкую остановку,
+    повторный — прерывает её без ожидания.
+    """
+    loop = asyncio.get_running_loop()
+    main_task = asyncio.current_task()
+
+    def _on_signal(sig: signal.Signals):
+        if stop_requested.is_set():
+            logger.warning("Повторный %s: остановка без ожидания", sig.name)
+            main_task.cancel()
+            return
+        logger.info("Получен %s: приём апдейтов остановлен, завершаем начатую работу", sig.name)
+        stop_requested.set()
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        # На Windows обработчики сигналов в цикле событий не поддерживаются
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, _on_signal, sig)
+
+    # SIGUSR1: профилирование на PROFILE_DEFAULT_SECONDS секунд (файлы — в PROFILE_DIR)
+    if hasattr(signal, "SIGUSR1"):
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(signal.SIGUSR1, profiler.start)
+
+
+async def run_until_stopped(dp: Dispatcher, bot: Bot, stop_requested: asyncio.Event):
+    """Polling до сигнала остановки; сессия бота остаётся открытой для дожидающихся уведомлений"""
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False))
+    stop_wait = asyncio.create_task(stop_requested.wait())
+    await asyncio.wait({polling, stop_wait}, return_when=asyncio.FIRST_COMPLETED)
+    stop_wait.cancel()
+    if not polling.done():
+        await dp.stop_polling()
+    await polling
+
+
+async def serve_updates(dp: Dispatcher, bot: Bot, port: int, stop_requested: asyncio.Event):
+    """
+    Режим воркера: апдейты приходят от supervisor.py по HTTP на 127.0.0.1:port.
+    Ответ фронтенду отправляется сразу, апдейт обрабатывается в фоне.
+    """
+    processing = set()
+
+    async def _process(update: dict):
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception as e:
+            logger.exception("Ошибка обработки апдейта %s: %s", update.get('update_id'), e)
+
+    async def _handle(request: web.Request) -> web.Response:
+        task = asyncio.create_task(_process(await request.json()))
+        processing.add(task)
+        task.add_done_callback(processing.discard)
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post("/update", _handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    try:
+        await stop_requested.wait()
+    finally:
+        # Новые апдейты больше не принимаются; начатые дожидается shutdown()
+        await runner.cleanup()
+
+
+async def shutdown(bot: Bot, in_flight: InFlightMiddleware, sweep_stop: asyncio.Event,
+                   sweep_task: Optional[asyncio.Task], change_feed: Optional[ChangeFeed] = None,
+                   primary: bool = True, watcher: Optional[ExternalWriteWatcher] = None):
+    """
+    Мягкая остановка за SHUTDOWN_TIMEOUT секунд: дожидаемся начатых хендлеров,
+    отложенных перерисовок, перепроверок и периодической проверки мэтчей,
+    затем сохраняем снимок индекса и закрываем хранилище.
+    """
+    deadline = time.monotonic() + config.SHUTDOWN_TIMEOUT
+
+    def remaining() -> float:
+        return max(0.0, deadline - time.monotonic())
+
+    if not await in_flight.wait_idle(remaining()):
+        logger.warning("Не дождались завершения апдейтов: %s", in_flight.count)
+    try:
+        await asyncio.wait_for(keyboard_debouncer.flush(), remaining())
+    except asyncio.TimeoutError:
+        logger.warning("Не дождались отложенных перерисовок клавиатур")
+
+    sweep_stop.set()
+    await recheck_queue.drain(remaining())
+    if sweep_task is not None:
+        try:
+            await asyncio.wait_for(sweep_task, remaining())
+        except asyncio.TimeoutError:
+            logger.warning("Периодическая проверка мэтчей прервана")
+    if change_feed is not None:
+        await change_feed.stop()
+    if watcher is not None:
+        await watcher.stop()
+    # Дайджесты, ожидающие окна, отправляются сразу
+    try:
+        await asyncio.wait_for(match_notifier.flush(), remaining())
+    except asyncio.TimeoutError:
+        logger.warning("Не отправлены дайджесты мэтчей: %s", match_notifier.pending_count())
+
+    # Снимок общий для всех воркеров — его пишет только основной
+    if primary:
+        await save_match_index_snapshot(change_feed, watcher)
+    # Писатель БД фиксирует все принятые изменения перед закрытием
+    await database.close_storage()
+    await bot.session.close()
+    logger.info("Бот остановлен")
+
+
+def register_handlers(dp: Dispatcher):
+    """Роутеры, обработчик ошибок и middleware, от которых зависят ответы бота (общие с manage.py replay)"""
     dp.errors.register(handle_errors)
     
+    # Повторная доставка и двойные нажатия не доходят до хендлеров
+    dedup = DeduplicationMiddleware(config.UPDATE_DEDUP_TTL, config.CALLBACK_DEDUP_WINDOW)
+    dp.update.outer_middleware(dedup)
+    register_store("dedup_keys", dedup.size)
+    
+    # Ответ на нажатия кнопок не дожидается окончания работы хендлеров
+    dp.callback_query.middleware(EarlyCallbackAnswerMiddleware(config.CALLBACK_ANSWER_DEADLINE))
+    
     # Регистрация роутеров
     dp.include_router(start.router)
     dp.include_router(profile.router)
     dp.include_router(matches.router)
     dp.include_router(help.router)
+    dp.include_router(admin.router)
+
+
+def create_trace_exporter(worker: Optional[int] = None):
+    """Экспортёр спанов по конфигурации: файл JSONL (у каждого воркера свой) или коллектор OTLP"""
+    if config.TRACE_EXPORTER == "otlp":
+        return OTLPExporter(config.TRACE_OTLP_ENDPOINT)
+    if config.TRACE_EXPORTER == "jsonl":
+        path = config.TRACE_JSONL_PATH
+        return JsonlExporter(path if worker is None else f"{path}.{worker}")
+    raise ValueError(f"Неизвестный экспортёр трасс: {config.TRACE_EXPORTER}")
+
+
+async def main(worker: Optional[int] = None):
+    """
+    Главная функция запуска бота.
+    Без worker — один процесс с polling; с worker — воркер под supervisor.py.
+    """
+    # Основной процесс (или воркер 0) выполняет общие для всех фоновые задачи
+    primary = not worker
+    
+    # Инициализация бота и диспетчера
+    bot = Bot(token=config.BOT_TOKEN, session=create_bot_session())
+    dp = Dispatcher(storage=MemoryStorage())
+    register_fsm_storage(dp.storage)
+    
+    # Запись входящих апдейтов для воспроизведения (manage.py replay)
+    recorder = None
+    if config.TRAFFIC_RECORD_PATH:
+        path = config.TRAFFIC_RECORD_PATH
+        recorder = TrafficRecorder(path if worker is None else f"{path}.{worker}", config.TRAFFIC_RECORD_SALT)
+        dp.update.outer_middleware(recorder)
+    
+    # Учёт апдейтов в обработке (для мягкой остановки)
+    in_flight = InFlightMiddleware()
+    dp.update.outer_middleware(in_flight)
+    
+    # Контекст апдейта (update_id, user_id, хендлер) для записей лога
+    log_context = LogContextMiddleware()
+    dp.update.outer_middleware(log_context)
+    
+    # Профилирование по запросу (/profile, SIGUSR1)
+    dp.update.outer_middleware(ProfilerMiddleware(profiler))
+    
+    # Трассировка: спан на апдейт, хендлер, вызов database.* и метод Bot API
+    tracing = TracingMiddleware()
+    if config.TRACE_SAMPLE_RATE > 0:
+        tracer.configure(config.TRACE_SAMPLE_RATE, create_trace_exporter(worker))
+        dp.update.outer_middleware(tracing)
+        bot.session.middleware(BotApiTracingMiddleware())
+    
+    # Хендлеры и всё, что влияет на их поведение
+    register_handlers(dp)
+    
+    # Какие хендлеры выполняются — для отчётов о задержках цикла событий
+    tracker = UpdateTracker()
+    dp.message.middleware(tracker)
+    dp.callback_query.middleware(tracker)
+    dp.message.middleware(log_context)
+    dp.callback_query.middleware(log_context)
+    if tracer.enabled:
+        dp.message.middleware(tracing)
+        dp.callback_query.middleware(tracing)
     
     # Инициализация базы данных
     await database.init_db()
+    await database.open_storage()
     logger.info("База данных инициализирована")
     
+    # Изменения других воркеров подтягиваются в индекс по журналу
+    change_feed = None
+    if config.WORKERS > 1:
+        change_feed = ChangeFeed(config.CHANGE_FEED_INTERVAL, prune_keep=config.CHANGE_LOG_KEEP if primary else None)
+        await change_feed.mark()
+    
+    # В одном процессе записи в обход бота (manage.py import) замечаются по счётчику изменений
+    watcher = None
+    if config.WORKERS == 1:
+        watcher = ExternalWriteWatcher(config.EXTERNAL_WRITE_CHECK_INTERVAL)
+        await watcher.mark()
+    
+    # Каталог групп и индекс мэтчей в памяти
+    catalog.load(await database.get_programs(), await database.get_groups())
+    started = time.monotonic()
+    if load_snapshot(match_index, config.MATCH_INDEX_SNAPSHOT_PATH, await database.get_change_counter()):
+        source = "снимка"
+    else:
+        await database.load_match_index()
+        source = "БД"
+    logger.info("Индекс мэтчей загружен из %s за %.0f мс", source, (time.monotonic() - started) * 1000)
+    
+    # Фоновая перепроверка мэтчей
+    recheck_queue.start(bot)
+    sweep_stop = asyncio.Event()
+    sweep_task = None
+    if primary:
+        sweep_task = asyncio.create_task(run_periodic_sweep(bot, config.MATCH_SWEEP_INTERVAL, sweep_stop))
+    if change_feed is not None:
+        change_feed.start()
+    if watcher is not None:
+        watcher.start()
+    
+    # Обслуживание БД (удаление неактивных, ANALYZE, vacuum) — общее для всех воркеров
+    maintenance = None
+    if primary:
+        maintenance = MaintenanceScheduler(
+            bot, config.MAINTENANCE_INTERVAL,
+            timedelta(days=config.USER_TTL_DAYS) if config.USER_TTL_DAYS > 0 else None,
+            timedelta(days=config.USER_EXPIRY_GRACE_DAYS),
+            config.MAINTENANCE_BATCH_SIZE, config.MAINTENANCE_BATCH_PAUSE, config.MAINTENANCE_VACUUM_PAGES,
+        )
+        maintenance.start()
+    
+    # Резервные копии БД по расписанию
+    backups = None
+    if primary and config.STORAGE_BACKEND == "sqlite" and config.BACKUP_INTERVAL > 0:
+        backups = BackupScheduler(
+            config.DATABASE_PATH, config.BACKUP_DIR, config.BACKUP_INTERVAL, config.BACKUP_KEEP,
+            config.BACKUP_PAGES_PER_STEP, config.BACKUP_STEP_PAUSE,
+        )
+        backups.start()
+    
+    watchdog = LoopWatchdog(
+        config.LOOP_LAG_INTERVAL, config.LOOP_LAG_THRESHOLD, tracker,
+        stack_dump_path=config.LOOP_STALL_DUMP_PATH, slow_callback_debug=config.LOOP_SLOW_CALLBACK_DEBUG,
+    )
+    watchdog.start()
+    memory_monitor = MemoryMonitor(config.MEMORY_SAMPLE_INTERVAL, config.MEMORY_RSS_WARN_MB * 1024 * 1024)
+    memory_monitor.start()
+    metrics_reporter = None
+    if config.METRICS_LOG_INTERVAL > 0:
+        metrics_reporter = MetricsReporter(config.METRICS_LOG_INTERVAL)
+        metrics_reporter.start()
+    tracer.start()
+    if recorder is not None:
+        recorder.start()
+    
+    stop_requested = asyncio.Event()
+    install_signal_handlers(stop_requested)
+    
     # Запуск бота
-    logger.info("Бот запущен")
-    await dp.start_polling(bot)
+    try:
+        if worker is None:
+            logger.info("Бот запущен")
+            await run_until_stopped(dp, bot, stop_requested)
+        else:
+            logger.info("Воркер %s запущен", worker)
+            await serve_updates(dp, bot, config.WORKER_BASE_PORT + worker, stop_requested)
+    finally:
+        await profiler.stop()
+        if maintenance is not None:
+            await maintenance.stop()
+        if backups is not None:
+            await backups.stop()
+        await shutdown(bot, in_flight, sweep_stop, sweep_task, change_feed, primary, watcher)
+        await watchdog.stop()
+        await memory_monitor.stop()
+        if metrics_reporter is not None:
+            await metrics_reporter.stop()
+        await tracer.shutdown()
+        if recorder is not None:
+            await recorder.close()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Group Changer Bot")
+    parser.add_argument("--worker", type=int, help="номер воркера (запускается из supervisor.py)")
+    args = parser.parse_args()
+    # Запись логов — в фоновом потоке; stop() дописывает очередь перед выходом
+    log_listener = configure_from_config(None if args.worker is None else str(args.worker))
     try:
-        asyncio.run(main())
-    except KeyboardInterrupt:
+        asyncio.run(main(args.worker))
+    except (KeyboardInterrupt, asyncio.CancelledError):
         logger.info("Бот остановлен")
+    finally:
+        log_listener.stop()
@@ -7,6 +7,9 @@ BOT_TOKEN = "8558157935:AAEWiSVmxGR1NrKqlaQriB6RtKf7iXxN-C0"
 # Путь к базе данных
 DATABASE_PATH = "bot_database.db"
 
+# Хранилище данных: "sqlite" (файл DATABASE_PATH) или "memory" (только для тестов и бенчмарков)
+STORAGE_BACKEND = "sqlite"
+
 # Количество групп ИАД
 GROUPS_COUNT = 10
 
@@ -24,3 +27,173 @@ GROUP_SCHEDULE = {
     10: "09:30 — 10:50",
 }
 
+# Программы и их группы. Каталог записывается в БД при init_db.
+# id группы глобальный: first_group_id + номер группы - 1, диапазоны id программ не пересекаются
+PROGRAMS = {
+    "iad": {
+        "title": "ИАД",
+        "first_group_id": 1,
+        "schedule": GROUP_SCHEDULE,
+    },
+}
+
+# Программа по умолчанию (если программа всего одна, её выбор пропускается)
+DEFAULT_PROGRAM = "iad"
+
+# Количество групп на одной странице клавиатуры
+GROUPS_PAGE_SIZE = 10
+
+# Пауза (сек) перед перерисовкой клавиатуры желаемых групп после серии нажатий
+KEYBOARD_EDIT_DEBOUNCE = 0.4
+
+# Окно (сек), в котором повторные перепроверки мэтчей одного пользователя объединяются
+MATCH_RECHECK_WINDOW = 3.0
+
+# Максимальная задержка (сек) ответа на нажатие инлайн-кнопки: после неё
+# callback подтверждается, даже если хендлер ещё работает
+CALLBACK_ANSWER_DEADLINE = 0.2
+# Сколько (сек) помнить id апдейтов и callback-запросов, чтобы отбрасывать повторную доставку,
+# и окно (сек) после нажатия кнопки, в котором повторное нажатие той же кнопки отбрасывается
+UPDATE_DEDUP_TTL = 600
+CALLBACK_DEDUP_WINDOW = 1.0
+
+# Group commit: изменения БД собираются в пачку не дольше интервала (сек)
+# и не больше заданного размера, затем фиксируются одной транзакцией
+WRITE_BATCH_INTERVAL = 0.01
+WRITE_BATCH_MAX_SIZE = 200
+
+# Журнал WAL: чтения идут параллельно с записью
+DATABASE_WAL = True
+
+# Количество подключений только для чтения
+READ_POOL_SIZE = 4
+
+# Интервал (сек) периодической проверки мэтчей по всей базе
+MATCH_SWEEP_INTERVAL = 600
+
+# Telegram id администраторов (доступ к служебным командам, например /stats)
+ADMIN_IDS = set()
+
+# Время жизни (сек) кэша агрегированной статистики
+STATS_CACHE_TTL = 60
+
+# Снимок индекса мэтчей: пишется при остановке, читается при запуске вместо полной загрузки из БД
+MATCH_INDEX_SNAPSHOT_PATH = "match_index.snapshot"
+
+# Сколько секунд при остановке ждать начатые хендлеры, отложенные перепроверки и уведомления
+SHUTDOWN_TIMEOUT = 25
+
+# Несколько процессов-воркеров (supervisor.py). При WORKERS = 1 бот работает одним процессом (bot.py, polling)
+WORKERS = 1
+
+# Вебхук: внешний адрес для Telegram и адрес, который слушает supervisor.py
+WEBHOOK_URL = ""
+WEBHOOK_PATH = "/webhook"
+WEBHOOK_HOST = "0.0.0.0"
+WEBHOOK_PORT = 8080
+# Секрет в заголовке X-Telegram-Bot-Api-Secret-Token (пустой — без проверки)
+WEBHOOK_SECRET = ""
+
+# Воркер i принимает апдейты на 127.0.0.1:(WORKER_BASE_PORT + i)
+WORKER_BASE_PORT = 8081
+
+# Как часто (сек) воркер подтягивает в свой индекс мэтчей изменения других воркеров
+CHANGE_FEED_INTERVAL = 0.5
+
+# Как часто (сек) бот в одном процессе проверяет, не меняли ли БД в обход него (manage.py import),
+# и если меняли — загружает индекс мэтчей заново
+EXTERNAL_WRITE_CHECK_INTERVAL = 5.0
+
+# Сколько последних записей хранить в журнале изменений
+CHANGE_LOG_KEEP = 100000
+
+# Окно (сек) накопления уведомлений о мэтчах в один дайджест на получателя; 0 — отправлять сразу
+MATCH_DIGEST_WINDOW = 0
+
+# Сторож цикла событий: период пульса (сек) и задержка (сек), после которой пишется предупреждение
+LOOP_LAG_INTERVAL = 0.1
+LOOP_LAG_THRESHOLD = 0.25
+# Режим отладки asyncio: логировать каждый колбэк дольше LOOP_LAG_THRESHOLD (замедляет бота)
+LOOP_SLOW_CALLBACK_DEBUG = False
+# Файл для образцов стека при задержках (JSONL); пустая строка — не записывать
+LOOP_STALL_DUMP_PATH = ""
+
+# Трассировка апдейтов: доля записываемых апдейтов (0 — выключена, 1 — все)
+TRACE_SAMPLE_RATE = 0.0
+# Куда писать спаны: "jsonl" — в файл TRACE_JSONL_PATH, "otlp" — коллектору по OTLP/HTTP (JSON)
+TRACE_EXPORTER = "jsonl"
+TRACE_JSONL_PATH = "traces.jsonl"
+TRACE_OTLP_ENDPOINT = "http://127.0.0.1:4318/v1/traces"
+
+# Профилирование по запросу (/profile, SIGUSR1): каталог для файлов .pstats/.collapsed,
+# период сэмплера стеков (сек), длительность по умолчанию и максимальная (сек)
+PROFILE_DIR = "profiles"
+PROFILE_SAMPLE_INTERVAL = 0.005
+PROFILE_DEFAULT_SECONDS = 30
+PROFILE_MAX_SECONDS = 600
+
+# Логирование: уровень, формат ("json" — строка JSON на запись, "text" — как раньше),
+# файл с ротацией по размеру (пустая строка — stderr), размер файла (байт) и число архивных файлов
+LOG_LEVEL = "INFO"
+LOG_FORMAT = "json"
+LOG_FILE = ""
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+# Очередь записей для фонового потока; при переполнении записи отбрасываются, а не задерживают бота
+LOG_QUEUE_SIZE = 10000
+# С одного места в коде — не больше LOG_RATE_LIMIT_BURST предупреждений/ошибок за LOG_RATE_LIMIT_PERIOD сек
+LOG_RATE_LIMIT_BURST = 10
+LOG_RATE_LIMIT_PERIOD = 60
+# Апдейты дольше этого (сек) логируются с предупреждением
+LOG_SLOW_UPDATE = 1.0
+
+# Учёт памяти (/memory): период записи метрик RSS и размеров хранилищ (сек), порог RSS для
+# предупреждения в лог (МБ, 0 — без предупреждения), глубина стека для tracemalloc (/memory trace)
+MEMORY_SAMPLE_INTERVAL = 60
+MEMORY_RSS_WARN_MB = 0
+MEMORY_TRACE_FRAMES = 5
+
+# Как часто (сек) все метрики процесса пишутся в лог одной строкой (0 — не писать; по запросу — /metrics)
+METRICS_LOG_INTERVAL = 300
+
+# Обслуживание БД (выполняет основной процесс): период (сек). Пользователь без изменений дольше
+# USER_TTL_DAYS дней получает предупреждение и через USER_EXPIRY_GRACE_DAYS дней после него удаляется
+# (0 — не удалять). Работа идёт пачками по MAINTENANCE_BATCH_SIZE с паузой MAINTENANCE_BATCH_PAUSE (сек);
+# инкрементальный vacuum освобождает до MAINTENANCE_VACUUM_PAGES страниц за пачку
+MAINTENANCE_INTERVAL = 3600
+USER_TTL_DAYS = 180
+USER_EXPIRY_GRACE_DAYS = 7
+MAINTENANCE_BATCH_SIZE = 100
+MAINTENANCE_BATCH_PAUSE = 0.5
+MAINTENANCE_VACUUM_PAGES = 256
+
+# Резервные копии SQLite (выполняет основной процесс): период (сек, 0 — не делать), каталог,
+# сколько последних архивов хранить, страниц за шаг онлайн-копирования и пауза между шагами (сек)
+BACKUP_INTERVAL = 6 * 3600
+BACKUP_DIR = "backups"
+BACKUP_KEEP = 7
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_PAUSE = 0.01
+
+# Bot API: свой сервер (например, http://127.0.0.1:8081 для telegram-bot-api); пустая строка — api.telegram.org.
+# BOT_API_LOCAL = True — сервер запущен в режиме --local
+BOT_API_URL = ""
+BOT_API_LOCAL = False
+# Таймаут запроса (сек), таймауты отдельных методов и таймаут установки соединения
+BOT_API_TIMEOUT = 60
+BOT_API_METHOD_TIMEOUTS = {"answerCallbackQuery": 5, "sendMessage": 20}
+BOT_API_CONNECT_TIMEOUT = 5
+# Пул соединений: всего и на один хост (0 — без ограничения), кэш DNS (сек), keep-alive (сек)
+BOT_API_POOL_LIMIT = 100
+BOT_API_POOL_LIMIT_PER_HOST = 0
+BOT_API_DNS_CACHE_TTL = 300
+BOT_API_KEEPALIVE = 60
+# Повторы: число повторов, начальная пауза (сек) и максимальный retry_after (сек), который стоит ждать
+BOT_API_RETRIES = 3
+BOT_API_RETRY_BACKOFF = 0.5
+BOT_API_MAX_RETRY_AFTER = 30
+
+# Запись входящих апдейтов (обезличенных) для manage.py replay; пустая строка — не записывать.
+# Файл с расширением .gz пишется сжатым. Соль для обезличивания id; пустая — случайная при каждом запуске
+TRAFFIC_RECORD_PATH = ""
+TRAFFIC_RECORD_SALT = ""
@@ -1,140 +1,317 @@
 """Работа с базой данных"""
-import aiosqlite
 from datetime import datetime
 from typing import Optional, List, Dict
-from contextlib import asynccontextmanager
-from config import DATABASE_PATH
-
-
-@asynccontextmanager
-async def _get_db():
-    """Получение подключения к БД с включенными foreign keys"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        # Включаем поддержку внешних ключей для CASCADE (нужно при каждом подключении)
-        await db.execute("PRAGMA foreign_keys = ON")
-        yield db
-
-
-async def init_db():
-    """Инициализация базы данных"""
-    async with _get_db() as db:
-        # Таблица пользователей
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                telegram_id INTEGER PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                current_group INTEGER,
-                created_at TIMESTAMP,
-                updated_at TIMESTAMP
-            )
-        """)
-        
-        # Таблица желаемых групп
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS desired_groups (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                telegram_id INTEGER,
-                desired_group INTEGER,
-                FOREIGN KEY (telegram_id) REFERENCES users(telegram_id) ON DELETE CASCADE
-            )
-        """)
-        
-        await db.commit()
 
+from config import (
+    DATABASE_PATH, STORAGE_BACKEND, DATABASE_WAL, READ_POOL_SIZE, WRITE_BATCH_INTERVAL, WRITE_BATCH_MAX_SIZE, WORKERS
+)
+from storage import InMemoryRepository, Repository, SQLiteRepository
+from utils.groups import Group
+from utils.match_index import match_index
+from utils.tracing import traced
 
+# Текущее хранилище. Модульные функции ниже — фасад над ним:
+# остальной код бота работает через database.* и не зависит от выбранного хранилища.
+# Каждый вызов фасада внутри трассы апдейта записывается отдельным спаном db.<функция>.
+_repository: Optional[Repository] = None
+
+
+def create_repository(backend: Optional[str] = None, path: Optional[str] = None) -> Repository:
+    """Создание хранилища по имени: sqlite (файл path, по умолчанию DATABASE_PATH) или memory"""
+    backend = backend or STORAGE_BACKEND
+    if backend == "memory":
+        return InMemoryRepository()
+    if backend == "sqlite":
+        return SQLiteRepository(
+            path or DATABASE_PATH,
+            wal=DATABASE_WAL,
+            read_pool_size=READ_POOL_SIZE,
+            write_batch_interval=WRITE_BATCH_INTERVAL,
+            write_batch_max_size=WRITE_BATCH_MAX_SIZE,
+            # Журнал изменений нужен, только когда в БД пишут несколько воркеров
+            change_log=WORKERS > 1,
+        )
+    raise ValueError(f"Неизвестное хранилище: {backend}")
+
+
+def get_repository() -> Repository:
+    """Текущее хранилище (создаётся по конфигурации при первом обращении)"""
+    global _repository
+    if _repository is None:
+        _repository = create_repository()
+    return _repository
+
+
+async def init_db(backend: Optional[str] = None, path: Optional[str] = None):
+    """Инициализация базы данных (хранилище создаётся заново по конфигурации или по backend/path)"""
+    global _repository
+    _repository = create_repository(backend, path)
+    await _repository.init()
+
+
+async def open_storage():
+    """Открытие долгоживущих ресурсов хранилища (для SQLite — писатель и пул чтения)"""
+    await get_repository().open()
+
+
+async def close_storage():
+    """Закрытие хранилища с сохранением всех принятых изменений"""
+    if _repository is not None:
+        await _repository.close()
+
+
+@traced("db.user_exists")
 async def user_exists(telegram_id: int) -> bool:
     """Проверка существования пользователя"""
-    async with _get_db() as db:
-        async with db.execute(
-            "SELECT 1 FROM users WHERE telegram_id = ?", (telegram_id,)
-        ) as cursor:
-            return await cursor.fetchone() is not None
+    return await get_repository().user_exists(telegram_id)
 
 
+@traced("db.create_user")
 async def create_user(telegram_id: int, username: Optional[str], first_name: str, current_group: int):
     """Создание нового пользователя"""
-    now = datetime.now()
-    async with _get_db() as db:
-        await db.execute("""
-            INSERT INTO users (telegram_id, username, first_name, current_group, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (telegram_id, username, first_name, current_group, now, now))
-        await db.commit()
+    await get_repository().create_user(telegram_id, username, first_name, current_group)
+    if match_index.ready:
+        match_index.set_user(telegram_id, current_group, ())
 
 
+@traced("db.update_user_group")
 async def update_user_group(telegram_id: int, current_group: int):
     """Обновление текущей группы пользователя"""
-    async with _get_db() as db:
-        await db.execute("""
-            UPDATE users SET current_group = ?, updated_at = ?
-            WHERE telegram_id = ?
-        """, (current_group, datetime.now(), telegram_id))
-        await db.commit()
+    await get_repository().update_user_group(telegram_id, current_group)
+    if match_index.ready:
+        match_index.set_current_group(telegram_id, current_group)
 
 
+@traced("db.set_desired_groups")
 async def set_desired_groups(telegram_id: int, desired_groups: List[int]):
     """Установка желаемых групп (удаляет старые и добавляет новые)"""
-    async with _get_db() as db:
-        # Удаляем старые желаемые группы
-        await db.execute("DELETE FROM desired_groups WHERE telegram_id = ?", (telegram_id,))
-        
-        # Добавляем новые
-        for group in desired_groups:
-            await db.execute(
-                "INSERT INTO desired_groups (telegram_id, desired_group) VALUES (?, ?)",
-                (telegram_id, group)
-            )
-        
-        await db.commit()
+    await get_repository().set_desired_groups(telegram_id, desired_groups)
+    if match_index.ready:
+        match_index.set_desired_groups(telegram_id, desired_groups)
 
 
+@traced("db.get_user")
 async def get_user(telegram_id: int) -> Optional[Dict]:
     """Получение данных пользователя"""
-    async with _get_db() as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            "SELECT * FROM users WHERE telegram_id = ?", (telegram_id,)
-        ) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                return dict(row)
-            return None
+    return await get_repository().get_user(telegram_id)
 
 
+@traced("db.get_desired_groups")
 async def get_desired_groups(telegram_id: int) -> List[int]:
     """Получение списка желаемых групп пользователя"""
-    async with _get_db() as db:
-        async with db.execute(
-            "SELECT desired_group FROM desired_groups WHERE telegram_id = ?", (telegram_id,)
-        ) as cursor:
-            rows = await cursor.fetchall()
-            return [row[0] for row in rows]
+    return await get_repository().get_desired_groups(telegram_id)
+
+
+@traced("db.get_desired_groups_for")
+async def get_desired_groups_for(telegram_ids: List[int]) -> Dict[int, List[int]]:
+    """Желаемые группы нескольких пользователей (только у кого они есть)"""
+    return await get_repository().get_desired_groups_for(telegram_ids)
 
 
+@traced("db.get_users_from_group")
 async def get_users_from_group(group: int) -> List[Dict]:
     """Получение всех пользователей из указанной группы"""
-    async with _get_db() as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            "SELECT * FROM users WHERE current_group = ?", (group,)
-        ) as cursor:
-            rows = await cursor.fetchall()
-            return [dict(row) for row in rows]
+    return await get_repository().get_users_from_group(group)
 
 
+@traced("db.delete_user")
 async def delete_user(telegram_id: int):
-    """Удаление пользователя из базы (CASCADE удалит и желаемые группы)"""
-    async with _get_db() as db:
-        await db.execute("DELETE FROM users WHERE telegram_id = ?", (telegram_id,))
-        await db.commit()
+    """Удаление пользователя из базы (вместе с желаемыми группами и уведомлёнными парами)"""
+    await get_repository().delete_user(telegram_id)
+    if match_index.ready:
+        match_index.remove_user(telegram_id)
 
 
+@traced("db.get_all_users")
 async def get_all_users() -> List[Dict]:
     """Получение всех пользователей (для отладки)"""
-    async with _get_db() as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("SELECT * FROM users") as cursor:
-            rows = await cursor.fetchall()
-            return [dict(row) for row in rows]
+    return await get_repository().get_all_users()
+
+
+@traced("db.get_users")
+async def get_users(telegram_ids: List[int]) -> Dict[int, Dict]:
+    """Получение данных нескольких пользователей"""
+    return await get_repository().get_users(telegram_ids)
+
+
+@traced("db.get_programs")
+async def get_programs() -> List[tuple]:
+    """Получение программ: пары (код, название)"""
+    return await get_repository().get_programs()
+
+
+@traced("db.get_groups")
+async def get_groups(program: Optional[str] = None) -> List[Group]:
+    """Получение групп (всех или одной программы)"""
+    return await get_repository().get_groups(program)
+
+
+@traced("db.get_match_rows")
+async def get_match_rows() -> List[tuple]:
+    """
+    Все пользователи с желаемыми группами за один запрос:
+    строки (telegram_id, current_group, desired_group), desired_group = None, если желаемых нет
+    """
+    return await get_repository().get_match_rows()
+
+
+@traced("db.load_match_index")
+async def load_match_index():
+    """Полная загрузка индекса мэтчей из БД"""
+    match_index.load(await get_match_rows())
+
+
+@traced("db.get_change_counter")
+async def get_change_counter() -> int:
+    """Счётчик изменений пользователей и желаемых групп (для проверки снимка индекса)"""
+    return await get_repository().get_change_counter()
+
+
+@traced("db.get_own_changes")
+async def get_own_changes() -> int:
+    """Доля счётчика изменений, внесённая записями этого процесса (остальное — чужие записи)"""
+    return await get_repository().get_own_changes()
+
+
+@traced("db.get_change_log")
+async def get_change_log(after_seq: int, limit: int = 1000) -> List[tuple]:
+    """Журнал изменений пользователей: пары (seq, telegram_id) после after_seq"""
+    return await get_repository().get_change_log(after_seq, limit)
+
+
+@traced("db.get_change_log_bounds")
+async def get_change_log_bounds() -> tuple:
+    """(первый, последний) seq журнала изменений"""
+    return await get_repository().get_change_log_bounds()
+
+
+@traced("db.prune_change_log")
+async def prune_change_log(keep: int):
+    """Удаление старых записей журнала изменений"""
+    await get_repository().prune_change_log(keep)
+
+
+@traced("db.refresh_match_index")
+async def refresh_match_index(telegram_ids: List[int]):
+    """Перечитывание пользователей из БД в индекс мэтчей (после записей других воркеров)"""
+    telegram_ids = list(telegram_ids)
+    users = await get_users(telegram_ids)
+    desired = await get_desired_groups_for(telegram_ids)
+    for telegram_id in telegram_ids:
+        user = users.get(telegram_id)
+        if user is None:
+            match_index.remove_user(telegram_id)
+        else:
+            match_index.set_user(telegram_id, user['current_group'], desired.get(telegram_id, ()))
+
+
+@traced("db.get_notified_pairs")
+async def get_notified_pairs() -> set:
+    """Пары (user_a, user_b), user_a < user_b, которым уже отправлено уведомление"""
+    return await get_repository().get_notified_pairs()
+
+
+@traced("db.add_notified_pairs")
+async def add_notified_pairs(pairs: List[tuple]):
+    """Отметка пар как уведомлённых"""
+    await get_repository().add_notified_pairs(pairs)
+
+
+@traced("db.remove_notified_pairs")
+async def remove_notified_pairs(pairs: List[tuple]):
+    """Удаление отметок для пар, которые больше не являются мэтчем"""
+    await get_repository().remove_notified_pairs(pairs)
+
+
+@traced("db.get_notified_partners")
+async def get_notified_partners(telegram_id: int) -> set:
+    """С кем у пользователя уже есть уведомлённая пара"""
+    return await get_repository().get_notified_partners(telegram_id)
+
+
+@traced("db.count_matches")
+async def count_matches(current_group: int, desired_groups: List[int], exclude: Optional[int] = None) -> int:
+    """Сколько пользователей из desired_groups хотят в current_group (одним агрегатом)"""
+    return await get_repository().count_matches(current_group, desired_groups, exclude)
+
+
+@traced("db.has_matches")
+async def has_matches(current_group: int, desired_groups: List[int], exclude: Optional[int] = None) -> bool:
+    """Есть ли хоть один пользователь из desired_groups, желающий в current_group"""
+    return await get_repository().has_matches(current_group, desired_groups, exclude)
+
+
+@traced("db.get_group_population")
+async def get_group_population() -> Dict[int, int]:
+    """Количество пользователей в каждой группе"""
+    return await get_repository().get_group_population()
+
+
+@traced("db.get_demand_matrix")
+async def get_demand_matrix() -> Dict[tuple, int]:
+    """Количество желающих по парам (текущая группа, желаемая группа)"""
+    return await get_repository().get_demand_matrix()
+
+
+@traced("db.import_users")
+async def import_users(users: List[Dict], replace: bool = False) -> int:
+    """
+    Загрузка пачки пользователей с желаемыми группами одной транзакцией.
+    Без replace существующие пользователи пропускаются. Возвращает число записанных пользователей.
+    """
+    return await get_repository().import_users(users, replace)
+
+
+def iter_users_with_desired(chunk_size: int = 1000):
+    """Потоковая выгрузка пользователей с желаемыми группами"""
+    return get_repository().iter_users_with_desired(chunk_size)
+
+
+@traced("db.touch_user")
+async def touch_user(telegram_id: int):
+    """Отметка активности пользователя (откладывает удаление за неактивность)"""
+    await get_repository().touch_user(telegram_id)
+
+
+@traced("db.get_users_to_warn")
+async def get_users_to_warn(updated_before: datetime, limit: int) -> List[int]:
+    """Неактивные пользователи, которых ещё не предупредили об удалении"""
+    return await get_repository().get_users_to_warn(updated_before, limit)
+
+
+@traced("db.mark_expiry_warned")
+async def mark_expiry_warned(telegram_ids: List[int]):
+    """Отметка отправленного предупреждения об удалении"""
+    await get_repository().mark_expiry_warned(telegram_ids)
+
+
+@traced("db.get_users_to_expire")
+async def get_users_to_expire(updated_before: datetime, warned_before: datetime, limit: int) -> List[int]:
+    """Неактивные пользователи, предупреждённые до warned_before и так и не вернувшиеся"""
+    return await get_repository().get_users_to_expire(updated_before, warned_before, limit)
+
+
+@traced("db.delete_users")
+async def delete_users(telegram_ids: List[int]):
+    """Удаление нескольких пользователей (вместе с желаемыми группами и уведомлёнными парами)"""
+    await get_repository().delete_users(telegram_ids)
+    if match_index.ready:
+        for telegram_id in telegram_ids:
+            match_index.remove_user(telegram_id)
+
+
+@traced("db.optimize")
+async def optimize():
+    """Обновление статистики планировщика запросов"""
+    await get_repository().optimize()
+
+
+@traced("db.incremental_vacuum")
+async def incremental_vacuum(max_pages: int) -> int:
+    """Возврат свободных страниц файлу БД; возвращает число освобождённых"""
+    return await get_repository().incremental_vacuum(max_pages)
+
 
+async def vacuum():
+    """Полное сжатие БД (только при остановленном боте)"""
+    await get_repository().vacuum()
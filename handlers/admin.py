@@ -0,0 +1,118 @@
+"""Служебные команды администратора"""
+from aiogram import Router, F
+from aiogram.types import Message
+from aiogram.filters import Command, CommandObject
+
+import config
+from utils import metrics
+from utils.memory import allocation_tracker, format_memory_report, memory_report
+from utils.profiler import format_report, profiler
+from utils.stats import get_stats, format_stats
+
+router = Router()
+# Команды роутера доступны только администраторам
+router.message.filter(F.from_user.id.in_(config.ADMIN_IDS))
+
+PROFILE_USAGE = (
+    "Использование:\n"
+    "/profile [секунды] — профилировать заданное время\n"
+    "/profile updates N — профилировать следующие N апдейтов\n"
+    "/profile stop — остановить досрочно"
+)
+
+MEMORY_USAGE = (
+    "Использование:\n"
+    "/memory — память процесса, хранилища и сессии FSM\n"
+    "/memory trace [кадры] — включить tracemalloc (рост считается между вызовами /memory)\n"
+    "/memory trace off — выключить tracemalloc"
+)
+
+# Лимит длины сообщения Telegram
+MESSAGE_LIMIT = 4096
+
+
+@router.message(Command("stats"))
+async def cmd_stats(message: Message):
+    """Команда /stats - агрегированная статистика спроса"""
+    stats = await get_stats()
+    # Большая статистика приходит несколькими сообщениями
+    for text in format_stats(stats):
+        await message.answer(text, parse_mode="HTML")
+
+
+@router.message(Command("profile"))
+async def cmd_profile(message: Message, command: CommandObject):
+    """Команда /profile - профилирование бота по запросу"""
+    args = (command.args or "").split()
+    if args == ["stop"]:
+        if not profiler.active:
+            await message.answer("Профилирование не запущено")
+        else:
+            # Отчёт отправит on_done того, кто запустил профилирование
+            await profiler.stop()
+        return
+
+    try:
+        if args[:1] == ["updates"] and len(args) == 2:
+            seconds, updates = config.PROFILE_MAX_SECONDS, int(args[1])
+        elif len(args) <= 1:
+            seconds, updates = float(args[0]) if args else config.PROFILE_DEFAULT_SECONDS, None
+        else:
+            raise ValueError
+        if not seconds > 0 or (updates is not None and updates <= 0):
+            raise ValueError
+    except ValueError:
+        await message.answer(PROFILE_USAGE)
+        return
+
+    chat_id, bot = message.chat.id, message.bot
+
+    async def _send_report(report):
+        await bot.send_message(chat_id, format_report(report))
+
+    if not profiler.start(seconds, updates, on_done=_send_report):
+        await message.answer("Профилирование уже идёт. /profile stop — остановить")
+        return
+    limit = f"следующие {updates} апдейтов" if updates else f"{min(seconds, config.PROFILE_MAX_SECONDS):.0f} с"
+    await message.answer(f"⏱ Профилирование включено: {limit}. Отчёт придёт сюда.")
+
+
+@router.message(Command("memory"))
+async def cmd_memory(message: Message, command: CommandObject):
+    """Команда /memory - отчёт о памяти и tracemalloc по запросу"""
+    args = (command.args or "").split()
+    if args[:1] == ["trace"] and len(args) <= 2:
+        if args[1:] == ["off"]:
+            allocation_tracker.stop()
+            await message.answer("tracemalloc выключен")
+            return
+        try:
+            frames = int(args[1]) if len(args) == 2 else config.MEMORY_TRACE_FRAMES
+        except ValueError:
+            frames = 0
+        if frames > 0:
+            allocation_tracker.start(frames)
+            await message.answer(f"tracemalloc включён ({frames} кадр.). Выделения с этого момента — в /memory")
+            return
+    if args:
+        await message.answer(MEMORY_USAGE)
+        return
+
+    text = format_memory_report(await memory_report())
+    if len(text) > MESSAGE_LIMIT:
+        text = text[:MESSAGE_LIMIT - 1] + "…"
+    await message.answer(text)
+
+
+@router.message(Command("metrics"))
+async def cmd_metrics(message: Message):
+    """Команда /metrics - текущие значения метрик процесса"""
+    lines = metrics.format_snapshot(metrics.snapshot()) or ["Метрик пока нет"]
+    # Длинный список режется между строками на несколько сообщений
+    text = ""
+    for line in lines:
+        if text and len(text) + len(line) + 1 > MESSAGE_LIMIT:
+            await message.answer(text)
+            text = ""
+        text += ("\n" if text else "") + line[:MESSAGE_LIMIT]
+    await message.answer(text)
@@ -7,8 +7,13 @@ from aiogram.fsm.state import State, StatesGroup
 
 import database
 import keyboards.keyboards as kb
-from keyboards.keyboards import format_group_text, format_groups_list_multiline, get_schedule_message
-from utils.matcher import check_and_notify_new_matches
+from keyboards.keyboards import format_group_text, format_groups_list_multiline, format_matches_available, parse_group_callback
+from utils.match_queue import recheck_queue
+from utils.matcher import count_matches
+from middlewares.callback_answer import CallbackAnswer
+from utils.debounce import schedule_markup_edit, cancel_markup_edit
+from utils.groups import catalog
+from utils.memory import register_dict
 
 router = Router()
 
@@ -23,6 +28,7 @@ class EditStates(StatesGroup):
 
 # Временное хранилище для данных редактирования
 edit_data = {}
+register_dict("edit_data", edit_data)
 
 
 @router.message(F.text == "✏️ Изменить мою группу")
@@ -30,13 +36,17 @@ async def start_edit_current_group(message: Message, state: FSMContext):
     """Начало редактирования текущей группы"""
     user_id = message.from_user.id
     
-    if not await database.user_exists(user_id):
+    user = await database.get_user(user_id)
+    if not user:
         await message.answer("❌ Ты ещё не зарегистрирован. Используй /start")
         return
     
+    # Перевод возможен только внутри своей программы: она запоминается для проверки нажатий
+    program = catalog.program_of(user['current_group'])
+    edit_data[user_id] = {'program': program}
     await message.answer(
         "📍 В какой группе ты сейчас учишься?",
-        reply_markup=kb.get_group_selection_keyboard()
+        reply_markup=kb.get_group_selection_keyboard(program)
     )
     await state.set_state(EditStates.editing_current_group)
 
@@ -54,7 +64,9 @@ async def start_edit_desired_groups(message: Message, state: FSMContext):
     current_desired = set(await database.get_desired_groups(user_id))
     
     edit_data[user_id] = {
-        'desired_groups': current_desired.copy()
+        'desired_groups': current_desired.copy(),
+        'user_group': user['current_group'],
+        'page': 0
     }
     
     await message.answer(
@@ -66,40 +78,63 @@ async def start_edit_desired_groups(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("select_group_"), EditStates.editing_current_group)
-async def process_edit_current_group(callback: CallbackQuery, state: FSMContext):
+async def process_edit_current_group(callback: CallbackQuery, state: FSMContext, callback_answer: CallbackAnswer):
     """Обработка выбора новой текущей группы"""
-    group_num = int(callback.data.split("_")[-1])
     user_id = callback.from_user.id
     
+    if user_id not in edit_data or 'program' not in edit_data[user_id]:
+        callback_answer.text = "❌ Ошибка. Начни заново"
+        callback_answer.show_alert = True
+        return
+    
+    program = edit_data[user_id]['program']
+    group_num = parse_group_callback(callback.data, program)
+    if group_num is None:
+        callback_answer.text = "❌ Такой группы нет в твоей программе. Начни заново"
+        callback_answer.show_alert = True
+        return
+    
     # Сохраняем выбранную группу для подтверждения
     edit_data[user_id] = {
+        'program': program,
         'current_group': group_num
     }
     
-    user = await database.get_user(user_id)
     desired = await database.get_desired_groups(user_id)
     desired_str = format_groups_list_multiline(desired)
+    # Новая группа сама по себе не желаемая — её не считаем
+    available = format_matches_available(
+        await count_matches(group_num, [group for group in desired if group != group_num], exclude=user_id)
+    )
     
     # Показываем подтверждение
     await callback.message.edit_text(
         f"📋 Проверь данные:\n\n"
         f"👤 Твоя группа: {format_group_text(group_num)}\n\n"
         f"🎯 Хочешь перевестись в:\n{desired_str}\n\n"
+        f"{available}"
         f"Всё верно?",
         reply_markup=kb.get_confirmation_keyboard("confirm_edit_current_group", "edit_current_group_again")
     )
     await state.set_state(EditStates.confirming_current_group)
-    await callback.answer()
 
 
 @router.callback_query(F.data.startswith("toggle_desired_"), EditStates.editing_desired_groups)
-async def process_edit_desired_toggle(callback: CallbackQuery, state: FSMContext):
+async def process_edit_desired_toggle(callback: CallbackQuery, state: FSMContext, callback_answer: CallbackAnswer):
     """Обработка переключения желаемой группы при редактировании"""
-    group_num = int(callback.data.split("_")[-1])
     user_id = callback.from_user.id
     
     if user_id not in edit_data:
-        await callback.answer("❌ Ошибка. Начни заново", show_alert=True)
+        callback_answer.text = "❌ Ошибка. Начни заново"
+        callback_answer.show_alert = True
+        return
+    
+    # Текущая группа запомнена при открытии клавиатуры — без запроса к БД на каждое нажатие
+    user_group = edit_data[user_id]['user_group']
+    group_num = parse_group_callback(callback.data, catalog.program_of(user_group))
+    if group_num is None or group_num == user_group:
+        callback_answer.text = "❌ Такой группы нет в твоей программе. Начни заново"
+        callback_answer.show_alert = True
         return
     
     # Переключаем состояние группы
@@ -108,43 +143,68 @@ async def process_edit_desired_toggle(callback: CallbackQuery, state: FSMContext
     else:
         edit_data[user_id]['desired_groups'].add(group_num)
     
-    user = await database.get_user(user_id)
-    selected = edit_data[user_id]['desired_groups']
+    selected = set(edit_data[user_id]['desired_groups'])
+    page = edit_data[user_id]['page']
     
+    # Клавиатуру перерисовываем после паузы в нажатиях
+    schedule_markup_edit(
+        callback.message,
+        lambda: kb.get_desired_groups_keyboard(user_group, selected, page)
+    )
+
+
+@router.callback_query(F.data.startswith("desired_page_"), EditStates.editing_desired_groups)
+async def process_edit_desired_page(callback: CallbackQuery, state: FSMContext, callback_answer: CallbackAnswer):
+    """Листание страниц клавиатуры желаемых групп при редактировании"""
+    page = int(callback.data.split("_")[-1])
+    user_id = callback.from_user.id
+    
+    if user_id not in edit_data:
+        callback_answer.text = "❌ Ошибка. Начни заново"
+        callback_answer.show_alert = True
+        return
+    
+    data = edit_data[user_id]
+    data['page'] = page
+    
+    await cancel_markup_edit(callback.message)
     await callback.message.edit_reply_markup(
-        reply_markup=kb.get_desired_groups_keyboard(user['current_group'], selected)
+        reply_markup=kb.get_desired_groups_keyboard(data['user_group'], data['desired_groups'], page)
     )
-    await callback.answer()
 
 
 @router.callback_query(F.data == "desired_groups_done", EditStates.editing_desired_groups)
-async def process_edit_desired_done(callback: CallbackQuery, state: FSMContext):
+async def process_edit_desired_done(callback: CallbackQuery, state: FSMContext, callback_answer: CallbackAnswer):
     """Обработка завершения редактирования желаемых групп"""
     user_id = callback.from_user.id
     
     if user_id not in edit_data:
-        await callback.answer("❌ Ошибка. Начни заново", show_alert=True)
+        callback_answer.text = "❌ Ошибка. Начни заново"
+        callback_answer.show_alert = True
         return
     
     desired = edit_data[user_id]['desired_groups']
     
     if not desired:
-        await callback.answer("❌ Выбери хотя бы одну группу!", show_alert=True)
+        callback_answer.text = "❌ Выбери хотя бы одну группу!"
+        callback_answer.show_alert = True
         return
     
-    user = await database.get_user(user_id)
+    user_group = edit_data[user_id]['user_group']
     desired_str = format_groups_list_multiline(sorted(desired))
+    available = format_matches_available(await count_matches(user_group, desired, exclude=user_id))
     
     # Показываем подтверждение
+    await cancel_markup_edit(callback.message)
     await callback.message.edit_text(
         f"📋 Проверь данные:\n\n"
-        f"👤 Твоя группа: {format_group_text(user['current_group'])}\n\n"
+        f"👤 Твоя группа: {format_group_text(user_group)}\n\n"
         f"🎯 Хочешь перевестись в:\n{desired_str}\n\n"
+        f"{available}"
         f"Всё верно?",
         reply_markup=kb.get_confirmation_keyboard("confirm_edit_desired_groups", "edit_desired_groups_again")
     )
     await state.set_state(EditStates.confirming_desired_groups)
-    await callback.answer()
 
 
 @router.message(F.text == "🚪 Больше не ищу")
@@ -174,23 +234,38 @@ async def process_delete_user(callback: CallbackQuery):
         "👋 Данные удалены!\n\n"
         "Если передумаешь — просто напиши /start"
     )
-    await callback.answer()
+
+
+@router.callback_query(F.data == "keep_active")
+async def process_keep_active(callback: CallbackQuery):
+    """Ответ на предупреждение об удалении за неактивность: пользователь ещё ищет обмен"""
+    user_id = callback.from_user.id
+    
+    # Проверка идёт после запроса к БД, когда на callback уже могли ответить, — поэтому не алерт
+    if not await database.user_exists(user_id):
+        await callback.message.edit_text("❌ Данные уже удалены. Используй /start")
+        return
+    
+    await database.touch_user(user_id)
+    
+    await callback.message.edit_text("👍 Отлично, продолжаю искать обмен для тебя!")
 
 
 @router.callback_query(F.data == "cancel_delete")
-async def process_cancel_delete(callback: CallbackQuery):
+async def process_cancel_delete(callback: CallbackQuery, callback_answer: CallbackAnswer):
     """Отмена удаления"""
+    callback_answer.text = "❌ Удаление отменено"
     await callback.message.delete()
-    await callback.answer("❌ Удаление отменено")
 
 
 @router.callback_query(F.data == "confirm_edit_current_group")
-async def process_confirm_edit_current_group(callback: CallbackQuery, state: FSMContext):
+async def process_confirm_edit_current_group(callback: CallbackQuery, state: FSMContext, callback_answer: CallbackAnswer):
     """Подтверждение изменения текущей группы"""
     user_id = callback.from_user.id
     
     if user_id not in edit_data or 'current_group' not in edit_data[user_id]:
-        await callback.answer("❌ Ошибка. Начни заново", show_alert=True)
+        callback_answer.text = "❌ Ошибка. Начни заново"
+        callback_answer.show_alert = True
         return
     
     group_num = edit_data[user_id]['current_group']
@@ -208,8 +283,8 @@ async def process_confirm_edit_current_group(callback: CallbackQuery, state: FSM
             # Обновляем группу в БД
             await database.update_user_group(user_id, group_num)
             
-            # Проверяем мэтчи
-            matches = await check_and_notify_new_matches(user_id, callback.bot)
+            # Мэтчи проверяются в фоне, результат придёт отдельным сообщением
+            recheck_queue.enqueue(user_id)
             
             desired_str = format_groups_list_multiline(sorted(current_desired))
             
@@ -220,9 +295,6 @@ async def process_confirm_edit_current_group(callback: CallbackQuery, state: FSM
                 f"🎯 Ищешь:\n{desired_str}\n\n"
             )
             
-            if matches:
-                text += f"🎉 Нашлось {len(matches)} новых мэтч(ей)! Проверь их в меню."
-            
             await callback.message.edit_text(text)
             await callback.message.answer(
                 "🏠 Главное меню",
@@ -245,10 +317,9 @@ async def process_confirm_edit_current_group(callback: CallbackQuery, state: FSM
         # Обычное обновление группы
         await database.update_user_group(user_id, group_num)
         
-        # Проверяем мэтчи
-        matches = await check_and_notify_new_matches(user_id, callback.bot)
+        # Мэтчи проверяются в фоне, результат придёт отдельным сообщением
+        recheck_queue.enqueue(user_id)
         
-        user = await database.get_user(user_id)
         desired = await database.get_desired_groups(user_id)
         desired_str = format_groups_list_multiline(desired)
         
@@ -258,9 +329,6 @@ async def process_confirm_edit_current_group(callback: CallbackQuery, state: FSM
             f"🎯 Ищешь:\n{desired_str}\n\n"
         )
         
-        if matches:
-            text += f"🎉 Нашлось {len(matches)} новых мэтч(ей)! Проверь их в меню."
-        
         await callback.message.edit_text(text)
         await callback.message.answer(
             "🏠 Главное меню",
@@ -269,27 +337,34 @@ async def process_confirm_edit_current_group(callback: CallbackQuery, state: FSM
     
     del edit_data[user_id]
     await state.clear()
-    await callback.answer()
 
 
 @router.callback_query(F.data == "edit_current_group_again")
 async def process_edit_current_group_again(callback: CallbackQuery, state: FSMContext):
     """Возврат к редактированию текущей группы"""
+    data = edit_data.get(callback.from_user.id, {})
+    if 'current_group' in data:
+        program = catalog.program_of(data['current_group'])
+    else:
+        user = await database.get_user(callback.from_user.id)
+        program = catalog.program_of(user['current_group'])
+    edit_data[callback.from_user.id] = {'program': program}
+    
     await callback.message.edit_text(
         "📍 В какой группе ты сейчас учишься?",
-        reply_markup=kb.get_group_selection_keyboard()
+        reply_markup=kb.get_group_selection_keyboard(program)
     )
     await state.set_state(EditStates.editing_current_group)
-    await callback.answer()
 
 
 @router.callback_query(F.data == "confirm_edit_desired_groups")
-async def process_confirm_edit_desired_groups(callback: CallbackQuery, state: FSMContext):
+async def process_confirm_edit_desired_groups(callback: CallbackQuery, state: FSMContext, callback_answer: CallbackAnswer):
     """Подтверждение изменения желаемых групп"""
     user_id = callback.from_user.id
     
     if user_id not in edit_data or 'desired_groups' not in edit_data[user_id]:
-        await callback.answer("❌ Ошибка. Начни заново", show_alert=True)
+        callback_answer.text = "❌ Ошибка. Начни заново"
+        callback_answer.show_alert = True
         return
     
     desired = edit_data[user_id]['desired_groups']
@@ -297,8 +372,8 @@ async def process_confirm_edit_desired_groups(callback: CallbackQuery, state: FS
     # Обновляем в БД
     await database.set_desired_groups(user_id, list(desired))
     
-    # Проверяем мэтчи
-    matches = await check_and_notify_new_matches(user_id, callback.bot)
+    # Мэтчи проверяются в фоне, результат придёт отдельным сообщением
+    recheck_queue.enqueue(user_id)
     
     desired_str = format_groups_list_multiline(sorted(desired))
     user = await database.get_user(user_id)
@@ -309,9 +384,6 @@ async def process_confirm_edit_desired_groups(callback: CallbackQuery, state: FS
         f"🎯 Ищешь:\n{desired_str}\n\n"
     )
     
-    if matches:
-        text += f"🎉 Нашлось {len(matches)} новых мэтч(ей)! Проверь их в меню."
-    
     await callback.message.edit_text(text)
     await callback.message.answer(
         "🏠 Главное меню",
@@ -320,19 +392,21 @@ async def process_confirm_edit_desired_groups(callback: CallbackQuery, state: FS
     
     del edit_data[user_id]
     await state.clear()
-    await callback.answer()
 
 
 @router.callback_query(F.data == "edit_desired_groups_again")
-async def process_edit_desired_groups_again(callback: CallbackQuery, state: FSMContext):
+async def process_edit_desired_groups_again(callback: CallbackQuery, state: FSMContext, callback_answer: CallbackAnswer):
     """Возврат к редактированию желаемых групп"""
     user_id = callback.from_user.id
     
     if user_id not in edit_data:
-        await callback.answer("❌ Ошибка. Начни заново", show_alert=True)
+        callback_answer.text = "❌ Ошибка. Начни заново"
+        callback_answer.show_alert = True
         return
     
     user = await database.get_user(user_id)
+    edit_data[user_id]['user_group'] = user['current_group']
+    edit_data[user_id]['page'] = 0
     selected = edit_data[user_id]['desired_groups']
     
     await callback.message.edit_text(
@@ -341,5 +415,4 @@ async def process_edit_desired_groups_again(callback: CallbackQuery, state: FSMC
         reply_markup=kb.get_desired_groups_keyboard(user['current_group'], selected)
     )
     await state.set_state(EditStates.editing_desired_groups)
-    await callback.answer()
 
@@ -7,14 +7,21 @@ from aiogram.fsm.state import State, StatesGroup
 
 import database
 import keyboards.keyboards as kb
-from keyboards.keyboards import format_group_text, format_groups_list, format_groups_list_multiline, get_schedule_message
-from utils.matcher import check_and_notify_new_matches
+from keyboards.keyboards import format_group_button, format_group_text, format_groups_list, format_groups_list_multiline, format_matches_available, get_schedule_messages, parse_group_callback
+from config import DEFAULT_PROGRAM
+from utils.groups import catalog
+from utils.match_queue import recheck_queue
+from utils.matcher import count_matches
+from middlewares.callback_answer import CallbackAnswer
+from utils.debounce import schedule_markup_edit, cancel_markup_edit
+from utils.memory import register_dict
 
 router = Router()
 
 
 class RegistrationStates(StatesGroup):
     """Состояния регистрации"""
+    selecting_program = State()
     selecting_current_group = State()
     selecting_desired_groups = State()
     confirmation = State()
@@ -22,6 +29,7 @@ class RegistrationStates(StatesGroup):
 
 # Временное хранилище для данных регистрации
 registration_data = {}
+register_dict("registration_data", registration_data)
 
 
 @router.message(Command("start"))
@@ -43,14 +51,24 @@ async def cmd_start(message: Message, state: FSMContext):
             f"Что хочешь сделать?",
             reply_markup=kb.get_main_menu_keyboard()
         )
+    elif len(catalog.programs()) > 1:
+        # Начинаем регистрацию с выбора программы
+        await message.answer(
+            "👋 Привет! Я помогу тебе найти человека для обмена группами.\n\n"
+            "🎓 Выбери свою программу:",
+            reply_markup=kb.get_program_selection_keyboard()
+        )
+        await state.set_state(RegistrationStates.selecting_program)
     else:
         # Начинаем регистрацию
-        # Сначала показываем расписание
-        await message.answer(
-            "👋 Привет! Я помогу тебе найти человека для обмена группами ИАД.\n\n"
-            + get_schedule_message() + "\n"
-            + "📍 Выбери свою группу:"
+        # Сначала показываем расписание (у большой программы — в нескольких сообщениях)
+        texts = get_schedule_messages(footer="📍 Выбери свою группу:")
+        texts[0] = (
+            f"👋 Привет! Я помогу тебе найти человека для обмена группами {catalog.program_title(DEFAULT_PROGRAM)}.\n\n"
+            + texts[0]
         )
+        for text in texts:
+            await message.answer(text)
         # Затем показываем кнопки выбора группы
         await message.answer(
             "Выбери группу, в которой ты сейчас учишься:",
@@ -59,21 +77,72 @@ async def cmd_start(message: Message, state: FSMContext):
         await state.set_state(RegistrationStates.selecting_current_group)
 
 
+@router.callback_query(F.data.startswith("select_program_"), RegistrationStates.selecting_program)
+async def process_program_selection(callback: CallbackQuery, state: FSMContext, callback_answer: CallbackAnswer):
+    """Обработка выбора программы при регистрации"""
+    program = callback.data[len("select_program_"):]
+    
+    # Кнопка из старого сообщения может ссылаться на программу, которой уже нет
+    if not catalog.has_program(program):
+        callback_answer.text = "❌ Такой программы нет. Начни заново с /start"
+        callback_answer.show_alert = True
+        return
+    
+    # Клавиатура — под последним сообщением расписания
+    *texts, last = get_schedule_messages(program, footer="📍 Выбери группу, в которой ты сейчас учишься:")
+    keyboard = kb.get_group_selection_keyboard(program)
+    if texts:
+        await callback.message.edit_text(texts[0])
+        for text in texts[1:]:
+            await callback.message.answer(text)
+        await callback.message.answer(last, reply_markup=keyboard)
+    else:
+        await callback.message.edit_text(last, reply_markup=keyboard)
+    await state.set_state(RegistrationStates.selecting_current_group)
+
+
+@router.callback_query(F.data.startswith("groups_page_"))
+async def process_groups_page(callback: CallbackQuery, callback_answer: CallbackAnswer):
+    """Листание страниц клавиатуры выбора текущей группы"""
+    program, _, page = callback.data[len("groups_page_"):].rpartition("_")
+    
+    if not catalog.has_program(program) or not page.isdigit():
+        callback_answer.text = "❌ Такой программы нет. Начни заново с /start"
+        callback_answer.show_alert = True
+        return
+    
+    await callback.message.edit_reply_markup(
+        reply_markup=kb.get_group_selection_keyboard(program, int(page))
+    )
+
+
+@router.callback_query(F.data == "noop")
+async def process_noop(callback: CallbackQuery):
+    """Нажатие на неактивную кнопку (номер страницы)"""
+
+
 @router.callback_query(F.data.startswith("select_group_"), RegistrationStates.selecting_current_group)
-async def process_group_selection(callback: CallbackQuery, state: FSMContext):
+async def process_group_selection(callback: CallbackQuery, state: FSMContext, callback_answer: CallbackAnswer):
     """Обработка выбора текущей группы при регистрации"""
-    group_num = int(callback.data.split("_")[-1])
+    group_num = parse_group_callback(callback.data)
     user_id = callback.from_user.id
     
+    # Кнопка из старого сообщения или подделанные данные: группы нет в каталоге
+    if group_num is None:
+        callback_answer.text = "❌ Такой группы нет. Начни заново с /start"
+        callback_answer.show_alert = True
+        return
+    
     # Сохраняем выбранную группу
     registration_data[user_id] = {
         'current_group': group_num,
-        'desired_groups': set()
+        'desired_groups': set(),
+        'page': 0
     }
     
     # Подтверждаем выбор группы
     await callback.message.edit_text(
-        f"✅ Запомнил, твоя группа — ИАД-{group_num}"
+        f"✅ Запомнил, твоя группа — {format_group_button(group_num)}"
     )
     
     # Показываем выбор желаемых групп (без расписания, оно уже было в первом сообщении)
@@ -84,17 +153,24 @@ async def process_group_selection(callback: CallbackQuery, state: FSMContext):
     )
     
     await state.set_state(RegistrationStates.selecting_desired_groups)
-    await callback.answer()
 
 
 @router.callback_query(F.data.startswith("toggle_desired_"), RegistrationStates.selecting_desired_groups)
-async def process_desired_group_toggle(callback: CallbackQuery, state: FSMContext):
+async def process_desired_group_toggle(callback: CallbackQuery, state: FSMContext, callback_answer: CallbackAnswer):
     """Обработка переключения желаемой группы при регистрации"""
-    group_num = int(callback.data.split("_")[-1])
     user_id = callback.from_user.id
     
     if user_id not in registration_data:
-        await callback.answer("❌ Ошибка. Начни заново с /start", show_alert=True)
+        callback_answer.text = "❌ Ошибка. Начни заново с /start"
+        callback_answer.show_alert = True
+        return
+    
+    # Желаемая группа — только другая группа той же программы
+    current_group = registration_data[user_id]['current_group']
+    group_num = parse_group_callback(callback.data, catalog.program_of(current_group))
+    if group_num is None or group_num == current_group:
+        callback_answer.text = "❌ Такой группы нет. Начни заново с /start"
+        callback_answer.show_alert = True
         return
     
     # Переключаем состояние группы
@@ -103,51 +179,78 @@ async def process_desired_group_toggle(callback: CallbackQuery, state: FSMContex
     else:
         registration_data[user_id]['desired_groups'].add(group_num)
     
-    current_group = registration_data[user_id]['current_group']
-    selected = registration_data[user_id]['desired_groups']
+    selected = set(registration_data[user_id]['desired_groups'])
+    page = registration_data[user_id]['page']
     
+    # Клавиатуру перерисовываем после паузы в нажатиях
+    schedule_markup_edit(
+        callback.message,
+        lambda: kb.get_desired_groups_keyboard(current_group, selected, page)
+    )
+
+
+@router.callback_query(F.data.startswith("desired_page_"), RegistrationStates.selecting_desired_groups)
+async def process_desired_groups_page(callback: CallbackQuery, state: FSMContext, callback_answer: CallbackAnswer):
+    """Листание страниц клавиатуры желаемых групп при регистрации"""
+    page = int(callback.data.split("_")[-1])
+    user_id = callback.from_user.id
+    
+    if user_id not in registration_data:
+        callback_answer.text = "❌ Ошибка. Начни заново с /start"
+        callback_answer.show_alert = True
+        return
+    
+    data = registration_data[user_id]
+    data['page'] = page
+    
+    await cancel_markup_edit(callback.message)
     await callback.message.edit_reply_markup(
-        reply_markup=kb.get_desired_groups_keyboard(current_group, selected)
+        reply_markup=kb.get_desired_groups_keyboard(data['current_group'], data['desired_groups'], page)
     )
-    await callback.answer()
 
 
 @router.callback_query(F.data == "desired_groups_done", RegistrationStates.selecting_desired_groups)
-async def process_desired_groups_done(callback: CallbackQuery, state: FSMContext):
+async def process_desired_groups_done(callback: CallbackQuery, state: FSMContext, callback_answer: CallbackAnswer):
     """Обработка завершения выбора желаемых групп"""
     user_id = callback.from_user.id
     
     if user_id not in registration_data:
-        await callback.answer("❌ Ошибка. Начни заново с /start", show_alert=True)
+        callback_answer.text = "❌ Ошибка. Начни заново с /start"
+        callback_answer.show_alert = True
         return
     
     desired = registration_data[user_id]['desired_groups']
     
     if not desired:
-        await callback.answer("❌ Выбери хотя бы одну группу!", show_alert=True)
+        callback_answer.text = "❌ Выбери хотя бы одну группу!"
+        callback_answer.show_alert = True
         return
     
     current_group = registration_data[user_id]['current_group']
     desired_str = format_groups_list_multiline(sorted(desired))
+    # Для экрана нужно только число мэтчей — без выборки кандидатов
+    available = format_matches_available(await count_matches(current_group, desired, exclude=user_id))
     
+    await cancel_markup_edit(callback.message)
     await callback.message.edit_text(
         f"📋 Проверь данные:\n\n"
         f"👤 Твоя группа: {format_group_text(current_group)}\n\n"
         f"🎯 Хочешь перевестись в:\n{desired_str}\n\n"
+        f"{available}"
         f"Всё верно?",
         reply_markup=kb.get_confirmation_keyboard()
     )
     await state.set_state(RegistrationStates.confirmation)
-    await callback.answer()
 
 
 @router.callback_query(F.data == "confirm_registration")
-async def process_confirmation(callback: CallbackQuery, state: FSMContext):
+async def process_confirmation(callback: CallbackQuery, state: FSMContext, callback_answer: CallbackAnswer):
     """Обработка подтверждения регистрации"""
     user_id = callback.from_user.id
     
     if user_id not in registration_data:
-        await callback.answer("❌ Ошибка. Начни заново с /start", show_alert=True)
+        callback_answer.text = "❌ Ошибка. Начни заново с /start"
+        callback_answer.show_alert = True
         return
     
     data = registration_data[user_id]
@@ -167,8 +270,8 @@ async def process_confirmation(callback: CallbackQuery, state: FSMContext):
     del registration_data[user_id]
     await state.clear()
     
-    # Проверяем мэтчи
-    matches = await check_and_notify_new_matches(user_id, callback.bot)
+    # Мэтчи проверяются в фоне, результат придёт отдельным сообщением
+    recheck_queue.enqueue(user_id)
     
     desired_str = format_groups_list_multiline(sorted(data['desired_groups']))
     
@@ -176,28 +279,25 @@ async def process_confirmation(callback: CallbackQuery, state: FSMContext):
         f"✅ Регистрация завершена!\n\n"
         f"👤 Твоя группа: {format_group_text(data['current_group'])}\n\n"
         f"🎯 Ищешь:\n{desired_str}\n\n"
+        f"Как только появится мэтч — я сразу напишу!"
     )
     
-    if matches:
-        text += f"🎉 Кстати, уже нашлось {len(matches)} мэтч(ей)! Проверь их в меню."
-    else:
-        text += "Как только появится мэтч — я сразу напишу!"
-    
     await callback.message.edit_text(text)
     await callback.message.answer(
         "🏠 Главное меню\n\nЧто хочешь сделать?",
         reply_markup=kb.get_main_menu_keyboard()
     )
-    await callback.answer()
 
 
 @router.callback_query(F.data == "edit_registration")
 async def process_edit_registration(callback: CallbackQuery, state: FSMContext):
     """Обработка редактирования данных регистрации"""
+    data = registration_data.get(callback.from_user.id, {})
+    program = catalog.program_of(data['current_group']) if 'current_group' in data else DEFAULT_PROGRAM
+    
     await callback.message.edit_text(
         "📍 В какой группе ты сейчас учишься?",
-        reply_markup=kb.get_group_selection_keyboard()
+        reply_markup=kb.get_group_selection_keyboard(program)
     )
     await state.set_state(RegistrationStates.selecting_current_group)
-    await callback.answer()
 
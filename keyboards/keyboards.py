@@ -1,29 +1,62 @@
 """Клавиатуры для бота"""
+from typing import List, Optional
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
-from config import GROUPS_COUNT, GROUP_SCHEDULE
+from config import DEFAULT_PROGRAM, GROUPS_PAGE_SIZE
+from utils.groups import catalog
+
+# Ограничение Telegram на длину текста сообщения
+MESSAGE_LIMIT = 4096
 
 
 def format_group_button(group_num: int, prefix: str = "") -> str:
     """Форматирование текста кнопки группы (без расписания)"""
     if prefix:
-        return f"{prefix} ИАД-{group_num}"
-    return f"ИАД-{group_num}"
+        return f"{prefix} {catalog.label(group_num)}"
+    return catalog.label(group_num)
 
 
-def get_schedule_message() -> str:
-    """Формирование сообщения с расписанием всех групп"""
+def get_schedule_messages(program: str = DEFAULT_PROGRAM, footer: str = "") -> List[str]:
+    """
+    Сообщения с расписанием всех групп программы, footer — в конце последнего.
+    Расписание большой программы режется между строками на несколько сообщений не длиннее MESSAGE_LIMIT.
+    """
+    texts = []
     text = "⏰ Расписание групп:\n\n"
-    for i in range(1, GROUPS_COUNT + 1):
-        schedule = GROUP_SCHEDULE[i]
-        text += f"ИАД-{i}: {schedule}\n"
-    return text
+    for group in catalog.program_groups(program):
+        line = f"{catalog.label(group.id)}: {group.schedule}\n"
+        if len(text) + len(line) > MESSAGE_LIMIT:
+            texts.append(text)
+            text = ""
+        text += line
+    if footer:
+        if len(text) + len(footer) + 1 > MESSAGE_LIMIT:
+            texts.append(text)
+            text = footer
+        else:
+            text += "\n" + footer
+    texts.append(text)
+    return texts
+
+
+def parse_group_callback(data: str, program: Optional[str] = None) -> Optional[int]:
+    """
+    id группы из callback_data кнопки группы (select_group_<id>, toggle_desired_<id>).
+    None, если это не id группы из каталога или группа не из program.
+    """
+    _, _, value = data.rpartition("_")
+    if not value.isdigit():
+        return None
+    group_id = int(value)
+    if not catalog.exists(group_id) or (program is not None and catalog.program_of(group_id) != program):
+        return None
+    return group_id
 
 
 def format_group_text(group_num: int) -> str:
     """Форматирование текста группы с расписанием для сообщений"""
-    schedule = GROUP_SCHEDULE[group_num]
-    return f"ИАД-{group_num} (⏰ {schedule})"
+    schedule = catalog.get(group_num).schedule
+    return f"{catalog.label(group_num)} (⏰ {schedule})"
 
 
 def format_groups_list(group_nums: list) -> str:
@@ -36,35 +69,68 @@ def format_groups_list_multiline(group_nums: list) -> str:
     return "\n".join([f"• {format_group_text(g)}" for g in sorted(group_nums)])
 
 
-def get_group_selection_keyboard() -> InlineKeyboardMarkup:
-    """Клавиатура для выбора текущей группы (2 ряда по 5)"""
+def format_matches_available(count: int) -> str:
+    """Строка экрана подтверждения о том, сколько мэтчей уже есть (пустая, если ни одного)"""
+    if not count:
+        return ""
+    return f"🔥 Уже сейчас есть с кем поменяться: {count}\n\n"
+
+
+def _page_navigation(builder: InlineKeyboardBuilder, program: str, page: int, callback_prefix: str):
+    """Ряд кнопок листания страниц групп (только если страниц больше одной)"""
+    pages = catalog.page_count(program, GROUPS_PAGE_SIZE)
+    if pages <= 1:
+        return
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton(text="◀️", callback_data=f"{callback_prefix}{page - 1}"))
+    buttons.append(InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data="noop"))
+    if page < pages - 1:
+        buttons.append(InlineKeyboardButton(text="▶️", callback_data=f"{callback_prefix}{page + 1}"))
+    builder.row(*buttons)
+
+
+def get_program_selection_keyboard() -> InlineKeyboardMarkup:
+    """Клавиатура для выбора программы"""
+    builder = InlineKeyboardBuilder()
+    for program in catalog.programs():
+        builder.button(text=catalog.program_title(program), callback_data=f"select_program_{program}")
+    builder.adjust(2)
+    return builder.as_markup()
+
+
+def get_group_selection_keyboard(program: str = DEFAULT_PROGRAM, page: int = 0) -> InlineKeyboardMarkup:
+    """Клавиатура для выбора текущей группы (страница групп программы, ряды по 5)"""
     builder = InlineKeyboardBuilder()
     
-    for i in range(1, GROUPS_COUNT + 1):
-        builder.button(text=format_group_button(i), callback_data=f"select_group_{i}")
+    for group in catalog.page(program, page, GROUPS_PAGE_SIZE):
+        builder.button(text=format_group_button(group.id), callback_data=f"select_group_{group.id}")
     
     builder.adjust(5)  # 5 кнопок в ряду
+    _page_navigation(builder, program, page, f"groups_page_{program}_")
     return builder.as_markup()
 
 
-def get_desired_groups_keyboard(current_group: int, selected_groups: set = None) -> InlineKeyboardMarkup:
-    """Клавиатура для выбора желаемых групп с toggle"""
+def get_desired_groups_keyboard(current_group: int, selected_groups: set = None, page: int = 0) -> InlineKeyboardMarkup:
+    """Клавиатура для выбора желаемых групп с toggle (страница групп программы пользователя)"""
     if selected_groups is None:
         selected_groups = set()
     
+    program = catalog.program_of(current_group)
     builder = InlineKeyboardBuilder()
     
-    for i in range(1, GROUPS_COUNT + 1):
-        if i == current_group:
+    for group in catalog.page(program, page, GROUPS_PAGE_SIZE):
+        if group.id == current_group:
             continue  # Пропускаем текущую группу
         
-        if i in selected_groups:
-            builder.button(text=format_group_button(i, "✅"), callback_data=f"toggle_desired_{i}")
+        if group.id in selected_groups:
+            builder.button(text=format_group_button(group.id, "✅"), callback_data=f"toggle_desired_{group.id}")
         else:
-            builder.button(text=format_group_button(i, "⬜"), callback_data=f"toggle_desired_{i}")
+            builder.button(text=format_group_button(group.id, "⬜"), callback_data=f"toggle_desired_{group.id}")
     
     builder.adjust(5)  # 5 кнопок в ряду
-    builder.button(text="✅ Готово", callback_data="desired_groups_done")
+    _page_navigation(builder, program, page, "desired_page_")
+    builder.row(InlineKeyboardButton(text="✅ Готово", callback_data="desired_groups_done"))
     
     return builder.as_markup()
 
@@ -95,3 +161,11 @@ def get_delete_confirmation_keyboard() -> InlineKeyboardMarkup:
     builder.button(text="❌ Отмена", callback_data="cancel_delete")
     return builder.as_markup()
 
+
+def get_keep_active_keyboard() -> InlineKeyboardMarkup:
+    """Клавиатура предупреждения об удалении за неактивность"""
+    builder = InlineKeyboardBuilder()
+    builder.button(text="🔍 Я ещё ищу обмен", callback_data="keep_active")
+    builder.button(text="🚪 Больше не ищу", callback_data="confirm_delete")
+    builder.adjust(1)
+    return builder.as_markup()
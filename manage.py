@@ -0,0 +1,226 @@
+"""Служебные команды для работы с базой бота из командной строки"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+
+import config
+import database
+from utils import backup, bulk, tracing, traffic
+
+
+async def cmd_import(args) -> int:
+    fmt = args.format or bulk.detect_format(args.path)
+    errors = []
+    started = time.monotonic()
+    await database.init_db()
+    with open(args.path, encoding="utf-8", newline="") as file:
+        imported = await bulk.import_users(file, fmt, args.replace, args.chunk_size, errors)
+    print(f"Импортировано: {imported}, ошибок: {len(errors)}, за {time.monotonic() - started:.1f} с")
+    return 1 if errors else 0
+
+
+async def cmd_export(args) -> int:
+    fmt = args.format or bulk.detect_format(args.path)
+    started = time.monotonic()
+    await database.init_db()
+    with open(args.path, "w", encoding="utf-8", newline="") as file:
+        exported = await bulk.export_users(file, fmt, args.chunk_size)
+    print(f"Экспортировано: {exported}, за {time.monotonic() - started:.1f} с")
+    return 0
+
+
+async def cmd_collect_traces(args) -> int:
+    from aiohttp import web
+
+    runner = web.AppRunner(tracing.collector_app(tracing.JsonlExporter(args.output)), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    print(f"Коллектор трасс: http://{args.host}:{args.port}/v1/traces -> {args.output} (Ctrl+C — выход)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+    return 0
+
+
+async def cmd_traces(args) -> int:
+    with open(args.path, encoding="utf-8") as file:
+        spans = [json.loads(line) for line in file if line.strip()]
+    roots = tracing.build_trees(spans)
+    for root in roots[:args.slowest]:
+        print(f"trace {root['trace_id']}")
+        print(tracing.format_tree(root))
+        print()
+    print(f"Трасс: {len(roots)}, спанов: {len(spans)}")
+    return 0
+
+
+async def cmd_replay(args) -> int:
+    from aiogram import Bot, Dispatcher
+    from aiogram.fsm.storage.memory import MemoryStorage
+
+    import bot as bot_module
+    from utils.groups import catalog
+    from utils.match_queue import recheck_queue
+    from utils.notifications import match_notifier
+
+    # Воспроизведение пишет в БД синтетических пользователей — рабочую БД по умолчанию не трогаем
+    if args.backend == "sqlite" and not args.database:
+        print("Для --backend sqlite укажи --database (файл не должен быть рабочей БД)")
+        return 1
+
+    records = list(traffic.read_records(args.path))[:args.limit or None]
+    # Воспроизведение меняет данные — по умолчанию в пустом хранилище в памяти
+    await database.init_db(args.backend, args.database)
+    await database.open_storage()
+    catalog.load(await database.get_programs(), await database.get_groups())
+    await database.load_match_index()
+
+    bot = Bot("123456:replay", session=traffic.StubSession(args.api_latency))
+    dp = Dispatcher(storage=MemoryStorage())
+    bot_module.register_handlers(dp)
+    recheck_queue.start(bot)
+    try:
+        report = await traffic.replay(dp, bot, records, args.speed)
+    finally:
+        await recheck_queue.drain(30)
+        await match_notifier.flush()
+        await database.close_storage()
+    print(traffic.format_replay_report(report))
+    return 0
+
+
+async def cmd_bench_sweep(args) -> int:
+    from utils.sweep import compute_mutual_pairs
+
+    # Синтетическая база: текущая группа и желаемые выбираются равномерно
+    rng = random.Random(args.seed)
+    groups = range(1, args.groups + 1)
+    rows = []
+    for telegram_id in range(1, args.users + 1):
+        current_group = rng.choice(groups)
+        for desired_group in rng.sample([group for group in groups if group != current_group], args.desired):
+            rows.append((telegram_id, current_group, desired_group))
+
+    best = None
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        pairs = compute_mutual_pairs(rows)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    per_pair = best / len(pairs) * 1e9 if pairs else 0.0
+    print(f"Строк: {len(rows)}, взаимных пар: {len(pairs)}, лучшее время: {best:.2f} с ({per_pair:.0f} нс на пару)")
+    return 0
+
+
+async def cmd_vacuum(args) -> int:
+    started = time.monotonic()
+    await database.init_db()
+    await database.vacuum()
+    print(f"VACUUM выполнен за {time.monotonic() - started:.1f} с; свободные страницы дальше освобождает обслуживание БД")
+    return 0
+
+
+async def cmd_backup(args) -> int:
+    started = time.monotonic()
+    archive = await asyncio.to_thread(
+        backup.create_backup, args.database or config.DATABASE_PATH, args.dir or config.BACKUP_DIR,
+        config.BACKUP_KEEP, config.BACKUP_PAGES_PER_STEP, config.BACKUP_STEP_PAUSE,
+    )
+    print(f"Резервная копия: {archive} ({archive.stat().st_size} байт), за {time.monotonic() - started:.1f} с")
+    return 0
+
+
+async def cmd_restore(args) -> int:
+    db_path = args.database or config.DATABASE_PATH
+    archive = args.path
+    if archive is None:
+        archives = backup.list_backups(config.BACKUP_DIR)
+        if not archives:
+            print(f"В {config.BACKUP_DIR} нет резервных копий")
+            return 1
+        archive = str(archives[-1])
+    try:
+        await asyncio.to_thread(backup.restore_backup, archive, db_path)
+    except ValueError as e:
+        print(e)
+        return 1
+    print(f"{db_path} восстановлена из {archive}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Служебные команды Group Changer Bot")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Импорт пользователей из CSV/JSONL")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=["csv", "jsonl"], help="по умолчанию — по расширению файла")
+    import_parser.add_argument("--replace", action="store_true", help="перезаписывать существующих пользователей")
+    import_parser.add_argument("--chunk-size", type=int, default=5000)
+    import_parser.set_defaults(handler=cmd_import)
+
+    export_parser = subparsers.add_parser("export", help="Экспорт пользователей в CSV/JSONL")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--format", choices=["csv", "jsonl"], help="по умолчанию — по расширению файла")
+    export_parser.add_argument("--chunk-size", type=int, default=5000)
+    export_parser.set_defaults(handler=cmd_export)
+
+    collect_parser = subparsers.add_parser("collect-traces", help="Локальный коллектор трасс (OTLP/JSON -> JSONL)")
+    collect_parser.add_argument("--host", default="127.0.0.1")
+    collect_parser.add_argument("--port", type=int, default=4318)
+    collect_parser.add_argument("--output", default="traces.jsonl")
+    collect_parser.set_defaults(handler=cmd_collect_traces)
+
+    traces_parser = subparsers.add_parser("traces", help="Самые долгие трассы из файла JSONL")
+    traces_parser.add_argument("path")
+    traces_parser.add_argument("--slowest", type=int, default=5)
+    traces_parser.set_defaults(handler=cmd_traces)
+
+    replay_parser = subparsers.add_parser("replay", help="Воспроизведение записанных апдейтов (TRAFFIC_RECORD_PATH)")
+    replay_parser.add_argument("path")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="во сколько раз быстрее записи; 0 — без пауз")
+    replay_parser.add_argument("--api-latency", type=float, default=0.0, help="имитация задержки Bot API (сек)")
+    replay_parser.add_argument("--limit", type=int, help="воспроизвести только первые N апдейтов")
+    replay_parser.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+    replay_parser.add_argument("--database", help="файл SQLite для --backend sqlite (обязателен)")
+    replay_parser.set_defaults(handler=cmd_replay)
+
+    bench_parser = subparsers.add_parser("bench-sweep", help="Замер вычисления всех мэтчей на синтетической базе")
+    bench_parser.add_argument("--users", type=int, default=100000)
+    bench_parser.add_argument("--groups", type=int, default=30)
+    bench_parser.add_argument("--desired", type=int, default=2, help="желаемых групп у каждого пользователя")
+    bench_parser.add_argument("--repeat", type=int, default=3)
+    bench_parser.add_argument("--seed", type=int, default=1)
+    bench_parser.set_defaults(handler=cmd_bench_sweep)
+
+    vacuum_parser = subparsers.add_parser(
+        "vacuum", help="Сжатие БД и включение инкрементального vacuum (при остановленном боте)"
+    )
+    vacuum_parser.set_defaults(handler=cmd_vacuum)
+
+    backup_parser = subparsers.add_parser("backup", help="Резервная копия БД (можно при работающем боте)")
+    backup_parser.add_argument("--database", help="по умолчанию — DATABASE_PATH")
+    backup_parser.add_argument("--dir", help="по умолчанию — BACKUP_DIR")
+    backup_parser.set_defaults(handler=cmd_backup)
+
+    restore_parser = subparsers.add_parser("restore", help="Восстановление БД из резервной копии (при остановленном боте)")
+    restore_parser.add_argument("path", nargs="?", help="архив .db.gz; по умолчанию — последний в BACKUP_DIR")
+    restore_parser.add_argument("--database", help="по умолчанию — DATABASE_PATH")
+    restore_parser.set_defaults(handler=cmd_restore)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+    args = build_parser().parse_args(argv)
+    return asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Ранний ответ на нажатия инлайн-кнопок"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CallbackAnswer:
+    """
+    Параметры ответа на callback, которые хендлер может переопределить.
+    Ответ уходит не позже дедлайна, даже если хендлер ещё работает, поэтому текст и алерт
+    нужно задавать до первого await хендлера. Заданные после ответа не показываются:
+    такой случай пишется в лог и считается в метрике callback_answer_late.
+    """
+
+    def __init__(self, callback_id: str = ""):
+        self.callback_id = callback_id
+        self._text: Optional[str] = None
+        self._show_alert: Optional[bool] = None
+        self.answered = False
+
+    def _check_late(self, field: str):
+        if self.answered:
+            metrics.counter("callback_answer_late").inc()
+            logger.warning("%s ответа на callback %s задан после ответа и не будет показан", field, self.callback_id)
+
+    @property
+    def text(self) -> Optional[str]:
+        return self._text
+
+    @text.setter
+    def text(self, value: Optional[str]):
+        self._check_late("text")
+        self._text = value
+
+    @property
+    def show_alert(self) -> Optional[bool]:
+        return self._show_alert
+
+    @show_alert.setter
+    def show_alert(self, value: Optional[bool]):
+        self._check_late("show_alert")
+        self._show_alert = value
+
+
+class EarlyCallbackAnswerMiddleware(BaseMiddleware):
+    """
+    Inner middleware для callback-хендлеров.
+    Отвечает на callback сразу после хендлера или по истечении дедлайна, если хендлер
+    ещё работает, чтобы «часики» на кнопке не висели всё время обработки.
+    Хендлер получает объект `callback_answer` и может задать текст или алерт (до первого await).
+    """
+
+    def __init__(self, deadline: float):
+        self.deadline = deadline
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, CallbackQuery):
+            return await handler(event, data)
+
+        callback_answer = data["callback_answer"] = CallbackAnswer(event.id)
+        started = time.monotonic()
+
+        task = asyncio.ensure_future(handler(event, data))
+        try:
+            done, _ = await asyncio.wait({task}, timeout=self.deadline)
+            if not done:
+                metrics.counter("callback_answer_deadline_hit").inc()
+                await self._answer(event, callback_answer, started)
+            return await task
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            if not callback_answer.answered:
+                await self._answer(event, callback_answer, started)
+
+    async def _answer(self, event: CallbackQuery, callback_answer: CallbackAnswer, started: float):
+        callback_answer.answered = True
+        try:
+            await event.answer(text=callback_answer.text, show_alert=callback_answer.show_alert)
+        except Exception as e:
+            # Ответ на callback не критичен: запрос мог устареть
+            logger.warning("Не удалось ответить на callback %s: %s", event.id, e)
+        metrics.histogram("callback_answer_latency").observe(time.monotonic() - started)
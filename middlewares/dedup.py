@@ -0,0 +1,100 @@
+"""Отбрасывание повторных апдейтов и двойных нажатий на кнопки"""
+import logging
+import math
+import time
+from contextlib import suppress
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Hashable, Iterable, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import TelegramObject, Update
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Кнопки, повторное нажатие которых повторило бы действие (запись в БД, удаление, экран подтверждения).
+# Переключение групп, листание страниц и noop сюда не входят: быстрые повторные нажатия там — норма
+NON_IDEMPOTENT_ACTIONS = frozenset({
+    "confirm_registration",
+    "confirm_delete",
+    "confirm_edit_current_group",
+    "confirm_edit_desired_groups",
+    "desired_groups_done",
+})
+
+
+def _purge(entries: Dict[Hashable, float], older_than: float):
+    """Удаление устаревших записей: словарь упорядочен по времени, проверяется только начало"""
+    while entries:
+        key = next(iter(entries))
+        if entries[key] > older_than:
+            break
+        del entries[key]
+
+
+class DeduplicationMiddleware(BaseMiddleware):
+    """
+    Outer middleware для dp.update.
+    Апдейт с уже виденным update_id или id callback-запроса (повторная доставка) отбрасывается
+    молча. Повторное нажатие кнопки из actions (пользователь, callback_data), пока прошлое ещё
+    обрабатывается или закончилось меньше action_window секунд назад, тоже отбрасывается, но на
+    него отвечаем, чтобы на кнопке не крутились «часики». Процессы-воркеры получают апдейты пользователя
+    всегда одного и того же, поэтому кэша в памяти процесса достаточно.
+    """
+
+    def __init__(self, ttl: float, action_window: float, actions: Iterable[str] = NON_IDEMPOTENT_ACTIONS):
+        self.ttl = ttl
+        self.action_window = action_window
+        self.actions: FrozenSet[str] = frozenset(actions)
+        # Ключ -> когда увиден
+        self._seen: Dict[Hashable, float] = {}
+        # (пользователь, callback_data) -> когда закончилась обработка; пока идёт — inf
+        self._actions: Dict[Tuple[int, str], float] = {}
+
+    def size(self) -> int:
+        return len(self._seen) + len(self._actions)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+
+        now = time.monotonic()
+        _purge(self._seen, now - self.ttl)
+        _purge(self._actions, now - self.action_window)
+
+        callback = event.callback_query
+        keys = [("update", event.update_id)]
+        if callback is not None:
+            keys.append(("callback", callback.id))
+        if any(key in self._seen for key in keys):
+            metrics.counter("duplicate_updates_dropped").inc()
+            logger.debug("Повторная доставка апдейта %s отброшена", event.update_id)
+            return UNHANDLED
+        for key in keys:
+            self._seen[key] = now
+
+        if callback is None or callback.data not in self.actions:
+            return await handler(event, data)
+
+        action = (callback.from_user.id, callback.data)
+        if now - self._actions.get(action, -math.inf) < self.action_window:
+            metrics.counter("duplicate_callbacks_dropped").inc()
+            logger.debug("Повторное нажатие %s отброшено", callback.data)
+            with suppress(TelegramBadRequest):
+                await data["bot"].answer_callback_query(callback.id)
+            return UNHANDLED
+
+        self._actions[action] = math.inf
+        try:
+            return await handler(event, data)
+        finally:
+            # Перестановка в конец сохраняет порядок словаря по времени
+            self._actions.pop(action, None)
+            self._actions[action] = time.monotonic()
@@ -0,0 +1,49 @@
+"""Контекст апдейта для записей лога"""
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+import config
+from utils.logs import log_context
+
+logger = logging.getLogger(__name__)
+
+
+class LogContextMiddleware(BaseMiddleware):
+    """
+    Outer middleware на dp.update выставляет контекст (update_id, user_id) для всех записей лога
+    во время обработки апдейта и пишет запись о её длительности. Inner middleware на хендлерах
+    сообщений и callback-ов добавляет в контекст имя хендлера.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Update):
+            context = log_context.get()
+            if context is not None:
+                callback = getattr(data.get("handler"), "callback", None)
+                # Словарь контекста свой у каждого апдейта — дополняем его на месте,
+                # чтобы имя хендлера попало и в итоговую запись outer middleware
+                context['handler'] = getattr(callback, "__qualname__", repr(callback))
+            return await handler(event, data)
+
+        user = data.get("event_from_user")
+        context = {'update_id': event.update_id, 'user_id': user.id if user else None}
+        token = log_context.set(context)
+        started = time.monotonic()
+        try:
+            return await handler(event, data)
+        finally:
+            duration = time.monotonic() - started
+            level = logging.WARNING if duration >= config.LOG_SLOW_UPDATE else logging.DEBUG
+            if logger.isEnabledFor(level):
+                logger.log(level, "Апдейт обработан за %.0f мс", duration * 1000,
+                           extra={'duration_ms': round(duration * 1000, 1)})
+            log_context.reset(token)
@@ -0,0 +1,32 @@
+"""Подсчёт апдейтов для профилирования по запросу"""
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from utils.profiler import Profiler
+
+
+class ProfilerMiddleware(BaseMiddleware):
+    """
+    Outer middleware для dp.update: сообщает профилировщику о завершённых апдейтах,
+    чтобы профилирование «на N апдейтов» выключилось вовремя.
+    Пока профилировщик выключен, стоит одной проверки флага.
+    """
+
+    def __init__(self, profiler: Profiler):
+        self.profiler = profiler
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not self.profiler.active:
+            return await handler(event, data)
+        try:
+            return await handler(event, data)
+        finally:
+            if self.profiler.active:
+                self.profiler.update_done()
@@ -0,0 +1,48 @@
+"""Спаны трассировки для апдейтов, хендлеров и запросов к Bot API"""
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject, Update
+
+from utils.tracing import tracer
+
+
+class TracingMiddleware(BaseMiddleware):
+    """
+    Outer middleware на dp.update открывает корневой спан трассы апдейта
+    (решение о сэмплировании — здесь). Inner middleware на хендлерах сообщений
+    и callback-ов добавляет дочерний спан с именем хендлера.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if isinstance(event, Update):
+            # event_from_user выставляет UserContextMiddleware диспетчера, он выполняется раньше
+            user = data.get("event_from_user")
+            async with tracer.trace(
+                "update", update_id=event.update_id, type=event.event_type, user_id=user.id if user else 0,
+            ):
+                return await handler(event, data)
+
+        callback = getattr(data.get("handler"), "callback", None)
+        attributes = {}
+        if isinstance(event, CallbackQuery):
+            attributes['data'] = event.data or ""
+        elif isinstance(event, Message) and event.text and event.text.startswith("/"):
+            # Только команды: текст сообщений пользователей в трассы не попадает
+            attributes['command'] = event.text.split()[0]
+        async with tracer.span(f"handler {getattr(callback, '__qualname__', repr(callback))}", **attributes):
+            return await handler(event, data)
+
+
+class BotApiTracingMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: спан на каждый вызов метода Bot API"""
+
+    async def __call__(self, make_request, bot, method):
+        async with tracer.span(f"bot.{method.__api_method__}"):
+            return await make_request(bot, method)
@@ -0,0 +1,56 @@
+"""Какие хендлеры сейчас выполняются (для диагностики задержек цикла событий)"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+
+class UpdateTracker(BaseMiddleware):
+    """
+    Inner middleware для хендлеров сообщений и callback-ов.
+    Запоминает, какой хендлер и для какого события выполняет каждая задача.
+    Регистрируется последним, чтобы работать в той же задаче, что и сам хендлер.
+    """
+
+    def __init__(self):
+        self._running: Dict[asyncio.Task, Dict] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        task = asyncio.current_task()
+        self._running[task] = self._describe(event, data)
+        try:
+            return await handler(event, data)
+        finally:
+            self._running.pop(task, None)
+
+    @staticmethod
+    def _describe(event: TelegramObject, data: Dict[str, Any]) -> Dict:
+        handler_object = data.get("handler")
+        callback = getattr(handler_object, "callback", None)
+        info = {
+            'handler': getattr(callback, "__qualname__", repr(callback)),
+            'event': type(event).__name__,
+            'user_id': event.from_user.id if getattr(event, "from_user", None) else None,
+            'started': time.monotonic(),
+        }
+        if isinstance(event, CallbackQuery):
+            info['data'] = event.data
+        elif isinstance(event, Message) and event.text and event.text.startswith("/"):
+            # Только команды: текст сообщений пользователей в логи не попадает
+            info['command'] = event.text.split()[0]
+        return info
+
+    def get(self, task: Optional[asyncio.Task]) -> Optional[Dict]:
+        """Описание хендлера, выполняемого задачей"""
+        return self._running.get(task) if task is not None else None
+
+    def running(self) -> List[Dict]:
+        """Все выполняющиеся сейчас хендлеры"""
+        return list(self._running.values())
@@ -0,0 +1,6 @@
+"""Хранилища данных бота"""
+from storage.base import Repository, IntegrityError
+from storage.memory import InMemoryRepository
+from storage.sqlite import SQLiteRepository
+
+__all__ = ['Repository', 'IntegrityError', 'InMemoryRepository', 'SQLiteRepository']
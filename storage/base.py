@@ -0,0 +1,115 @@
+"""Интерфейс хранилища данных бота"""
+import sqlite3
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Protocol, Set, Tuple
+
+from utils.groups import Group
+
+# Ошибка нарушения целостности (например, повторное создание пользователя) — общая для всех хранилищ
+IntegrityError = sqlite3.IntegrityError
+
+# Максимум id в одном запросе IN (...) — ограничение SQLite на число переменных
+IN_CHUNK_SIZE = 500
+
+
+class Repository(Protocol):
+    """Операции с пользователями, желаемыми группами, каталогом групп и уведомлёнными парами"""
+
+    async def init(self) -> None:
+        """Создание схемы и синхронизация каталога групп с config.PROGRAMS"""
+
+    async def open(self) -> None:
+        """Открытие долгоживущих ресурсов (подключения, фоновые задачи)"""
+
+    async def close(self) -> None:
+        """Закрытие ресурсов с сохранением всех принятых изменений"""
+
+    async def user_exists(self, telegram_id: int) -> bool: ...
+
+    async def create_user(self, telegram_id: int, username: Optional[str], first_name: str,
+                          current_group: int) -> None: ...
+
+    async def update_user_group(self, telegram_id: int, current_group: int) -> None: ...
+
+    async def set_desired_groups(self, telegram_id: int, desired_groups: List[int]) -> None: ...
+
+    async def get_user(self, telegram_id: int) -> Optional[Dict]: ...
+
+    async def get_desired_groups(self, telegram_id: int) -> List[int]: ...
+
+    async def get_desired_groups_for(self, telegram_ids: List[int]) -> Dict[int, List[int]]: ...
+
+    async def get_users_from_group(self, group: int) -> List[Dict]: ...
+
+    async def delete_user(self, telegram_id: int) -> None: ...
+
+    async def get_all_users(self) -> List[Dict]: ...
+
+    async def get_users(self, telegram_ids: List[int]) -> Dict[int, Dict]: ...
+
+    async def get_programs(self) -> List[Tuple[str, str]]: ...
+
+    async def get_groups(self, program: Optional[str] = None) -> List[Group]: ...
+
+    async def get_match_rows(self) -> List[Tuple[int, int, Optional[int]]]: ...
+
+    async def get_change_counter(self) -> int:
+        """Растёт при каждом изменении пользователей и желаемых групп"""
+
+    async def get_own_changes(self) -> int:
+        """На сколько счётчик изменений сдвинули записи этого процесса"""
+
+    async def get_change_log(self, after_seq: int, limit: int = 1000) -> List[Tuple[int, int]]:
+        """Пары (seq, telegram_id) изменений пользователей после after_seq"""
+
+    async def get_change_log_bounds(self) -> Tuple[int, int]:
+        """(первый, последний) seq журнала; для пустого журнала первый = последний + 1"""
+
+    async def prune_change_log(self, keep: int) -> None: ...
+
+    async def get_notified_pairs(self) -> Set[Tuple[int, int]]: ...
+
+    async def add_notified_pairs(self, pairs: List[Tuple[int, int]]) -> None: ...
+
+    async def remove_notified_pairs(self, pairs: List[Tuple[int, int]]) -> None: ...
+
+    async def get_notified_partners(self, telegram_id: int) -> Set[int]:
+        """С кем у пользователя уже есть уведомлённая пара"""
+
+    async def count_matches(self, current_group: int, desired_groups: List[int],
+                            exclude: Optional[int] = None) -> int:
+        """Сколько пользователей из desired_groups хотят в current_group (без exclude)"""
+
+    async def has_matches(self, current_group: int, desired_groups: List[int],
+                          exclude: Optional[int] = None) -> bool: ...
+
+    async def get_group_population(self) -> Dict[int, int]: ...
+
+    async def get_demand_matrix(self) -> Dict[Tuple[int, int], int]: ...
+
+    async def import_users(self, users: List[Dict], replace: bool = False) -> int: ...
+
+    def iter_users_with_desired(self, chunk_size: int = 1000) -> AsyncIterator[Dict]: ...
+
+    async def touch_user(self, telegram_id: int) -> None:
+        """Отметка активности: updated_at = сейчас"""
+
+    async def get_users_to_warn(self, updated_before: datetime, limit: int) -> List[int]:
+        """Пользователи без изменений с updated_before, не предупреждённые после последнего изменения"""
+
+    async def mark_expiry_warned(self, telegram_ids: List[int]) -> None: ...
+
+    async def get_users_to_expire(self, updated_before: datetime, warned_before: datetime,
+                                  limit: int) -> List[int]:
+        """Пользователи без изменений с updated_before, предупреждённые до warned_before и после изменения"""
+
+    async def delete_users(self, telegram_ids: List[int]) -> None: ...
+
+    async def optimize(self) -> None:
+        """Обновление статистики для планировщика запросов"""
+
+    async def incremental_vacuum(self, max_pages: int) -> int:
+        """Возврат до max_pages свободных страниц файлу; возвращает число освобождённых"""
+
+    async def vacuum(self) -> None:
+        """Полное сжатие с переходом на инкрементальный vacuum (бот должен быть остановлен)"""
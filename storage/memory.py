@@ -0,0 +1,294 @@
+"""Хранилище в памяти процесса (словари и множества)"""
+from collections import deque
+from datetime import datetime
+from itertools import islice
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from config import CHANGE_LOG_KEEP, PROGRAMS
+from storage.base import IntegrityError
+from utils.groups import Group, config_groups
+
+
+def _timestamp(moment: datetime) -> str:
+    # Тот же формат, в котором SQLite возвращает TIMESTAMP
+    return moment.isoformat(" ")
+
+
+def _now() -> str:
+    return _timestamp(datetime.now())
+
+
+class InMemoryRepository:
+    """
+    Хранилище без диска: данные живут, пока жив процесс.
+    Подходит для тестов и бенчмарков; все операции — O(1) или O(размер ответа).
+    """
+
+    def __init__(self, change_log_keep: int = CHANGE_LOG_KEEP):
+        self._users: Dict[int, Dict] = {}
+        self._desired: Dict[int, List[int]] = {}
+        self._by_group: Dict[int, Set[int]] = {}
+        self._programs: Dict[str, str] = {}
+        self._groups: Dict[int, Group] = {}
+        # Уведомлённые пары хранятся с обеих сторон: пользователь -> его партнёры
+        self._notified: Dict[int, Set[int]] = {}
+        self._changes = 0
+        # Журнал ограничен: без ChangeFeed (один процесс, бенчмарки) его никто не очищает
+        self._change_log: Deque[Tuple[int, int]] = deque(maxlen=change_log_keep)
+        self._expiry_warned: Dict[int, str] = {}
+
+    def _forget_notified(self, telegram_id: int):
+        for partner in self._notified.pop(telegram_id, ()):
+            partners = self._notified[partner]
+            partners.discard(telegram_id)
+            if not partners:
+                del self._notified[partner]
+
+    def _changed(self, telegram_id: int):
+        self._changes += 1
+        self._change_log.append((self._changes, telegram_id))
+
+    async def init(self):
+        self._programs.update((code, program['title']) for code, program in PROGRAMS.items())
+        self._groups.update((group.id, group) for group in config_groups())
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def user_exists(self, telegram_id: int) -> bool:
+        return telegram_id in self._users
+
+    async def create_user(self, telegram_id: int, username: Optional[str], first_name: str, current_group: int):
+        if telegram_id in self._users:
+            raise IntegrityError("UNIQUE constraint failed: users.telegram_id")
+        now = _now()
+        self._users[telegram_id] = {
+            'telegram_id': telegram_id,
+            'username': username,
+            'first_name': first_name,
+            'current_group': current_group,
+            'created_at': now,
+            'updated_at': now,
+        }
+        self._by_group.setdefault(current_group, set()).add(telegram_id)
+        self._changed(telegram_id)
+
+    async def update_user_group(self, telegram_id: int, current_group: int):
+        user = self._users.get(telegram_id)
+        if user is None:
+            return
+        self._by_group[user['current_group']].discard(telegram_id)
+        self._by_group.setdefault(current_group, set()).add(telegram_id)
+        user['current_group'] = current_group
+        user['updated_at'] = _now()
+        self._changed(telegram_id)
+
+    async def set_desired_groups(self, telegram_id: int, desired_groups: List[int]):
+        if telegram_id not in self._users:
+            if desired_groups:
+                raise IntegrityError("FOREIGN KEY constraint failed")
+            return
+        self._desired[telegram_id] = list(desired_groups)
+        self._users[telegram_id]['updated_at'] = _now()
+        self._changed(telegram_id)
+
+    async def get_user(self, telegram_id: int) -> Optional[Dict]:
+        user = self._users.get(telegram_id)
+        return dict(user) if user else None
+
+    async def get_desired_groups(self, telegram_id: int) -> List[int]:
+        return list(self._desired.get(telegram_id, []))
+
+    async def get_desired_groups_for(self, telegram_ids: List[int]) -> Dict[int, List[int]]:
+        return {
+            telegram_id: list(self._desired[telegram_id])
+            for telegram_id in telegram_ids if self._desired.get(telegram_id)
+        }
+
+    async def get_users_from_group(self, group: int) -> List[Dict]:
+        return [dict(self._users[telegram_id]) for telegram_id in sorted(self._by_group.get(group, ()))]
+
+    async def delete_user(self, telegram_id: int):
+        user = self._users.pop(telegram_id, None)
+        if user is None:
+            return
+        self._by_group[user['current_group']].discard(telegram_id)
+        self._desired.pop(telegram_id, None)
+        self._expiry_warned.pop(telegram_id, None)
+        self._forget_notified(telegram_id)
+        self._changed(telegram_id)
+
+    async def get_all_users(self) -> List[Dict]:
+        return [dict(self._users[telegram_id]) for telegram_id in sorted(self._users)]
+
+    async def get_users(self, telegram_ids: List[int]) -> Dict[int, Dict]:
+        return {
+            telegram_id: dict(self._users[telegram_id])
+            for telegram_id in telegram_ids if telegram_id in self._users
+        }
+
+    async def get_programs(self) -> List[Tuple[str, str]]:
+        return sorted(self._programs.items())
+
+    async def get_groups(self, program: Optional[str] = None) -> List[Group]:
+        groups = [g for g in self._groups.values() if program is None or g.program == program]
+        return sorted(groups, key=lambda g: (g.program, g.number))
+
+    async def get_match_rows(self) -> List[Tuple[int, int, Optional[int]]]:
+        rows = []
+        for telegram_id, user in self._users.items():
+            desired = self._desired.get(telegram_id)
+            if desired:
+                rows.extend((telegram_id, user['current_group'], group) for group in desired)
+            else:
+                rows.append((telegram_id, user['current_group'], None))
+        return rows
+
+    async def get_change_counter(self) -> int:
+        return self._changes
+
+    async def get_own_changes(self) -> int:
+        # Хранилище в памяти другим процессам недоступно
+        return self._changes
+
+    async def get_change_log(self, after_seq: int, limit: int = 1000) -> List[Tuple[int, int]]:
+        # seq в журнале идут подряд: позиция записи вычисляется по первому seq
+        if not self._change_log:
+            return []
+        start = max(0, after_seq + 1 - self._change_log[0][0])
+        return list(islice(self._change_log, start, start + limit))
+
+    async def get_change_log_bounds(self) -> Tuple[int, int]:
+        first = self._change_log[0][0] if self._change_log else self._changes + 1
+        return (first, self._changes)
+
+    async def prune_change_log(self, keep: int):
+        while self._change_log and self._change_log[0][0] <= self._changes - keep:
+            self._change_log.popleft()
+
+    async def get_notified_pairs(self) -> Set[Tuple[int, int]]:
+        return {(a, b) for a, partners in self._notified.items() for b in partners if a < b}
+
+    async def add_notified_pairs(self, pairs: List[Tuple[int, int]]):
+        for a, b in pairs:
+            self._notified.setdefault(a, set()).add(b)
+            self._notified.setdefault(b, set()).add(a)
+
+    async def remove_notified_pairs(self, pairs: List[Tuple[int, int]]):
+        for a, b in pairs:
+            for user, partner in ((a, b), (b, a)):
+                partners = self._notified.get(user)
+                if partners is not None:
+                    partners.discard(partner)
+                    if not partners:
+                        del self._notified[user]
+
+    async def get_notified_partners(self, telegram_id: int) -> Set[int]:
+        return set(self._notified.get(telegram_id, ()))
+
+    def _match_candidates(self, current_group: int, desired_groups: List[int], exclude: Optional[int]):
+        for desired_group in set(desired_groups):
+            for telegram_id in self._by_group.get(desired_group, ()):
+                if telegram_id != exclude and current_group in self._desired.get(telegram_id, ()):
+                    yield telegram_id
+
+    async def count_matches(self, current_group: int, desired_groups: List[int], exclude: Optional[int] = None) -> int:
+        return sum(1 for _ in self._match_candidates(current_group, desired_groups, exclude))
+
+    async def has_matches(self, current_group: int, desired_groups: List[int], exclude: Optional[int] = None) -> bool:
+        return next(self._match_candidates(current_group, desired_groups, exclude), None) is not None
+
+    async def get_group_population(self) -> Dict[int, int]:
+        return {group: len(users) for group, users in self._by_group.items() if users}
+
+    async def get_demand_matrix(self) -> Dict[Tuple[int, int], int]:
+        matrix: Dict[Tuple[int, int], int] = {}
+        for telegram_id, desired in self._desired.items():
+            user = self._users.get(telegram_id)
+            if user is None:
+                continue
+            for group in desired:
+                key = (user['current_group'], group)
+                matrix[key] = matrix.get(key, 0) + 1
+        return matrix
+
+    async def import_users(self, users: List[Dict], replace: bool = False) -> int:
+        imported = 0
+        for user in users:
+            telegram_id = user['telegram_id']
+            if telegram_id in self._users:
+                if not replace:
+                    continue
+                existing = self._users[telegram_id]
+                await self.update_user_group(telegram_id, user['current_group'])
+                existing['username'] = user['username']
+                existing['first_name'] = user['first_name']
+            else:
+                await self.create_user(telegram_id, user['username'], user['first_name'], user['current_group'])
+            await self.set_desired_groups(telegram_id, user['desired_groups'])
+            imported += 1
+        return imported
+
+    async def iter_users_with_desired(self, chunk_size: int = 1000):
+        for telegram_id in sorted(self._users):
+            user = self._users[telegram_id]
+            yield {
+                'telegram_id': telegram_id,
+                'username': user['username'],
+                'first_name': user['first_name'],
+                'current_group': user['current_group'],
+                'desired_groups': sorted(self._desired.get(telegram_id, [])),
+            }
+
+    async def touch_user(self, telegram_id: int):
+        user = self._users.get(telegram_id)
+        if user is not None:
+            user['updated_at'] = _now()
+            self._changed(telegram_id)
+
+    def _inactive(self, updated_before: datetime) -> List[Dict]:
+        cutoff = _timestamp(updated_before)
+        return sorted((user for user in self._users.values() if user['updated_at'] < cutoff),
+                      key=lambda user: user['updated_at'])
+
+    async def get_users_to_warn(self, updated_before: datetime, limit: int) -> List[int]:
+        return [
+            user['telegram_id'] for user in self._inactive(updated_before)
+            if self._expiry_warned.get(user['telegram_id'], "") < user['updated_at']
+        ][:limit]
+
+    async def mark_expiry_warned(self, telegram_ids: List[int]):
+        now = _now()
+        self._expiry_warned.update((telegram_id, now) for telegram_id in telegram_ids if telegram_id in self._users)
+
+    async def get_users_to_expire(self, updated_before: datetime, warned_before: datetime, limit: int) -> List[int]:
+        cutoff = _timestamp(warned_before)
+        expiring = [
+            (warned_at, user['telegram_id']) for user in self._inactive(updated_before)
+            for warned_at in (self._expiry_warned.get(user['telegram_id']),)
+            if warned_at is not None and user['updated_at'] <= warned_at < cutoff
+        ]
+        return [telegram_id for _, telegram_id in sorted(expiring)[:limit]]
+
+    async def delete_users(self, telegram_ids: List[int]):
+        for telegram_id in telegram_ids:
+            user = self._users.pop(telegram_id, None)
+            if user is None:
+                continue
+            self._by_group[user['current_group']].discard(telegram_id)
+            self._desired.pop(telegram_id, None)
+            self._expiry_warned.pop(telegram_id, None)
+            self._forget_notified(telegram_id)
+            self._changed(telegram_id)
+
+    async def optimize(self):
+        pass
+
+    async def incremental_vacuum(self, max_pages: int) -> int:
+        return 0
+
+    async def vacuum(self):
+        pass
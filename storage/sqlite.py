@@ -0,0 +1,815 @@
+"""Хранилище на SQLite (aiosqlite)"""
+import asyncio
+import logging
+import time
+import aiosqlite
+from pathlib import Path
+from datetime import datetime
+from typing import Optional, List, Dict, Callable, Awaitable, Any
+from contextlib import asynccontextmanager
+from config import PROGRAMS
+from storage.base import IN_CHUNK_SIZE
+from utils.groups import Group, config_groups
+from utils.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Операция записи: получает подключение и выполняет запросы без commit
+WriteOp = Callable[[aiosqlite.Connection], Awaitable[Any]]
+
+
+class _ReadPool:
+    """
+    Пул подключений только для чтения (mode=ro + query_only).
+    В режиме WAL читатели не ждут завершения транзакции писателя.
+    """
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._connections: List[aiosqlite.Connection] = []
+
+    async def open(self):
+        uri = Path(self.path).resolve().as_uri() + "?mode=ro"
+        for _ in range(self.size):
+            db = await aiosqlite.connect(uri, uri=True)
+            await db.execute("PRAGMA query_only = ON")
+            db.row_factory = aiosqlite.Row
+            self._connections.append(db)
+            self._idle.put_nowait(db)
+
+    async def close(self):
+        for db in self._connections:
+            await db.close()
+        self._connections.clear()
+
+    @asynccontextmanager
+    async def acquire(self):
+        db = await self._idle.get()
+        try:
+            yield db
+        finally:
+            self._idle.put_nowait(db)
+
+
+class _Writer:
+    """
+    Единственный писатель в БД.
+    Операции записи приходят через очередь и применяются пачками в одной транзакции
+    (group commit): пачка закрывается по интервалу или по размеру. Каждая операция
+    выполняется в своём SAVEPOINT, поэтому ошибка одной не откатывает соседние.
+    Future вызывающего разрешается после COMMIT.
+    Внутри транзакции писателя чужие записи невозможны, поэтому сдвиг счётчика изменений
+    за пачку — ровно вклад этого процесса (changes).
+    """
+
+    def __init__(self, path: str, interval: float, max_size: int):
+        self.path = path
+        self.interval = interval
+        self.max_size = max_size
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._db: Optional[aiosqlite.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+        self.changes = 0
+
+    async def start(self):
+        # Транзакциями управляем сами (BEGIN/COMMIT)
+        self._db = await aiosqlite.connect(self.path, isolation_level=None)
+        await self._db.execute("PRAGMA foreign_keys = ON")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановка после применения всех уже поставленных операций"""
+        await self._queue.put(None)
+        await self._task
+        await self._db.close()
+
+    async def submit(self, op: WriteOp) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((op, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.interval
+            while len(batch) < self.max_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._apply(batch)
+
+    async def _apply(self, batch: list):
+        db = self._db
+        results = []
+        try:
+            # IMMEDIATE: блокировка записи берётся сразу (с ожиданием по busy timeout),
+            # если в ту же БД пишут другие процессы
+            await db.execute("BEGIN IMMEDIATE")
+            counter = await self._change_counter()
+            for op, future in batch:
+                await db.execute("SAVEPOINT write_op")
+                try:
+                    result = await op(db)
+                except Exception as e:
+                    await db.execute("ROLLBACK TO write_op")
+                    results.append((future, None, e))
+                else:
+                    results.append((future, result, None))
+                await db.execute("RELEASE write_op")
+            changes = await self._change_counter() - counter
+            await db.execute("COMMIT")
+            self.changes += changes
+        except Exception as e:
+            logger.error("Ошибка применения пачки из %s записей: %s", len(batch), e)
+            if db.in_transaction:
+                await db.execute("ROLLBACK")
+            results = [(future, None, e) for _, future in batch]
+
+        for future, result, error in results:
+            if future.cancelled():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    async def _change_counter(self) -> int:
+        async with self._db.execute("SELECT value FROM meta WHERE key = 'change_counter'") as cursor:
+            row = await cursor.fetchone()
+            return row[0] if row else 0
+
+
+class SQLiteRepository:
+    """
+    Хранилище в файле SQLite.
+    Без open() каждая операция открывает своё подключение; после open() запись идёт
+    через единственного писателя (group commit), а чтение — через пул подключений.
+    """
+
+    def __init__(self, path: str, wal: bool = True, read_pool_size: int = 4,
+                 write_batch_interval: float = 0.01, write_batch_max_size: int = 200,
+                 change_log: bool = False):
+        self.path = path
+        self.wal = wal
+        self.change_log = change_log
+        self.read_pool_size = read_pool_size
+        self.write_batch_interval = write_batch_interval
+        self.write_batch_max_size = write_batch_max_size
+        self._writer: Optional[_Writer] = None
+        self._read_pool: Optional[_ReadPool] = None
+
+    @asynccontextmanager
+    async def _get_db(self):
+        """Получение подключения к БД с включенными foreign keys"""
+        async with aiosqlite.connect(self.path) as db:
+            # Включаем поддержку внешних ключей для CASCADE (нужно при каждом подключении)
+            await db.execute("PRAGMA foreign_keys = ON")
+            yield db
+
+    @asynccontextmanager
+    async def _get_read_db(self):
+        """Подключение для чтения: из пула, если он открыт, иначе отдельное"""
+        async with tracer.span("sqlite.read", pooled=self._read_pool is not None) as span:
+            if self._read_pool is not None:
+                started = time.monotonic()
+                async with self._read_pool.acquire() as db:
+                    if span is not None:
+                        span.set('pool_wait_ms', round((time.monotonic() - started) * 1000, 3))
+                    yield db
+            else:
+                async with self._get_db() as db:
+                    yield db
+
+    async def _write(self, op: WriteOp) -> Any:
+        """Выполнение операции записи: через писателя, если он запущен, иначе отдельным подключением"""
+        # Для писателя спан включает ожидание своей пачки и её COMMIT
+        async with tracer.span("sqlite.write", batched=self._writer is not None):
+            if self._writer is not None:
+                return await self._writer.submit(op)
+            async with self._get_db() as db:
+                result = await op(db)
+                await db.commit()
+                return result
+
+    async def open(self):
+        """Запуск писателя (group commit) и пула подключений для чтения"""
+        writer = _Writer(self.path, self.write_batch_interval, self.write_batch_max_size)
+        await writer.start()
+        self._writer = writer
+        pool = _ReadPool(self.path, self.read_pool_size)
+        await pool.open()
+        self._read_pool = pool
+
+    async def close(self):
+        """Закрытие пула и остановка писателя с применением всех ожидающих изменений"""
+        if self._read_pool is not None:
+            pool, self._read_pool = self._read_pool, None
+            await pool.close()
+        # Писатель закрывается последним: он переносит WAL в основной файл
+        if self._writer is not None:
+            writer, self._writer = self._writer, None
+            await writer.stop()
+
+    async def init(self):
+        """Инициализация базы данных"""
+        async with self._get_db() as db:
+            # Инкрементальный vacuum (обслуживание БД) включается только до создания таблиц;
+            # существующую БД переводит manage.py vacuum
+            async with db.execute("SELECT COUNT(*) FROM sqlite_master") as cursor:
+                empty = (await cursor.fetchone())[0] == 0
+            if empty:
+                await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            
+            if self.wal:
+                # WAL: чтения из пула не блокируются записью (режим сохраняется в файле БД)
+                await db.execute("PRAGMA journal_mode = WAL")
+            
+            # Таблица пользователей
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    telegram_id INTEGER PRIMARY KEY,
+                    username TEXT,
+                    first_name TEXT,
+                    current_group INTEGER,
+                    created_at TIMESTAMP,
+                    updated_at TIMESTAMP
+                )
+            """)
+            
+            # Таблица желаемых групп
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS desired_groups (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    telegram_id INTEGER,
+                    desired_group INTEGER,
+                    FOREIGN KEY (telegram_id) REFERENCES users(telegram_id) ON DELETE CASCADE
+                )
+            """)
+            
+            # Каталог программ и групп
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS programs (
+                    code TEXT PRIMARY KEY,
+                    title TEXT
+                )
+            """)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS groups (
+                    id INTEGER PRIMARY KEY,
+                    program TEXT,
+                    number INTEGER,
+                    schedule TEXT,
+                    FOREIGN KEY (program) REFERENCES programs(code)
+                )
+            """)
+            
+            # Пары, которым уже отправлено уведомление о мэтче (user_a < user_b)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS notified_matches (
+                    user_a INTEGER,
+                    user_b INTEGER,
+                    notified_at TIMESTAMP,
+                    PRIMARY KEY (user_a, user_b)
+                )
+            """)
+            
+            # Счётчик изменений пользователей и желаемых групп: по нему проверяется
+            # актуальность снимка индекса мэтчей (utils/snapshot.py)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            """)
+            await db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('change_counter', 0)")
+            for table in ("users", "desired_groups"):
+                for event in ("INSERT", "UPDATE", "DELETE"):
+                    await db.execute(f"""
+                        CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_counter AFTER {event} ON {table}
+                        BEGIN
+                            UPDATE meta SET value = value + 1 WHERE key = 'change_counter';
+                        END
+                    """)
+            
+            # Журнал изменённых пользователей: по нему процессы-воркеры обновляют
+            # свои индексы мэтчей после записей других воркеров (utils/change_feed.py)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS change_log (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    telegram_id INTEGER NOT NULL
+                )
+            """)
+            for table in ("users", "desired_groups"):
+                for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+                    trigger = f"{table}_{event.lower()}_log"
+                    if self.change_log:
+                        await db.execute(f"""
+                            CREATE TRIGGER IF NOT EXISTS {trigger} AFTER {event} ON {table}
+                            BEGIN
+                                INSERT INTO change_log (telegram_id) VALUES ({row}.telegram_id);
+                            END
+                        """)
+                    else:
+                        # Один процесс — журнал не нужен и не должен расти
+                        await db.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            
+            # Когда пользователя предупредили об удалении за неактивность (utils/maintenance.py)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS expiry_warnings (
+                    telegram_id INTEGER PRIMARY KEY,
+                    warned_at TIMESTAMP,
+                    FOREIGN KEY (telegram_id) REFERENCES users(telegram_id) ON DELETE CASCADE
+                )
+            """)
+            
+            # Индексы для выборок по группам и пользователю
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_users_current_group ON users(current_group)")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_desired_groups_user ON desired_groups(telegram_id)")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_desired_groups_group ON desired_groups(desired_group)")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_groups_program ON groups(program, number)")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_users_updated_at ON users(updated_at)")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_notified_matches_user_b ON notified_matches(user_b)")
+            
+            # Синхронизируем каталог с config.PROGRAMS
+            await db.executemany("""
+                INSERT INTO programs (code, title) VALUES (?, ?)
+                ON CONFLICT(code) DO UPDATE SET title = excluded.title
+            """, [(code, program['title']) for code, program in PROGRAMS.items()])
+            await db.executemany("""
+                INSERT INTO groups (id, program, number, schedule) VALUES (?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    program = excluded.program, number = excluded.number, schedule = excluded.schedule
+            """, config_groups())
+            
+            await db.commit()
+
+    async def user_exists(self, telegram_id: int) -> bool:
+        """Проверка существования пользователя"""
+        async with self._get_read_db() as db:
+            async with db.execute(
+                "SELECT 1 FROM users WHERE telegram_id = ?", (telegram_id,)
+            ) as cursor:
+                return await cursor.fetchone() is not None
+
+    async def create_user(self, telegram_id: int, username: Optional[str], first_name: str, current_group: int):
+        """Создание нового пользователя"""
+        now = datetime.now()
+        
+        async def _op(db):
+            await db.execute("""
+                INSERT INTO users (telegram_id, username, first_name, current_group, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (telegram_id, username, first_name, current_group, now, now))
+        
+        await self._write(_op)
+
+    async def update_user_group(self, telegram_id: int, current_group: int):
+        """Обновление текущей группы пользователя"""
+        now = datetime.now()
+        
+        async def _op(db):
+            await db.execute("""
+                UPDATE users SET current_group = ?, updated_at = ?
+                WHERE telegram_id = ?
+            """, (current_group, now, telegram_id))
+        
+        await self._write(_op)
+
+    async def set_desired_groups(self, telegram_id: int, desired_groups: List[int]):
+        """Установка желаемых групп (удаляет старые и добавляет новые)"""
+        now = datetime.now()
+        
+        async def _op(db):
+            # Изменение желаемых — тоже активность (по updated_at удаляются неактивные)
+            await db.execute("UPDATE users SET updated_at = ? WHERE telegram_id = ?", (now, telegram_id))
+            
+            # Удаляем старые желаемые группы
+            await db.execute("DELETE FROM desired_groups WHERE telegram_id = ?", (telegram_id,))
+            
+            # Добавляем новые
+            await db.executemany(
+                "INSERT INTO desired_groups (telegram_id, desired_group) VALUES (?, ?)",
+                [(telegram_id, group) for group in desired_groups]
+            )
+        
+        await self._write(_op)
+
+    async def get_user(self, telegram_id: int) -> Optional[Dict]:
+        """Получение данных пользователя"""
+        async with self._get_read_db() as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(
+                "SELECT * FROM users WHERE telegram_id = ?", (telegram_id,)
+            ) as cursor:
+                row = await cursor.fetchone()
+                if row:
+                    return dict(row)
+                return None
+
+    async def get_desired_groups(self, telegram_id: int) -> List[int]:
+        """Получение списка желаемых групп пользователя"""
+        async with self._get_read_db() as db:
+            async with db.execute(
+                "SELECT desired_group FROM desired_groups WHERE telegram_id = ?", (telegram_id,)
+            ) as cursor:
+                rows = await cursor.fetchall()
+                return [row[0] for row in rows]
+
+    async def get_desired_groups_for(self, telegram_ids: List[int]) -> Dict[int, List[int]]:
+        """Желаемые группы нескольких пользователей (только у кого они есть)"""
+        telegram_ids = list(telegram_ids)
+        desired: Dict[int, List[int]] = {}
+        async with self._get_read_db() as db:
+            for start in range(0, len(telegram_ids), IN_CHUNK_SIZE):
+                chunk = telegram_ids[start:start + IN_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                async with db.execute(
+                    f"SELECT telegram_id, desired_group FROM desired_groups WHERE telegram_id IN ({placeholders})",
+                    chunk
+                ) as cursor:
+                    for telegram_id, desired_group in await cursor.fetchall():
+                        desired.setdefault(telegram_id, []).append(desired_group)
+        return desired
+    
+    async def get_users_from_group(self, group: int) -> List[Dict]:
+        """Получение всех пользователей из указанной группы"""
+        async with self._get_read_db() as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(
+                "SELECT * FROM users WHERE current_group = ?", (group,)
+            ) as cursor:
+                rows = await cursor.fetchall()
+                return [dict(row) for row in rows]
+
+    async def delete_user(self, telegram_id: int):
+        """Удаление пользователя из базы (CASCADE удалит и желаемые группы)"""
+        async def _op(db):
+            await db.execute("DELETE FROM users WHERE telegram_id = ?", (telegram_id,))
+            # При повторной регистрации мэтчи снова будут уведомлены
+            await db.execute(
+                "DELETE FROM notified_matches WHERE user_a = ? OR user_b = ?", (telegram_id, telegram_id)
+            )
+        
+        await self._write(_op)
+
+    async def get_all_users(self) -> List[Dict]:
+        """Получение всех пользователей (для отладки)"""
+        async with self._get_read_db() as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("SELECT * FROM users") as cursor:
+                rows = await cursor.fetchall()
+                return [dict(row) for row in rows]
+
+    async def get_users(self, telegram_ids: List[int]) -> Dict[int, Dict]:
+        """Получение данных нескольких пользователей (запросами по IN_CHUNK_SIZE id)"""
+        telegram_ids = list(telegram_ids)
+        users = {}
+        if not telegram_ids:
+            return users
+        async with self._get_read_db() as db:
+            db.row_factory = aiosqlite.Row
+            for start in range(0, len(telegram_ids), IN_CHUNK_SIZE):
+                chunk = telegram_ids[start:start + IN_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                async with db.execute(
+                    f"SELECT * FROM users WHERE telegram_id IN ({placeholders})", chunk
+                ) as cursor:
+                    for row in await cursor.fetchall():
+                        users[row['telegram_id']] = dict(row)
+        return users
+
+    async def get_programs(self) -> List[tuple]:
+        """Получение программ: пары (код, название)"""
+        async with self._get_read_db() as db:
+            async with db.execute("SELECT code, title FROM programs ORDER BY code") as cursor:
+                return [(row[0], row[1]) for row in await cursor.fetchall()]
+
+    async def get_groups(self, program: Optional[str] = None) -> List[Group]:
+        """Получение групп (всех или одной программы)"""
+        query = "SELECT id, program, number, schedule FROM groups"
+        params = ()
+        if program is not None:
+            query += " WHERE program = ?"
+            params = (program,)
+        async with self._get_read_db() as db:
+            async with db.execute(query + " ORDER BY program, number", params) as cursor:
+                return [Group(*row) for row in await cursor.fetchall()]
+
+    async def get_match_rows(self) -> List[tuple]:
+        """
+        Все пользователи с желаемыми группами за один запрос:
+        строки (telegram_id, current_group, desired_group), desired_group = None, если желаемых нет
+        """
+        async with self._get_read_db() as db:
+            async with db.execute("""
+                SELECT u.telegram_id, u.current_group, d.desired_group
+                FROM users u LEFT JOIN desired_groups d ON d.telegram_id = u.telegram_id
+            """) as cursor:
+                return [(row[0], row[1], row[2]) for row in await cursor.fetchall()]
+
+    async def get_change_counter(self) -> int:
+        """Счётчик изменений пользователей и желаемых групп"""
+        async with self._get_read_db() as db:
+            async with db.execute("SELECT value FROM meta WHERE key = 'change_counter'") as cursor:
+                row = await cursor.fetchone()
+                return row[0] if row else 0
+    
+    async def get_own_changes(self) -> int:
+        """Сдвиг счётчика изменений записями через писателя (после open()); без писателя — 0"""
+        return self._writer.changes if self._writer is not None else 0
+    
+    async def get_change_log(self, after_seq: int, limit: int = 1000) -> List[tuple]:
+        """Записи журнала изменений после after_seq: пары (seq, telegram_id)"""
+        async with self._get_read_db() as db:
+            async with db.execute(
+                "SELECT seq, telegram_id FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?",
+                (after_seq, limit)
+            ) as cursor:
+                return [tuple(row) for row in await cursor.fetchall()]
+    
+    async def get_change_log_bounds(self) -> tuple:
+        """
+        (первый, последний) seq журнала изменений.
+        Последний выданный seq сохраняется и после очистки журнала; для пустого журнала первый = последний + 1.
+        """
+        async with self._get_read_db() as db:
+            async with db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'") as cursor:
+                row = await cursor.fetchone()
+                last = row[0] if row else 0
+            async with db.execute("SELECT MIN(seq) FROM change_log") as cursor:
+                first = (await cursor.fetchone())[0]
+                return (first if first is not None else last + 1, last)
+    
+    async def prune_change_log(self, keep: int):
+        """Удаление старых записей журнала изменений (остаются последние keep)"""
+        async def _op(db):
+            await db.execute(
+                "DELETE FROM change_log WHERE seq <= (SELECT MAX(seq) FROM change_log) - ?", (keep,)
+            )
+        
+        await self._write(_op)
+    
+    async def get_notified_pairs(self) -> set:
+        """Пары (user_a, user_b), user_a < user_b, которым уже отправлено уведомление"""
+        async with self._get_read_db() as db:
+            async with db.execute("SELECT user_a, user_b FROM notified_matches") as cursor:
+                return {(row[0], row[1]) for row in await cursor.fetchall()}
+
+    async def add_notified_pairs(self, pairs: List[tuple]):
+        """Отметка пар как уведомлённых"""
+        now = datetime.now()
+        
+        async def _op(db):
+            await db.executemany(
+                "INSERT OR IGNORE INTO notified_matches (user_a, user_b, notified_at) VALUES (?, ?, ?)",
+                [(min(a, b), max(a, b), now) for a, b in pairs]
+            )
+        
+        await self._write(_op)
+
+    async def remove_notified_pairs(self, pairs: List[tuple]):
+        """Удаление отметок для пар, которые больше не являются мэтчем"""
+        async def _op(db):
+            await db.executemany(
+                "DELETE FROM notified_matches WHERE user_a = ? AND user_b = ?",
+                [(min(a, b), max(a, b)) for a, b in pairs]
+            )
+        
+        await self._write(_op)
+
+    async def get_notified_partners(self, telegram_id: int) -> set:
+        """С кем у пользователя уже есть уведомлённая пара"""
+        async with self._get_read_db() as db:
+            async with db.execute("""
+                SELECT user_b FROM notified_matches WHERE user_a = ?
+                UNION ALL
+                SELECT user_a FROM notified_matches WHERE user_b = ?
+            """, (telegram_id, telegram_id)) as cursor:
+                return {row[0] for row in await cursor.fetchall()}
+
+    @staticmethod
+    def _matches_query(select: str, current_group: int, desired_groups: List[int], exclude: Optional[int]):
+        """Кандидаты из desired_groups, желающие в current_group: запрос по idx_desired_groups_group"""
+        placeholders = ", ".join("?" * len(desired_groups))
+        return f"""
+            SELECT {select}
+            FROM desired_groups d JOIN users u ON u.telegram_id = d.telegram_id
+            WHERE d.desired_group = ? AND u.current_group IN ({placeholders}) AND u.telegram_id IS NOT ?
+        """, (current_group, *desired_groups, exclude)
+
+    async def count_matches(self, current_group: int, desired_groups: List[int], exclude: Optional[int] = None) -> int:
+        """Число кандидатов на обмен одним COUNT, без выборки строк"""
+        desired_groups = list(desired_groups)
+        if not desired_groups:
+            return 0
+        query, params = self._matches_query("COUNT(DISTINCT u.telegram_id)", current_group, desired_groups, exclude)
+        async with self._get_read_db() as db:
+            async with db.execute(query, params) as cursor:
+                return (await cursor.fetchone())[0]
+
+    async def has_matches(self, current_group: int, desired_groups: List[int], exclude: Optional[int] = None) -> bool:
+        """Есть ли хоть один кандидат на обмен (запрос останавливается на первой строке)"""
+        desired_groups = list(desired_groups)
+        if not desired_groups:
+            return False
+        query, params = self._matches_query("1", current_group, desired_groups, exclude)
+        async with self._get_read_db() as db:
+            async with db.execute(query + " LIMIT 1", params) as cursor:
+                return await cursor.fetchone() is not None
+
+    async def get_group_population(self) -> Dict[int, int]:
+        """Количество пользователей в каждой группе (один GROUP BY)"""
+        async with self._get_read_db() as db:
+            async with db.execute(
+                "SELECT current_group, COUNT(*) FROM users GROUP BY current_group"
+            ) as cursor:
+                return {row[0]: row[1] for row in await cursor.fetchall()}
+
+    async def get_demand_matrix(self) -> Dict[tuple, int]:
+        """Количество желающих по парам (текущая группа, желаемая группа) (один GROUP BY)"""
+        async with self._get_read_db() as db:
+            async with db.execute("""
+                SELECT u.current_group, d.desired_group, COUNT(*)
+                FROM desired_groups d JOIN users u ON u.telegram_id = d.telegram_id
+                GROUP BY u.current_group, d.desired_group
+            """) as cursor:
+                return {(row[0], row[1]): row[2] for row in await cursor.fetchall()}
+
+    async def import_users(self, users: List[Dict], replace: bool = False) -> int:
+        """
+        Загрузка пачки пользователей с желаемыми группами одной транзакцией (executemany).
+        users — словари с ключами telegram_id, username, first_name, current_group, desired_groups.
+        Без replace существующие пользователи пропускаются. Возвращает число записанных пользователей.
+        """
+        now = datetime.now()
+        
+        async def _op(db):
+            rows = users
+            if not replace:
+                ids = [user['telegram_id'] for user in users]
+                existing = set()
+                for start in range(0, len(ids), IN_CHUNK_SIZE):
+                    chunk = ids[start:start + IN_CHUNK_SIZE]
+                    placeholders = ", ".join("?" * len(chunk))
+                    async with db.execute(
+                        f"SELECT telegram_id FROM users WHERE telegram_id IN ({placeholders})", chunk
+                    ) as cursor:
+                        existing.update(row[0] for row in await cursor.fetchall())
+                rows = [user for user in users if user['telegram_id'] not in existing]
+            if not rows:
+                return 0
+            
+            await db.executemany("""
+                INSERT INTO users (telegram_id, username, first_name, current_group, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(telegram_id) DO UPDATE SET
+                    username = excluded.username,
+                    first_name = excluded.first_name,
+                    current_group = excluded.current_group,
+                    updated_at = excluded.updated_at
+            """, [
+                (user['telegram_id'], user['username'], user['first_name'], user['current_group'], now, now)
+                for user in rows
+            ])
+            await db.executemany(
+                "DELETE FROM desired_groups WHERE telegram_id = ?",
+                [(user['telegram_id'],) for user in rows]
+            )
+            await db.executemany(
+                "INSERT INTO desired_groups (telegram_id, desired_group) VALUES (?, ?)",
+                [(user['telegram_id'], group) for user in rows for group in user['desired_groups']]
+            )
+            return len(rows)
+        
+        return await self._write(_op)
+
+    async def iter_users_with_desired(self, chunk_size: int = 1000):
+        """Потоковая выгрузка пользователей с желаемыми группами (по chunk_size строк)"""
+        async with self._get_read_db() as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("""
+                SELECT u.telegram_id, u.username, u.first_name, u.current_group,
+                       group_concat(d.desired_group) AS desired
+                FROM users u LEFT JOIN desired_groups d ON d.telegram_id = u.telegram_id
+                GROUP BY u.telegram_id
+                ORDER BY u.telegram_id
+            """) as cursor:
+                while True:
+                    rows = await cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        user = dict(row)
+                        desired = user.pop('desired')
+                        user['desired_groups'] = sorted(int(g) for g in desired.split(",")) if desired else []
+                        yield user
+
+    async def touch_user(self, telegram_id: int):
+        """Отметка активности пользователя: updated_at = сейчас"""
+        now = datetime.now()
+        
+        async def _op(db):
+            await db.execute("UPDATE users SET updated_at = ? WHERE telegram_id = ?", (now, telegram_id))
+        
+        await self._write(_op)
+
+    async def get_users_to_warn(self, updated_before: datetime, limit: int) -> List[int]:
+        """Неактивные с updated_before пользователи, которых не предупреждали после последнего изменения"""
+        async with self._get_read_db() as db:
+            async with db.execute("""
+                SELECT u.telegram_id
+                FROM users u LEFT JOIN expiry_warnings w ON w.telegram_id = u.telegram_id
+                WHERE u.updated_at < ? AND (w.warned_at IS NULL OR w.warned_at < u.updated_at)
+                ORDER BY u.updated_at
+                LIMIT ?
+            """, (updated_before, limit)) as cursor:
+                return [row[0] for row in await cursor.fetchall()]
+
+    async def mark_expiry_warned(self, telegram_ids: List[int]):
+        """Отметка предупреждения об удалении"""
+        now = datetime.now()
+        
+        async def _op(db):
+            await db.executemany("""
+                INSERT INTO expiry_warnings (telegram_id, warned_at) VALUES (?, ?)
+                ON CONFLICT(telegram_id) DO UPDATE SET warned_at = excluded.warned_at
+            """, [(telegram_id, now) for telegram_id in telegram_ids])
+        
+        await self._write(_op)
+
+    async def get_users_to_expire(self, updated_before: datetime, warned_before: datetime, limit: int) -> List[int]:
+        """Неактивные пользователи, предупреждённые до warned_before (и после последнего изменения)"""
+        async with self._get_read_db() as db:
+            async with db.execute("""
+                SELECT u.telegram_id
+                FROM expiry_warnings w JOIN users u ON u.telegram_id = w.telegram_id
+                WHERE u.updated_at < ? AND w.warned_at >= u.updated_at AND w.warned_at < ?
+                ORDER BY w.warned_at
+                LIMIT ?
+            """, (updated_before, warned_before, limit)) as cursor:
+                return [row[0] for row in await cursor.fetchall()]
+
+    async def delete_users(self, telegram_ids: List[int]):
+        """Удаление нескольких пользователей одной операцией записи"""
+        telegram_ids = list(telegram_ids)
+        
+        async def _op(db):
+            for start in range(0, len(telegram_ids), IN_CHUNK_SIZE):
+                chunk = telegram_ids[start:start + IN_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                await db.execute(f"DELETE FROM users WHERE telegram_id IN ({placeholders})", chunk)
+                await db.execute(
+                    f"DELETE FROM notified_matches WHERE user_a IN ({placeholders}) OR user_b IN ({placeholders})",
+                    chunk + chunk
+                )
+        
+        if telegram_ids:
+            await self._write(_op)
+
+    async def optimize(self):
+        """ANALYZE с ограниченной выборкой строк и PRAGMA optimize — через писателя, между пачками записей"""
+        async def _op(db):
+            await db.execute("PRAGMA analysis_limit = 1000")
+            await db.execute("ANALYZE")
+            await db.execute("PRAGMA optimize")
+        
+        await self._write(_op)
+
+    async def incremental_vacuum(self, max_pages: int) -> int:
+        """Возврат до max_pages свободных страниц файлу (в режиме auto_vacuum = INCREMENTAL)"""
+        async def _op(db):
+            async with db.execute("PRAGMA auto_vacuum") as cursor:
+                if (await cursor.fetchone())[0] != 2:
+                    # Без INCREMENTAL прагма ничего не делает (manage.py vacuum переводит БД)
+                    return 0
+            async with db.execute("PRAGMA freelist_count") as cursor:
+                before = (await cursor.fetchone())[0]
+            # Прагма освобождает по странице на шаг, а sqlite3 делает только один шаг запроса,
+            # не возвращающего строк; executescript не подходит — он завершает транзакцию пачки
+            for _ in range(min(before, max_pages)):
+                await db.execute("PRAGMA incremental_vacuum(1)")
+            async with db.execute("PRAGMA freelist_count") as cursor:
+                return before - (await cursor.fetchone())[0]
+        
+        return await self._write(_op)
+
+    async def vacuum(self):
+        """Полный VACUUM с переводом в auto_vacuum = INCREMENTAL; только при остановленном боте"""
+        async with aiosqlite.connect(self.path, isolation_level=None) as db:
+            await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            await db.execute("VACUUM")
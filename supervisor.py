@@ -0,0 +1,174 @@
+"""Запуск бота несколькими процессами: вебхук-фронтенд и воркеры"""
+import asyncio
+import json
+import logging
+import signal
+import sys
+from contextlib import suppress
+from pathlib import Path
+from typing import List, Optional
+
+import aiohttp
+from aiohttp import web
+from aiogram import Bot
+
+import config
+import database
+from bot import install_signal_handlers
+from utils import metrics
+from utils.bot_session import create_bot_session
+from utils.logs import configure_from_config
+from utils.sharding import shard_of, update_user_id
+
+logger = logging.getLogger(__name__)
+
+BOT_SCRIPT = str(Path(__file__).with_name("bot.py"))
+
+# Пауза перед перезапуском упавшего воркера (сек)
+RESTART_DELAY = 1.0
+
+
+class UpdateRouter:
+    """
+    Фронтенд вебхука: принимает апдейты от Telegram и пересылает каждый воркеру
+    по id пользователя. Если воркер недоступен, Telegram получает 503 и повторит доставку.
+    """
+
+    def __init__(self, worker_urls: List[str], secret: str = ""):
+        self.worker_urls = worker_urls
+        self.secret = secret
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self):
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != self.secret:
+            return web.Response(status=403)
+        body = await request.read()
+        try:
+            update = json.loads(body)
+        except ValueError:
+            return web.Response(status=400)
+
+        shard = shard_of(update_user_id(update), len(self.worker_urls))
+        try:
+            async with self._session.post(
+                self.worker_urls[shard], data=body, headers={"Content-Type": "application/json"}
+            ) as response:
+                status = 200 if response.status == 200 else 503
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning("Воркер %s недоступен: %s", shard, e)
+            status = 503
+        metrics.counter(f"webhook_updates_worker_{shard}" if status == 200 else "webhook_updates_failed").inc()
+        return web.Response(status=status)
+
+    def app(self, path: str) -> web.Application:
+        app = web.Application()
+        app.router.add_post(path, self.handle)
+        return app
+
+
+class WorkerProcess:
+    """Процесс-воркер: bot.py --worker index; упавший воркер перезапускается"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._stopping = False
+        self._watcher: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._watcher = asyncio.create_task(self._watch())
+
+    async def _spawn(self):
+        # Своя сессия: Ctrl+C в терминале получает только supervisor, а воркеры — его SIGTERM
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, BOT_SCRIPT, "--worker", str(self.index), start_new_session=True
+        )
+        logger.info("Воркер %s запущен (pid %s)", self.index, self.process.pid)
+
+    async def _watch(self):
+        while not self._stopping:
+            await self._spawn()
+            code = await self.process.wait()
+            if self._stopping:
+                break
+            logger.error("Воркер %s завершился с кодом %s, перезапуск", self.index, code)
+            metrics.counter("worker_restarts").inc()
+            await asyncio.sleep(RESTART_DELAY)
+
+    async def stop(self, timeout: float):
+        """SIGTERM и ожидание мягкой остановки воркера; по истечении timeout — SIGKILL"""
+        self._stopping = True
+        process = self.process
+        if process is not None and process.returncode is None:
+            process.send_signal(signal.SIGTERM)
+            try:
+                await asyncio.wait_for(process.wait(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Воркер %s не остановился за %s с, SIGKILL", self.index, timeout)
+                process.kill()
+                await process.wait()
+        if self._watcher is not None:
+            self._watcher.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._watcher
+
+
+async def main():
+    """Фронтенд вебхука и config.WORKERS воркеров"""
+    if config.WORKERS < 2:
+        logger.error("Для запуска через supervisor.py задайте WORKERS > 1 в config.py (иначе запускайте bot.py)")
+        return
+    if not config.WEBHOOK_URL:
+        logger.error("Для запуска через supervisor.py задайте WEBHOOK_URL в config.py")
+        return
+
+    # Схема БД и режим WAL — один раз до запуска воркеров
+    await database.init_db()
+
+    workers = [WorkerProcess(index) for index in range(config.WORKERS)]
+    for worker in workers:
+        await worker.start()
+
+    router = UpdateRouter(
+        [f"http://127.0.0.1:{config.WORKER_BASE_PORT + index}/update" for index in range(config.WORKERS)],
+        config.WEBHOOK_SECRET,
+    )
+    await router.start()
+    runner = web.AppRunner(router.app(config.WEBHOOK_PATH), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, config.WEBHOOK_HOST, config.WEBHOOK_PORT).start()
+
+    bot = Bot(token=config.BOT_TOKEN, session=create_bot_session())
+    await bot.set_webhook(config.WEBHOOK_URL + config.WEBHOOK_PATH, secret_token=config.WEBHOOK_SECRET or None)
+    await bot.session.close()
+    logger.info("Фронтенд вебхука запущен, воркеров: %s", config.WORKERS)
+
+    stop_requested = asyncio.Event()
+    install_signal_handlers(stop_requested)
+    try:
+        await stop_requested.wait()
+    finally:
+        # Сначала перестаём принимать апдейты (Telegram придержит их до следующего запуска),
+        # затем воркеры дорабатывают начатое
+        await runner.cleanup()
+        await router.close()
+        await asyncio.gather(*(worker.stop(config.SHUTDOWN_TIMEOUT + 5) for worker in workers))
+        logger.info("Все воркеры остановлены")
+
+
+if __name__ == "__main__":
+    log_listener = configure_from_config("supervisor")
+    try:
+        asyncio.run(main())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        logger.info("Остановлено")
+    finally:
+        log_listener.stop()
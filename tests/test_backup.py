@@ -0,0 +1,87 @@
+"""Тесты для utils/backup.py"""
+import asyncio
+import gzip
+
+import pytest
+
+import database
+import manage
+from utils import backup
+
+
+async def _users(path: str):
+    await database.init_db("sqlite", path)
+    return [user['telegram_id'] for user in await database.get_all_users()]
+
+
+@pytest.mark.asyncio
+async def test_backup_while_writing_and_restore(tmp_path):
+    """Тест копии работающей БД во время записей, ротации архивов и восстановления"""
+    db_path = str(tmp_path / "bot.db")
+    await database.init_db("sqlite", db_path)
+    await database.open_storage()
+    await database.import_users([
+        {'telegram_id': i, 'username': None, 'first_name': "User", 'current_group': 1, 'desired_groups': [2]}
+        for i in range(1, 2001)
+    ])
+    scheduler = backup.BackupScheduler(db_path, str(tmp_path / "backups"), 3600, keep=2, pages_per_step=8,
+                                       step_pause=0.001)
+
+    async def _write_meanwhile():
+        for i in range(5001, 5051):
+            await database.create_user(i, None, "Late", 1)
+
+    archive, _ = await asyncio.gather(scheduler.backup(), _write_meanwhile())
+    await database.close_storage()
+    assert archive.name.endswith(backup.SUFFIX)
+    with gzip.open(archive) as file:
+        assert file.read(16) == b"SQLite format 3\x00"
+
+    # Копия — согласованный снимок: все импортированные и часть поздних записей
+    restored = str(tmp_path / "restored.db")
+    backup.restore_backup(str(archive), restored)
+    users = await _users(restored)
+    assert set(range(1, 2001)) <= set(users) and len(users) <= 2050
+
+    # Старые архивы удаляются, остаются keep последних; пауза — чтобы имя новой копии отличалось
+    for number in range(2):
+        (tmp_path / "backups" / f"bot-0000{number}{backup.SUFFIX}").write_bytes(b"")
+    await asyncio.sleep(1)
+    await scheduler.backup()
+    assert len(backup.list_backups(str(tmp_path / "backups"))) == 2
+
+
+def test_corrupt_archive_is_not_restored(tmp_path):
+    """Тест что повреждённый архив не заменяет БД"""
+    db_path = tmp_path / "bot.db"
+    db_path.write_bytes(b"original")
+    archive = tmp_path / f"bad{backup.SUFFIX}"
+    with gzip.open(archive, "wb") as file:
+        file.write(b"SQLite format 3\x00" + b"\x00" * 100)
+
+    with pytest.raises(ValueError):
+        backup.restore_backup(str(archive), str(db_path))
+    assert db_path.read_bytes() == b"original"
+    assert list(tmp_path.glob(".*restore")) == []
+
+
+def test_manage_backup_and_restore(tmp_path, monkeypatch, capsys):
+    """Тест команд manage.py backup и restore (по умолчанию — последний архив)"""
+    db_path = str(tmp_path / "bot.db")
+    monkeypatch.setattr("config.BACKUP_DIR", str(tmp_path / "backups"))
+
+    async def _prepare():
+        await database.init_db("sqlite", db_path)
+        await database.create_user(111, None, "User", 1)
+
+    asyncio.run(_prepare())
+    assert manage.main(["backup", "--database", db_path]) == 0
+
+    async def _delete():
+        await database.init_db("sqlite", db_path)
+        await database.delete_user(111)
+
+    asyncio.run(_delete())
+    assert manage.main(["restore", "--database", db_path]) == 0
+    assert asyncio.run(_users(db_path)) == [111]
+    assert "восстановлена" in capsys.readouterr().out
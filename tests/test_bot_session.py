@@ -0,0 +1,149 @@
+"""Тесты для utils/bot_session.py на локальной замене сервера Bot API"""
+import asyncio
+import pytest
+from aiohttp import web
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+from utils import metrics
+from utils.bot_session import RetryMiddleware, TunedAiohttpSession, api_server
+
+TOKEN = "123456:TEST"
+ME = {'id': 123456, 'is_bot': True, 'first_name': "Test"}
+SENT = {'message_id': 1, 'date': 0, 'chat': {'id': 42, 'type': "private"}, 'text': "hi"}
+
+
+class _FakeBotApi:
+    """Сервер, отвечающий на /bot<token>/<method> по заранее заданным сценариям"""
+
+    def __init__(self):
+        self.calls = []
+        self.scripts = {}
+        self.peers = set()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        self.calls.append(method)
+        self.peers.add(request.transport.get_extra_info("peername"))
+        script = self.scripts.get(method, [])
+        step = script.pop(0) if script else "ok"
+        if step == "slow":
+            await asyncio.sleep(1)
+        if step == "error":
+            return web.json_response({'ok': False, 'error_code': 500, 'description': "Internal"}, status=500)
+        if step == "flood":
+            return web.json_response({
+                'ok': False, 'error_code': 429, 'description': "Too Many Requests: retry after 3",
+                'parameters': {'retry_after': 3},
+            }, status=429)
+        result = ME if method == "getMe" else SENT
+        return web.json_response({'ok': True, 'result': result})
+
+
+@pytest.fixture
+async def fake_api():
+    api = _FakeBotApi()
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", api.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    api.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+    yield api
+    await runner.cleanup()
+
+
+def _bot(api, retries: int = 2, **kwargs) -> Bot:
+    session = TunedAiohttpSession(api=api_server(api.url), method_timeouts={'sendMessage': 0.2}, **kwargs)
+    session.middleware(RetryMiddleware(retries, 0.01, 5))
+    return Bot(TOKEN, session=session)
+
+
+@pytest.mark.asyncio
+async def test_requests_go_to_custom_server_and_reuse_connections(fake_api):
+    """Тест что запросы идут на свой сервер Bot API и переиспользуют соединение из пула"""
+    bot = _bot(fake_api, limit=10, dns_cache_ttl=600, keepalive_timeout=30)
+    try:
+        for _ in range(5):
+            assert (await bot.get_me()).id == ME['id']
+        connector = (await bot.session.create_session()).connector
+        assert connector.limit == 10
+        assert connector.use_dns_cache
+    finally:
+        await bot.session.close()
+    assert fake_api.calls == ["getMe"] * 5
+    assert len(fake_api.peers) == 1
+
+
+@pytest.mark.asyncio
+async def test_idempotent_method_is_retried(fake_api):
+    """Тест что getMe повторяется после 5xx"""
+    fake_api.scripts['getMe'] = ["error", "error"]
+    retries = metrics.counter("bot_api_retries").value
+    bot = _bot(fake_api)
+    try:
+        assert (await bot.get_me()).id == ME['id']
+    finally:
+        await bot.session.close()
+    assert fake_api.calls == ["getMe"] * 3
+    assert metrics.counter("bot_api_retries").value == retries + 2
+
+
+@pytest.mark.asyncio
+async def test_send_message_not_retried_on_server_error(fake_api):
+    """Тест что sendMessage после 5xx не повторяется (сообщение могло уйти)"""
+    fake_api.scripts['sendMessage'] = ["error"]
+    bot = _bot(fake_api)
+    try:
+        with pytest.raises(TelegramServerError):
+            await bot.send_message(42, "hi")
+    finally:
+        await bot.session.close()
+    assert fake_api.calls == ["sendMessage"]
+
+
+@pytest.mark.asyncio
+async def test_flood_control_is_retried_for_any_method(monkeypatch, fake_api):
+    """Тест что после 429 повторяется любой метод через retry_after, но не больше заданного числа раз"""
+    delays = []
+    sleep = asyncio.sleep
+
+    async def _sleep(delay, *args):
+        delays.append(delay)
+        await sleep(0)
+
+    monkeypatch.setattr(asyncio, "sleep", _sleep)
+    fake_api.scripts['sendMessage'] = ["flood"]
+    bot = _bot(fake_api)
+    try:
+        assert (await bot.send_message(42, "hi")).message_id == 1
+        fake_api.scripts['sendMessage'] = ["flood"] * 3
+        with pytest.raises(TelegramRetryAfter):
+            await bot.send_message(42, "hi")
+    finally:
+        await bot.session.close()
+    assert fake_api.calls == ["sendMessage"] * 5
+    assert delays.count(3) == 3
+
+
+@pytest.mark.asyncio
+async def test_method_timeout(fake_api):
+    """Тест таймаута отдельного метода: медленный sendMessage обрывается, getMe ждёт дольше"""
+    fake_api.scripts['sendMessage'] = ["slow"]
+    fake_api.scripts['getMe'] = ["slow"]
+    bot = _bot(fake_api, retries=0)
+    try:
+        with pytest.raises(TelegramNetworkError):
+            await bot.send_message(42, "hi")
+        assert (await bot.get_me()).id == ME['id']
+    finally:
+        await bot.session.close()
+
+
+def test_api_server():
+    """Тест адреса Bot API по настройке"""
+    assert api_server("").base == "https://api.telegram.org/bot{token}/{method}"
+    server = api_server("http://127.0.0.1:8081/", is_local=True)
+    assert server.api_url(TOKEN, "getMe") == f"http://127.0.0.1:8081/bot{TOKEN}/getMe"
+    assert server.is_local
@@ -0,0 +1,121 @@
+"""Тесты для utils/bulk.py"""
+import io
+import json
+import pytest
+
+import database
+from utils import bulk
+
+
+def test_validate_user():
+    """Тест проверки записи: группы нормализуются, неизвестные отклоняются"""
+    user = bulk.validate_user({'telegram_id': "111", 'current_group': "1", 'desired_groups': ["3", "2", "2"]})
+    assert user == {
+        'telegram_id': 111,
+        'username': None,
+        'first_name': "Пользователь",
+        'current_group': 1,
+        'desired_groups': [2, 3],
+    }
+    
+    with pytest.raises(ValueError):
+        bulk.validate_user({'telegram_id': 111, 'current_group': 99})
+    with pytest.raises(ValueError):
+        bulk.validate_user({'telegram_id': 111, 'current_group': 1, 'desired_groups': [1]})
+
+
+@pytest.mark.asyncio
+async def test_import_csv_skips_invalid_rows(mock_config):
+    """Тест импорта CSV: ошибочные строки пропускаются, остальные загружаются"""
+    data = io.StringIO(
+        "telegram_id,username,first_name,current_group,desired_groups\n"
+        "111,user1,User 1,1,2;3\n"
+        "222,,User 2,2,1\n"
+        "333,user3,User 3,42,1\n"
+    )
+    errors = []
+    
+    imported = await bulk.import_users(data, "csv", chunk_size=1, errors=errors)
+    
+    assert imported == 2
+    assert len(errors) == 1 and "строка 4" in errors[0]
+    assert sorted(await database.get_desired_groups(111)) == [2, 3]
+    assert (await database.get_user(222))['username'] is None
+
+
+@pytest.mark.asyncio
+async def test_import_jsonl_skips_malformed_lines(mock_config):
+    """Тест импорта JSONL: битая строка и строка вместо списка групп пропускаются с номером строки"""
+    data = io.StringIO(
+        json.dumps({'telegram_id': 111, 'current_group': 1, 'desired_groups': [2]}) + "\n"
+        + '{"telegram_id": 222, "current_group":\n'
+        + json.dumps({'telegram_id': 333, 'current_group': 1, 'desired_groups': "23"}) + "\n"
+        + json.dumps({'telegram_id': 444, 'current_group': 2, 'desired_groups': [1]}) + "\n"
+    )
+    errors = []
+    
+    assert await bulk.import_users(data, "jsonl", errors=errors) == 2
+    assert len(errors) == 2
+    assert "строка 2" in errors[0] and "строка 3" in errors[1]
+    assert [user['telegram_id'] for user in await database.get_all_users()] == [111, 444]
+
+
+@pytest.mark.asyncio
+async def test_import_replace(mock_config):
+    """Тест что без --replace существующие пользователи не меняются, с ним — перезаписываются"""
+    await database.create_user(111, "old", "Old", 1)
+    await database.set_desired_groups(111, [2])
+    line = json.dumps({'telegram_id': 111, 'username': "new", 'first_name': "New",
+                       'current_group': 3, 'desired_groups': [4]}) + "\n"
+    
+    assert await bulk.import_users(io.StringIO(line), "jsonl") == 0
+    assert (await database.get_user(111))['username'] == "old"
+    
+    assert await bulk.import_users(io.StringIO(line), "jsonl", replace=True) == 1
+    assert (await database.get_user(111))['current_group'] == 3
+    assert await database.get_desired_groups(111) == [4]
+
+
+@pytest.mark.asyncio
+async def test_export_import_roundtrip(mock_config):
+    """Тест что экспорт читается обратно импортом"""
+    await database.create_user(111, "user1", "User 1", 1)
+    await database.set_desired_groups(111, [2, 3])
+    await database.create_user(222, None, "User 2", 2)
+    
+    for fmt in ("csv", "jsonl"):
+        out = io.StringIO()
+        assert await bulk.export_users(out, fmt, chunk_size=1) == 2
+        users = list(bulk.read_users(io.StringIO(out.getvalue()), fmt))
+        assert [u['telegram_id'] for u in users] == [111, 222]
+        assert users[0]['desired_groups'] == [2, 3]
+        assert users[1]['desired_groups'] == []
+
+
+@pytest.mark.asyncio
+async def test_running_bot_picks_up_import(mock_config):
+    """Тест что бот в одном процессе замечает импорт из manage.py и перезагружает индекс мэтчей"""
+    from storage.sqlite import SQLiteRepository
+    from utils.change_feed import ExternalWriteWatcher
+    from utils.match_index import match_index
+
+    await database.open_storage()
+    try:
+        watcher = ExternalWriteWatcher(interval=1)
+        await watcher.mark()
+        await database.load_match_index()
+        await database.create_user(111, "user1", "User 1", 1)
+        assert await watcher.poll() is False
+
+        # manage.py import — отдельный процесс со своим подключением к той же БД
+        await SQLiteRepository(mock_config).import_users([{
+            'telegram_id': 222, 'username': None, 'first_name': "User 2",
+            'current_group': 2, 'desired_groups': [1],
+        }])
+        assert match_index.get_user(222) is None
+        assert await watcher.poll() is True
+        assert match_index.get_user(222) == (2, frozenset({1}))
+        assert match_index.get_user(111) == (1, frozenset())
+        assert await watcher.poll() is False
+    finally:
+        await database.close_storage()
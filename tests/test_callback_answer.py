@@ -0,0 +1,81 @@
+"""Тесты для middlewares/callback_answer.py"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from aiogram.types import CallbackQuery
+
+from middlewares.callback_answer import EarlyCallbackAnswerMiddleware
+from utils import metrics
+
+
+def _make_callback():
+    callback = MagicMock(spec=CallbackQuery)
+    callback.id = "1"
+    callback.answer = AsyncMock()
+    return callback
+
+
+@pytest.mark.asyncio
+async def test_answer_after_fast_handler():
+    """Тест что быстрый хендлер отвечает один раз после своей работы"""
+    middleware = EarlyCallbackAnswerMiddleware(deadline=1.0)
+    callback = _make_callback()
+
+    async def handler(event, data):
+        return "ok"
+
+    result = await middleware(handler, callback, {})
+
+    assert result == "ok"
+    callback.answer.assert_called_once_with(text=None, show_alert=None)
+
+
+@pytest.mark.asyncio
+async def test_handler_can_override_alert():
+    """Тест что хендлер может задать текст и алерт"""
+    middleware = EarlyCallbackAnswerMiddleware(deadline=1.0)
+    callback = _make_callback()
+
+    async def handler(event, data):
+        data["callback_answer"].text = "❌ Ошибка. Начни заново"
+        data["callback_answer"].show_alert = True
+
+    await middleware(handler, callback, {})
+
+    callback.answer.assert_called_once_with(text="❌ Ошибка. Начни заново", show_alert=True)
+
+
+@pytest.mark.asyncio
+async def test_answer_before_slow_handler_finishes():
+    """Тест что медленный хендлер не задерживает ответ дольше дедлайна"""
+    middleware = EarlyCallbackAnswerMiddleware(deadline=0.01)
+    callback = _make_callback()
+    answered_during_handler = []
+
+    async def handler(event, data):
+        await asyncio.sleep(0.05)
+        answered_during_handler.append(callback.answer.called)
+
+    await middleware(handler, callback, {})
+
+    assert answered_during_handler == [True]
+    callback.answer.assert_called_once()
+    assert metrics.histogram("callback_answer_latency").count > 0
+
+
+@pytest.mark.asyncio
+async def test_late_alert_is_counted():
+    """Тест что алерт, заданный после ответа по дедлайну, не теряется молча"""
+    middleware = EarlyCallbackAnswerMiddleware(deadline=0.01)
+    callback = _make_callback()
+    late_before = metrics.counter("callback_answer_late").value
+
+    async def handler(event, data):
+        await asyncio.sleep(0.05)
+        data["callback_answer"].text = "❌ Поздно"
+
+    await middleware(handler, callback, {})
+
+    callback.answer.assert_called_once_with(text=None, show_alert=None)
+    assert metrics.counter("callback_answer_late").value == late_before + 1
@@ -0,0 +1,149 @@
+"""Тесты для работы несколькими воркерами (supervisor.py, utils/sharding.py, utils/change_feed.py)"""
+import json
+import aiohttp
+import pytest
+from aiohttp import web
+
+import database
+from storage import SQLiteRepository
+from supervisor import UpdateRouter
+from utils.change_feed import ChangeFeed
+from utils.match_index import match_index
+from utils.sharding import shard_of, update_user_id
+
+
+def test_update_user_id():
+    """Тест определения автора апдейта по сырому JSON"""
+    assert update_user_id({'update_id': 1, 'message': {'from': {'id': 111}}}) == 111
+    assert update_user_id({'update_id': 2, 'callback_query': {'from': {'id': 222}}}) == 222
+    assert update_user_id({'update_id': 3, 'poll_answer': {'user': {'id': 333}}}) == 333
+    assert update_user_id({'update_id': 4, 'channel_post': {'chat': {'id': -100}}}) is None
+
+
+def test_shard_of_is_stable():
+    """Тест что пользователь всегда попадает в один воркер"""
+    assert shard_of(111, 4) == shard_of(111, 4)
+    assert {shard_of(user_id, 4) for user_id in range(100)} == {0, 1, 2, 3}
+    assert shard_of(None, 4) == 0
+
+
+@pytest.mark.asyncio
+async def test_change_feed_applies_other_worker_writes(monkeypatch, mock_config):
+    """Тест что изменения другого воркера попадают в индекс мэтчей"""
+    monkeypatch.setattr("database.WORKERS", 2)
+    await database.init_db("sqlite", mock_config)
+    await database.create_user(111, "user1", "User 1", 1)
+    await database.set_desired_groups(111, [2])
+    await database.load_match_index()
+
+    feed = ChangeFeed(interval=1)
+    await feed.mark()
+
+    # Другой воркер пишет в ту же БД напрямую, мимо индекса этого процесса
+    other = SQLiteRepository(mock_config, change_log=True)
+    await other.create_user(222, "user2", "User 2", 2)
+    await other.set_desired_groups(222, [1])
+    assert match_index.candidates(111) == []
+
+    assert await feed.poll() == 1
+    assert match_index.candidates(111) == [(222, 2)]
+
+    await other.delete_user(222)
+    await feed.poll()
+    assert match_index.candidates(111) == []
+    assert match_index.get_user(222) is None
+
+
+@pytest.mark.asyncio
+async def test_change_feed_reloads_after_prune(monkeypatch, mock_config):
+    """Тест полной загрузки индекса, если журнал очищен дальше прочитанного"""
+    monkeypatch.setattr("database.WORKERS", 2)
+    await database.init_db("sqlite", mock_config)
+    await database.load_match_index()
+    feed = ChangeFeed(interval=1)
+    await feed.mark()
+
+    other = SQLiteRepository(mock_config, change_log=True)
+    for telegram_id in (111, 222, 333):
+        await other.create_user(telegram_id, None, "User", 1)
+    await other.prune_change_log(1)
+
+    await feed.poll()
+    assert match_index.user_count() == 3
+
+
+@pytest.mark.asyncio
+async def test_snapshot_includes_writes_after_feed_stop(monkeypatch, mock_config, tmp_path):
+    """Тест что снимок при остановке не теряет изменения других воркеров после остановки журнала"""
+    import bot
+    from utils.groups import catalog
+    from utils.match_index import MatchIndex
+    from utils.snapshot import load_snapshot
+
+    monkeypatch.setattr("database.WORKERS", 2)
+    monkeypatch.setattr("config.MATCH_INDEX_SNAPSHOT_PATH", str(tmp_path / "index.snapshot"))
+    await database.init_db("sqlite", mock_config)
+    await database.load_match_index()
+    feed = ChangeFeed(interval=1)
+    await feed.mark()
+
+    # Журнал уже остановлен, другой воркер ещё успевает записать
+    other = SQLiteRepository(mock_config, change_log=True)
+    await other.create_user(222, "user2", "User 2", 2)
+    await bot.save_match_index_snapshot(feed)
+
+    restored = MatchIndex(catalog.program_of)
+    assert load_snapshot(restored, str(tmp_path / "index.snapshot"), await database.get_change_counter())
+    assert restored.get_user(222) == (2, frozenset())
+
+
+@pytest.mark.asyncio
+async def test_update_router_forwards_by_user():
+    """Тест что фронтенд пересылает апдейт воркеру пользователя и проверяет секрет"""
+    received = {0: [], 1: []}
+    runners = []
+    urls = []
+    for index in (0, 1):
+        async def _handle(request, index=index):
+            received[index].append(await request.json())
+            return web.Response()
+
+        app = web.Application()
+        app.router.add_post("/update", _handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        runners.append(runner)
+        urls.append(f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/update")
+
+    router = UpdateRouter(urls, secret="s3cret")
+    await router.start()
+    front = web.AppRunner(router.app("/webhook"))
+    await front.setup()
+    site = web.TCPSite(front, "127.0.0.1", 0)
+    await site.start()
+    front_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/webhook"
+
+    headers = {"X-Telegram-Bot-Api-Secret-Token": "s3cret"}
+    try:
+        async with aiohttp.ClientSession() as session:
+            for update_id, user_id in enumerate((10, 11, 12)):
+                update = {'update_id': update_id, 'message': {'from': {'id': user_id}}}
+                async with session.post(front_url, data=json.dumps(update), headers=headers) as response:
+                    assert response.status == 200
+            async with session.post(front_url, data="{}", headers={}) as response:
+                assert response.status == 403
+
+            # Воркер недоступен — Telegram должен повторить доставку
+            await runners[1].cleanup()
+            update = {'update_id': 9, 'message': {'from': {'id': 13}}}
+            async with session.post(front_url, data=json.dumps(update), headers=headers) as response:
+                assert response.status == 503
+    finally:
+        await front.cleanup()
+        await router.close()
+        await runners[0].cleanup()
+
+    assert [u['update_id'] for u in received[0]] == [0, 2]
+    assert [u['update_id'] for u in received[1]] == [1]
@@ -8,12 +8,8 @@ from datetime import datetime
 @pytest.mark.asyncio
 async def test_init_db(mock_config):
     """Тест инициализации базы данных"""
-    # mock_config уже применен через monkeypatch
-    await database.init_db()
-    
-    # Проверяем, что таблицы созданы
-    import config
-    async with aiosqlite.connect(config.DATABASE_PATH) as db:
+    # Схему создаёт init_db фикстуры mock_config
+    async with aiosqlite.connect(mock_config) as db:
         async with db.execute(
             "SELECT name FROM sqlite_master WHERE type='table'"
         ) as cursor:
@@ -25,9 +21,6 @@ async def test_init_db(mock_config):
 @pytest.mark.asyncio
 async def test_create_user(mock_config):
     """Тест создания пользователя"""
-    # Инициализируем БД с правильным путем
-    await database.init_db()
-    
     await database.create_user(
         telegram_id=12345,
         username="testuser",
@@ -46,8 +39,6 @@ async def test_create_user(mock_config):
 @pytest.mark.asyncio
 async def test_user_exists(mock_config):
     """Тест проверки существования пользователя"""
-    await database.init_db()
-    
     assert await database.user_exists(12345) is False
     
     await database.create_user(12345, "test", "Test", 1)
@@ -58,7 +49,6 @@ async def test_user_exists(mock_config):
 @pytest.mark.asyncio
 async def test_set_desired_groups(mock_config):
     """Тест установки желаемых групп"""
-    await database.init_db()
     await database.create_user(12345, "test", "Test", 1)
     await database.set_desired_groups(12345, [2, 3, 4])
     
@@ -69,7 +59,6 @@ async def test_set_desired_groups(mock_config):
 @pytest.mark.asyncio
 async def test_update_desired_groups(mock_config):
     """Тест обновления желаемых групп"""
-    await database.init_db()
     await database.create_user(12345, "test", "Test", 1)
     await database.set_desired_groups(12345, [2, 3])
     
@@ -83,7 +72,6 @@ async def test_update_desired_groups(mock_config):
 @pytest.mark.asyncio
 async def test_update_user_group(mock_config):
     """Тест обновления текущей группы пользователя"""
-    await database.init_db()
     await database.create_user(12345, "test", "Test", 1)
     await database.update_user_group(12345, 5)
     
@@ -94,7 +82,6 @@ async def test_update_user_group(mock_config):
 @pytest.mark.asyncio
 async def test_get_users_from_group(mock_config):
     """Тест получения пользователей из группы"""
-    await database.init_db()
     await database.create_user(111, "user1", "User 1", 1)
     await database.create_user(222, "user2", "User 2", 1)
     await database.create_user(333, "user3", "User 3", 2)
@@ -111,7 +98,6 @@ async def test_get_users_from_group(mock_config):
 @pytest.mark.asyncio
 async def test_delete_user(mock_config):
     """Тест удаления пользователя"""
-    await database.init_db()
     await database.create_user(12345, "test", "Test", 1)
     await database.set_desired_groups(12345, [2, 3])
     
@@ -125,11 +111,73 @@ async def test_delete_user(mock_config):
     # После удаления пользователя get_desired_groups вернет пустой список
     desired = await database.get_desired_groups(12345)
     # Проверяем напрямую в БД
-    import config
-    async with aiosqlite.connect(config.DATABASE_PATH) as db:
+    async with aiosqlite.connect(mock_config) as db:
         async with db.execute(
             "SELECT COUNT(*) FROM desired_groups WHERE telegram_id = ?", (12345,)
         ) as cursor:
             count = (await cursor.fetchone())[0]
             assert count == 0
 
+
+@pytest.mark.asyncio
+async def test_writer_group_commit(mock_config):
+    """Тест пакетной записи через единственного писателя"""
+    import asyncio
+    await database.open_storage()
+    try:
+        await asyncio.gather(*[
+            database.create_user(1000 + i, f"user{i}", f"User {i}", i % 10 + 1)
+            for i in range(50)
+        ])
+        await asyncio.gather(*[
+            database.set_desired_groups(1000 + i, [1, 2])
+            for i in range(50)
+        ])
+    finally:
+        await database.close_storage()
+    
+    users = await database.get_all_users()
+    assert len(users) == 50
+    assert sorted(await database.get_desired_groups(1010)) == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_writer_failed_op_does_not_affect_batch(mock_config):
+    """Тест что ошибка одной операции в пачке не откатывает остальные"""
+    import asyncio
+    await database.create_user(111, "user1", "User 1", 1)
+    await database.open_storage()
+    try:
+        results = await asyncio.gather(
+            database.create_user(111, "dup", "Duplicate", 2),
+            database.create_user(222, "user2", "User 2", 2),
+            return_exceptions=True
+        )
+    finally:
+        await database.close_storage()
+    
+    assert isinstance(results[0], aiosqlite.IntegrityError)
+    assert results[1] is None
+    assert (await database.get_user(111))['current_group'] == 1
+    assert await database.user_exists(222) is True
+
+
+@pytest.mark.asyncio
+async def test_read_pool(mock_config):
+    """Тест чтения через пул подключений только для чтения"""
+    await database.create_user(111, "user1", "User 1", 1)
+    await database.set_desired_groups(111, [2, 3])
+    
+    await database.open_storage()
+    try:
+        assert await database.user_exists(111) is True
+        assert (await database.get_user(111))['username'] == "user1"
+        assert sorted(await database.get_desired_groups(111)) == [2, 3]
+        assert len(await database.get_users_from_group(1)) == 1
+        
+        # Подключения пула не принимают запись
+        async with database.get_repository()._get_read_db() as db:
+            with pytest.raises(aiosqlite.OperationalError):
+                await db.execute("DELETE FROM users")
+    finally:
+        await database.close_storage()
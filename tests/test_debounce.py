@@ -0,0 +1,111 @@
+"""Тесты для utils/debounce.py"""
+import asyncio
+import pytest
+from utils.debounce import Debouncer
+
+
+@pytest.mark.asyncio
+async def test_debouncer_runs_only_last_call():
+    """Тест что серия вызовов с одним ключом схлопывается в последний"""
+    debouncer = Debouncer(0.05)
+    calls = []
+
+    for i in range(5):
+        async def _call(i=i):
+            calls.append(i)
+        debouncer.schedule("msg", _call)
+
+    await asyncio.sleep(0.1)
+    assert calls == [4]
+    assert debouncer.pending_count() == 0
+
+
+@pytest.mark.asyncio
+async def test_debouncer_keys_are_independent():
+    """Тест что разные сообщения перерисовываются независимо"""
+    debouncer = Debouncer(0.05)
+    calls = []
+
+    async def _first():
+        calls.append("first")
+
+    async def _second():
+        calls.append("second")
+
+    debouncer.schedule("msg1", _first)
+    debouncer.schedule("msg2", _second)
+
+    await asyncio.sleep(0.1)
+    assert sorted(calls) == ["first", "second"]
+
+
+@pytest.mark.asyncio
+async def test_debouncer_cancel():
+    """Тест отмены ожидающего вызова"""
+    debouncer = Debouncer(0.05)
+    calls = []
+
+    async def _call():
+        calls.append(1)
+
+    debouncer.schedule("msg", _call)
+    await debouncer.cancel("msg")
+
+    await asyncio.sleep(0.1)
+    assert calls == []
+
+
+@pytest.mark.asyncio
+async def test_debouncer_flush_runs_pending_now():
+    """Тест что при остановке ожидающие вызовы выполняются сразу"""
+    debouncer = Debouncer(10)
+    calls = []
+
+    async def _call():
+        calls.append("edit")
+
+    debouncer.schedule("msg", _call)
+    await debouncer.flush()
+
+    assert calls == ["edit"]
+    assert debouncer.pending_count() == 0
+
+
+@pytest.mark.asyncio
+async def test_debouncer_cancel_waits_for_running_call():
+    """Тест что cancel() во время начатой правки дожидается её: правка не придёт после замены сообщения"""
+    debouncer = Debouncer(0.01)
+    events = []
+
+    async def _edit():
+        events.append("edit started")
+        await asyncio.sleep(0.05)
+        events.append("edit done")
+
+    debouncer.schedule("msg", _edit)
+    await asyncio.sleep(0.02)
+    await debouncer.cancel("msg")
+    events.append("message replaced")
+
+    assert events == ["edit started", "edit done", "message replaced"]
+
+
+@pytest.mark.asyncio
+async def test_debouncer_calls_for_one_key_do_not_overlap():
+    """Тест что вызовы одного ключа идут по очереди и завершаются в порядке планирования"""
+    debouncer = Debouncer(0.01)
+    events = []
+
+    def _make(name, duration):
+        async def _edit():
+            events.append(f"{name} start")
+            await asyncio.sleep(duration)
+            events.append(f"{name} end")
+        return _edit
+
+    debouncer.schedule("msg", _make("first", 0.05))
+    await asyncio.sleep(0.02)
+    debouncer.schedule("msg", _make("second", 0))
+    await asyncio.sleep(0.1)
+
+    assert events == ["first start", "first end", "second start", "second end"]
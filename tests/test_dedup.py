@@ -0,0 +1,99 @@
+"""Тесты для middlewares/dedup.py"""
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+from middlewares.dedup import DeduplicationMiddleware
+
+USER = User(id=111, is_bot=False, first_name="User")
+
+
+def _callback_update(update_id: int, callback_id: str, data: str = "confirm_registration") -> Update:
+    return Update(update_id=update_id, callback_query=CallbackQuery(
+        id=callback_id, from_user=USER, chat_instance="1", data=data,
+    ))
+
+
+def _message_update(update_id: int) -> Update:
+    return Update(update_id=update_id, message=Message(
+        message_id=1, date=datetime.now(), chat=Chat(id=111, type="private"), from_user=USER, text="/start",
+    ))
+
+
+@pytest.mark.asyncio
+async def test_redelivered_update_dropped():
+    """Тест что апдейт с тем же update_id или id callback-запроса обрабатывается один раз"""
+    middleware = DeduplicationMiddleware(ttl=60, action_window=0)
+    handler = AsyncMock(return_value="ok")
+    bot = AsyncMock()
+
+    assert await middleware(handler, _message_update(1), {'bot': bot}) == "ok"
+    assert await middleware(handler, _message_update(1), {'bot': bot}) is UNHANDLED
+    assert await middleware(handler, _callback_update(2, "cb1"), {'bot': bot}) == "ok"
+    # Тот же callback под другим update_id
+    assert await middleware(handler, _callback_update(3, "cb1"), {'bot': bot}) is UNHANDLED
+
+    assert handler.await_count == 2
+    bot.answer_callback_query.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_double_tap_dropped_and_answered():
+    """Тест двойного нажатия: второе отбрасывается, но на него отвечают; другая кнопка проходит"""
+    middleware = DeduplicationMiddleware(ttl=60, action_window=0.1)
+    bot = AsyncMock()
+    calls = []
+
+    async def handler(event, data):
+        calls.append(event.callback_query.data)
+        await asyncio.sleep(0.2)
+
+    # Второе нажатие пришло, пока первое ещё обрабатывается (дольше окна)
+    results = await asyncio.gather(
+        middleware(handler, _callback_update(1, "cb1"), {'bot': bot}),
+        middleware(handler, _callback_update(2, "cb2"), {'bot': bot}),
+        middleware(handler, _callback_update(3, "cb3", data="cancel_delete"), {'bot': bot}),
+    )
+    assert calls == ["confirm_registration", "cancel_delete"]
+    assert results[1] is UNHANDLED
+    bot.answer_callback_query.assert_awaited_once_with("cb2")
+
+    # Сразу после окончания — ещё в окне, после окна — снова обрабатывается
+    assert await middleware(handler, _callback_update(4, "cb4"), {'bot': bot}) is UNHANDLED
+    await asyncio.sleep(0.15)
+    await middleware(handler, _callback_update(5, "cb5"), {'bot': bot})
+    assert calls.count("confirm_registration") == 2
+
+
+@pytest.mark.asyncio
+async def test_old_keys_expire():
+    """Тест что ключи старше ttl забываются и кэш не растёт"""
+    middleware = DeduplicationMiddleware(ttl=0.05, action_window=0.05, actions={f"d{i}" for i in range(10)})
+    handler = AsyncMock()
+    for update_id in range(10):
+        await middleware(handler, _callback_update(update_id, f"cb{update_id}", data=f"d{update_id}"), {'bot': AsyncMock()})
+    assert middleware.size() == 30
+
+    await asyncio.sleep(0.06)
+    await middleware(handler, _message_update(100), {'bot': AsyncMock()})
+    assert middleware.size() == 1
+
+
+@pytest.mark.asyncio
+async def test_repeated_toggle_not_dropped():
+    """Тест что быстрые повторные нажатия идемпотентных кнопок (вкл/выкл группы) все доходят до хендлера"""
+    middleware = DeduplicationMiddleware(ttl=60, action_window=1.0)
+    handler = AsyncMock()
+    bot = AsyncMock()
+
+    await middleware(handler, _callback_update(1, "cb1", data="toggle_desired_3"), {'bot': bot})
+    await middleware(handler, _callback_update(2, "cb2", data="toggle_desired_3"), {'bot': bot})
+    await middleware(handler, _callback_update(3, "cb3", data="desired_groups_done"), {'bot': bot})
+    assert await middleware(handler, _callback_update(4, "cb4", data="desired_groups_done"), {'bot': bot}) is UNHANDLED
+
+    assert handler.await_count == 3
+    bot.answer_callback_query.assert_awaited_once_with("cb4")
@@ -46,12 +46,23 @@ def test_format_groups_list_multiline():
     assert "•" in result
 
 
-def test_get_schedule_message():
+def test_get_schedule_messages():
     """Тест получения сообщения с расписанием"""
-    schedule = keyboards.get_schedule_message()
+    [schedule] = keyboards.get_schedule_messages(footer="📍 Выбери свою группу:")
     assert "⏰ Расписание групп" in schedule
     assert "ИАД-1" in schedule
     assert "ИАД-10" in schedule
+    assert schedule.endswith("\n\n📍 Выбери свою группу:")
+
+
+def test_parse_group_callback():
+    """Тест разбора id группы из кнопки: только группы каталога и нужной программы"""
+    assert keyboards.parse_group_callback("select_group_3") == 3
+    assert keyboards.parse_group_callback("toggle_desired_3", "iad") == 3
+    assert keyboards.parse_group_callback("toggle_desired_3", "other") is None
+    assert keyboards.parse_group_callback("select_group_999999") is None
+    assert keyboards.parse_group_callback("select_group_-1") is None
+    assert keyboards.parse_group_callback("select_group_") is None
 
 
 def test_get_group_selection_keyboard():
@@ -101,3 +112,30 @@ def test_get_main_menu_keyboard():
     assert keyboard[0][0].text == "🔍 Проверить мэтчи"
     assert keyboard[1][0].text == "🚪 Больше не ищу"
 
+
+
+def test_group_keyboards_are_paged(monkeypatch):
+    """Тест что клавиатуры групп показывают только одну страницу"""
+    from utils.groups import Group, catalog
+    
+    monkeypatch.setattr(keyboards, "GROUPS_PAGE_SIZE", 10)
+    catalog.load(
+        [("big", "БИГ")],
+        [Group(100 + i, "big", i, "10:00 — 11:20") for i in range(1, 251)]
+    )
+    try:
+        kb = keyboards.get_group_selection_keyboard("big", page=3)
+        buttons = [b for row in kb.inline_keyboard for b in row]
+        groups = [b.callback_data for b in buttons if b.callback_data.startswith("select_group_")]
+        assert groups == [f"select_group_{100 + i}" for i in range(31, 41)]
+        assert "groups_page_big_2" in {b.callback_data for b in buttons}
+        assert "groups_page_big_4" in {b.callback_data for b in buttons}
+        
+        kb = keyboards.get_desired_groups_keyboard(101, {102}, page=0)
+        buttons = [b for row in kb.inline_keyboard for b in row]
+        toggles = [b for b in buttons if b.callback_data.startswith("toggle_desired_")]
+        assert len(toggles) == 9  # текущая группа не показывается
+        assert toggles[0].text == "✅ БИГ-2"
+        assert buttons[-1].callback_data == "desired_groups_done"
+    finally:
+        catalog.load_from_config()
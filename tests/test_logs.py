@@ -0,0 +1,158 @@
+"""Тесты для utils/logs.py и middlewares/log_context.py"""
+import json
+import logging
+import logging.handlers
+import queue
+import pytest
+from unittest.mock import MagicMock
+
+from aiogram.types import Update
+
+from middlewares.log_context import LogContextMiddleware
+from utils import logs, metrics
+
+
+class _Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.setFormatter(logs.JsonFormatter())
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(json.loads(self.format(record)))
+
+
+@pytest.fixture
+def pipeline():
+    """Логгер с очередью и фоновым потоком, пишущим JSON в список"""
+    capture = _Capture()
+    handler = logs.ContextQueueHandler(queue.Queue())
+    listener = logging.handlers.QueueListener(handler.queue, capture)
+    listener.start()
+    logger = logging.getLogger("test_logs")
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    yield logger, handler, capture
+    logger.removeHandler(handler)
+    logger.propagate = True
+    listener.stop()
+
+
+def test_json_record_with_context(pipeline):
+    """Тест что запись содержит контекст апдейта, поля extra и трейсбек"""
+    logger, handler, capture = pipeline
+    token = logs.log_context.set({'update_id': 7, 'user_id': 42, 'handler': "cmd_start"})
+    try:
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("Ошибка %s", "хендлера", extra={'duration_ms': 12.5})
+    finally:
+        logs.log_context.reset(token)
+    handler.queue.join()
+
+    [entry] = capture.lines
+    assert entry['message'] == "Ошибка хендлера"
+    assert entry['level'] == "ERROR"
+    assert (entry['update_id'], entry['user_id'], entry['handler']) == (7, 42, "cmd_start")
+    assert entry['duration_ms'] == 12.5
+    assert "ValueError: boom" in entry['exception']
+
+
+def test_rate_limit_per_call_site(monkeypatch, pipeline):
+    """Тест что повторяющиеся ошибки с одного места ограничиваются, а число пропущенных сообщается"""
+    logger, handler, capture = pipeline
+    now = [0.0]
+    monkeypatch.setattr(logs.time, "monotonic", lambda: now[0])
+    handler.addFilter(logs.RateLimitFilter(burst=2, period=60))
+
+    def _fail(i):
+        logger.error(f"Ошибка {i}")
+
+    for i in range(5):
+        _fail(i)
+    logger.info("Информация не ограничивается")
+    logger.info("Информация не ограничивается")
+    now[0] = 61.0
+    for i in range(5, 7):
+        _fail(i)
+    handler.queue.join()
+
+    messages = [entry['message'] for entry in capture.lines]
+    assert messages == [
+        "Ошибка 0", "Ошибка 1", "Информация не ограничивается", "Информация не ограничивается", "Ошибка 5", "Ошибка 6",
+    ]
+    assert capture.lines[4]['suppressed'] == 3
+
+
+def test_full_queue_drops_instead_of_blocking():
+    """Тест что при переполненной очереди запись отбрасывается"""
+    handler = logs.ContextQueueHandler(queue.Queue(maxsize=1))
+    logger = logging.getLogger("test_logs_full")
+    logger.addHandler(handler)
+    logger.propagate = False
+    dropped = metrics.counter("log_records_dropped").value
+    try:
+        logger.warning("first")
+        logger.warning("second")
+    finally:
+        logger.removeHandler(handler)
+        logger.propagate = True
+    assert handler.queue.qsize() == 1
+    assert metrics.counter("log_records_dropped").value == dropped + 1
+
+
+def test_setup_logging_rotates_file(tmp_path):
+    """Тест записи в файл с ротацией по размеру"""
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    path = tmp_path / "bot.log"
+    listener = logs.setup_logging(path=str(path), max_bytes=2000, backup_count=2)
+    try:
+        for i in range(100):
+            logging.getLogger("test_logs_file").info(f"Запись {i}")
+    finally:
+        listener.stop()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        for handler in saved_handlers:
+            root.addHandler(handler)
+        root.setLevel(saved_level)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["bot.log", "bot.log.1", "bot.log.2"]
+    last = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()][-1]
+    assert last['message'] == "Запись 99"
+
+
+@pytest.mark.asyncio
+async def test_middleware_logs_slow_update(monkeypatch, pipeline):
+    """Тест что медленный апдейт логируется с update_id, user_id, хендлером и длительностью"""
+    _, handler, capture = pipeline
+    middleware_logger = logging.getLogger("middlewares.log_context")
+    middleware_logger.addHandler(handler)
+    monkeypatch.setattr("config.LOG_SLOW_UPDATE", 0)
+    middleware = LogContextMiddleware()
+    update = Update.model_validate({'update_id': 5})
+
+    async def cmd_slow(event, data):
+        return "ok"
+
+    handler_object = MagicMock()
+    handler_object.callback = cmd_slow
+
+    async def _dispatch(event, data):
+        return await middleware(cmd_slow, object(), {'handler': handler_object})
+
+    try:
+        assert await middleware(_dispatch, update, {'event_from_user': MagicMock(id=42)}) == "ok"
+    finally:
+        middleware_logger.removeHandler(handler)
+    handler.queue.join()
+
+    [entry] = capture.lines
+    assert entry['level'] == "WARNING"
+    assert (entry['update_id'], entry['user_id']) == (5, 42)
+    assert entry['handler'].endswith("cmd_slow")
+    assert 'duration_ms' in entry
+    assert logs.log_context.get() is None
@@ -0,0 +1,55 @@
+"""Тесты для utils/loop_monitor.py и middlewares/update_tracker.py"""
+import asyncio
+import json
+import time
+import pytest
+from unittest.mock import MagicMock
+
+from middlewares.update_tracker import UpdateTracker
+from utils import metrics
+from utils.loop_monitor import LoopWatchdog
+
+
+def _blocking_handler():
+    # Синхронная работа в хендлере блокирует весь цикл событий
+    time.sleep(0.3)
+
+
+@pytest.mark.asyncio
+async def test_watchdog_reports_blocking_handler(tmp_path):
+    """Тест что сторож замечает блокировку цикла и записывает хендлер и стек"""
+    dump_path = tmp_path / "stalls.jsonl"
+    tracker = UpdateTracker()
+    watchdog = LoopWatchdog(0.02, 0.1, tracker, stack_dump_path=str(dump_path))
+    watchdog.start()
+    await asyncio.sleep(0.05)
+
+    async def cmd_slow(event, data):
+        _blocking_handler()
+
+    handler_object = MagicMock()
+    handler_object.callback = cmd_slow
+    event = MagicMock(spec=[])
+    await tracker(cmd_slow, event, {'handler': handler_object})
+
+    await asyncio.sleep(0.05)
+    await watchdog.stop()
+
+    assert watchdog.stalls == 1
+    assert metrics.histogram("event_loop_lag").count > 0
+    assert metrics.gauge("event_loop_lag_max").value >= 0.2
+
+    record = json.loads(dump_path.read_text(encoding="utf-8").splitlines()[0])
+    assert record['handler']['handler'].endswith("cmd_slow")
+    assert any(frame.endswith(":_blocking_handler") for frame in record['stack'])
+
+
+@pytest.mark.asyncio
+async def test_watchdog_quiet_without_blocking():
+    """Тест что без блокировок сторож не сообщает о задержках"""
+    watchdog = LoopWatchdog(0.02, 0.2)
+    watchdog.start()
+    for _ in range(10):
+        await asyncio.sleep(0.01)
+    await watchdog.stop()
+    assert watchdog.stalls == 0
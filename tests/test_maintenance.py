@@ -0,0 +1,89 @@
+"""Тесты для utils/maintenance.py и операций обслуживания хранилищ"""
+import asyncio
+from datetime import timedelta
+
+import aiosqlite
+import pytest
+from unittest.mock import AsyncMock
+
+import database
+from utils.maintenance import MaintenanceScheduler
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+async def backend(request, monkeypatch, mock_config):
+    """Фасад database поверх каждого из хранилищ"""
+    await database.init_db(request.param, mock_config)
+    await database.open_storage()
+    yield request.param
+    await database.close_storage()
+
+
+@pytest.mark.asyncio
+async def test_inactive_users_warned_then_expired(backend):
+    """Тест удаления неактивных: сначала предупреждение, потом удаление; активность его откладывает"""
+    for telegram_id in (111, 222, 333):
+        await database.create_user(telegram_id, None, f"User {telegram_id}", 1)
+    await database.set_desired_groups(333, [2])
+    await database.add_notified_pairs([(111, 333)])
+    bot = AsyncMock()
+    scheduler = MaintenanceScheduler(bot, 3600, timedelta(seconds=0.2), timedelta(seconds=0.2), batch_size=2,
+                                     batch_pause=0)
+
+    await asyncio.sleep(0.3)
+    result = await scheduler.run_once()
+    assert result['warned'] == 3 and result['expired'] == 0
+    assert sorted(call.args[0] for call in bot.send_message.await_args_list) == [111, 222, 333]
+    # Повторно не предупреждаем
+    assert await database.get_users_to_warn(database.datetime.now(), 10) == []
+
+    await database.touch_user(222)
+    await asyncio.sleep(0.3)
+    result = await scheduler.run_once()
+    assert result['expired'] == 2 and result['warned'] == 1
+    assert [user['telegram_id'] for user in await database.get_all_users()] == [222]
+    assert await database.get_desired_groups(333) == []
+    assert await database.get_notified_pairs() == set()
+
+
+@pytest.mark.asyncio
+async def test_expiry_disabled(backend):
+    """Тест что при user_ttl = None пользователи не удаляются"""
+    await database.create_user(111, None, "User", 1)
+    bot = AsyncMock()
+    result = await MaintenanceScheduler(bot, 3600, None, timedelta(days=7)).run_once()
+    assert result['warned'] == result['expired'] == 0
+    bot.send_message.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_incremental_vacuum_reclaims_space(tmp_path):
+    """Тест что новая БД создаётся с инкрементальным vacuum и место после удаления возвращается"""
+    path = str(tmp_path / "maintenance.db")
+    await database.init_db("sqlite", path)
+    await database.import_users([
+        {'telegram_id': i, 'username': "x" * 100, 'first_name': "User", 'current_group': 1, 'desired_groups': [2, 3]}
+        for i in range(1, 3001)
+    ])
+    await database.delete_users(list(range(1, 3001)))
+
+    async with aiosqlite.connect(path) as db:
+        async with db.execute("PRAGMA auto_vacuum") as cursor:
+            assert (await cursor.fetchone())[0] == 2
+    scheduler = MaintenanceScheduler(AsyncMock(), 3600, None, timedelta(days=7), batch_pause=0, vacuum_pages=16)
+    result = await scheduler.run_once()
+    assert result['vacuumed_pages'] > 16
+    assert await database.incremental_vacuum(16) == 0
+
+    async with aiosqlite.connect(path) as db:
+        async with db.execute("SELECT COUNT(*) FROM sqlite_stat1") as cursor:
+            assert (await cursor.fetchone())[0] > 0
+
+
+@pytest.mark.asyncio
+async def test_vacuum_converts_existing_database(mock_config):
+    """Тест перевода существующей БД в режим инкрементального vacuum"""
+    await database.vacuum()
+    async with aiosqlite.connect(mock_config) as db:
+        async with db.execute("PRAGMA auto_vacuum") as cursor:
+            assert (await cursor.fetchone())[0] == 2
@@ -0,0 +1,106 @@
+"""Тесты для utils/match_index.py"""
+import pytest
+import database
+from utils import matcher
+from utils.match_index import MatchIndex, match_index
+
+
+def _program_of(group_id):
+    return "a" if group_id <= 10 else "b"
+
+
+def test_candidates_mutual_only():
+    """Тест что кандидаты — только взаимный интерес"""
+    index = MatchIndex(_program_of)
+    index.set_user(111, 1, [2, 3])
+    index.set_user(222, 2, [1])
+    index.set_user(333, 3, [4])
+    index.set_user(444, 4, [1])
+    
+    assert index.candidates(111) == [(222, 2)]
+    assert index.candidates(222) == [(111, 1)]
+    assert index.candidates(333) == []
+
+
+def test_count_and_has_candidates():
+    """Тест подсчёта кандидатов по корзинам без построения списка"""
+    index = MatchIndex(_program_of)
+    index.set_user(111, 1, [2, 3])
+    index.set_user(222, 2, [1])
+    index.set_user(333, 3, [1, 4])
+    index.set_user(444, 2, [5])
+    
+    assert index.count_candidates(1, [2, 3]) == len(index.candidates(111)) == 2
+    assert index.count_candidates(2, [1], exclude=222) == 1
+    assert index.count_candidates(1, [4, 5]) == 0
+    assert index.has_candidates(1, [3]) is True
+    assert index.has_candidates(2, [1], exclude=111) is False
+    assert index.has_candidates(4, [1, 2]) is False
+
+
+def test_update_and_remove_user():
+    """Тест обновления и удаления пользователя из корзин"""
+    index = MatchIndex(_program_of)
+    index.set_user(111, 1, [2])
+    index.set_user(222, 2, [1])
+    
+    index.set_current_group(222, 3)
+    assert index.candidates(111) == []
+    
+    index.set_current_group(222, 2)
+    assert index.candidates(111) == [(222, 2)]
+    
+    index.set_desired_groups(222, [5])
+    assert index.candidates(111) == []
+    
+    index.set_desired_groups(222, [1])
+    index.remove_user(222)
+    assert index.candidates(111) == []
+    assert index.buckets("a") == {(1, 2): {111}}
+
+
+def test_partitions_by_program():
+    """Тест что корзины разных программ хранятся раздельно"""
+    index = MatchIndex(_program_of)
+    index.set_user(111, 1, [2])
+    index.set_user(222, 11, [12])
+    
+    assert set(index.buckets("a")) == {(1, 2)}
+    assert set(index.buckets("b")) == {(11, 12)}
+
+
+def test_load_rows():
+    """Тест полной загрузки из строк БД (включая пользователей без желаемых групп)"""
+    index = MatchIndex(_program_of)
+    index.load([(111, 1, 2), (111, 1, 3), (222, 2, 1), (333, 5, None)])
+    
+    assert index.ready is True
+    assert index.user_count() == 3
+    assert index.get_user(111) == (1, frozenset({2, 3}))
+    assert index.get_user(333) == (5, frozenset())
+
+
+@pytest.mark.asyncio
+async def test_find_matches_with_index(mock_config):
+    """Тест что поиск по индексу совпадает с поиском по БД и следит за изменениями"""
+    await database.create_user(111, "user1", "User 1", 1)
+    await database.set_desired_groups(111, [2, 3])
+    await database.create_user(222, "user2", "User 2", 2)
+    await database.set_desired_groups(222, [1])
+    
+    await database.load_match_index()
+    assert match_index.ready is True
+    
+    # Изменения после загрузки индекса попадают в индекс
+    await database.create_user(333, "user3", "User 3", 3)
+    await database.set_desired_groups(333, [1])
+    
+    matches = await matcher.find_matches(111)
+    assert [m['telegram_id'] for m in matches] == [222, 333]
+    assert matches[0]['username'] == "user2"
+    assert matches[0]['current_group'] == 2
+    assert matches[0]['desired_group'] == 1
+    
+    await database.delete_user(222)
+    await database.update_user_group(333, 4)
+    assert await matcher.find_matches(111) == []
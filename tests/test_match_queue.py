@@ -0,0 +1,62 @@
+"""Тесты для utils/match_queue.py"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+
+from utils import match_queue
+
+
+@pytest.mark.asyncio
+async def test_recheck_coalesced_per_user(monkeypatch):
+    """Тест что несколько изменений профиля подряд дают одну перепроверку"""
+    check = AsyncMock(return_value=[])
+    monkeypatch.setattr(match_queue, "check_and_notify_new_matches", check)
+
+    queue = match_queue.MatchRecheckQueue(0.05)
+    queue.start(AsyncMock())
+
+    queue.enqueue(111)
+    queue.enqueue(111)
+    queue.enqueue(222)
+
+    await asyncio.sleep(0.15)
+    await queue.stop()
+
+    called_users = sorted(call.args[0] for call in check.call_args_list)
+    assert called_users == [111, 222]
+
+
+@pytest.mark.asyncio
+async def test_recheck_has_no_extra_follow_up(monkeypatch):
+    """Тест что итог перепроверки не дублируется отдельным сообщением (он уже в дайджесте мэтчей)"""
+    check = AsyncMock(return_value=[{'telegram_id': 222}])
+    monkeypatch.setattr(match_queue, "check_and_notify_new_matches", check)
+
+    bot = AsyncMock()
+    queue = match_queue.MatchRecheckQueue(0.01)
+    queue.start(bot)
+
+    queue.enqueue(111)
+
+    await asyncio.sleep(0.1)
+    await queue.stop()
+
+    check.assert_awaited_once_with(111, bot)
+    bot.send_message.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_drain_runs_pending_rechecks(monkeypatch):
+    """Тест что при остановке перепроверки выполняются, не дожидаясь окна"""
+    check = AsyncMock(return_value=[])
+    monkeypatch.setattr(match_queue, "check_and_notify_new_matches", check)
+
+    queue = match_queue.MatchRecheckQueue(10)
+    queue.start(AsyncMock())
+
+    queue.enqueue(111)
+    queue.enqueue(222)
+
+    assert await queue.drain(1) is True
+    assert sorted(call.args[0] for call in check.call_args_list) == [111, 222]
+    assert queue.pending_count() == 0
@@ -7,8 +7,6 @@ from utils import matcher
 @pytest.mark.asyncio
 async def test_find_matches_no_user(mock_config):
     """Тест поиска мэтчей для несуществующего пользователя"""
-    await database.init_db()
-    
     matches = await matcher.find_matches(99999)
     assert matches == []
 
@@ -16,8 +14,6 @@ async def test_find_matches_no_user(mock_config):
 @pytest.mark.asyncio
 async def test_find_matches_no_desired_groups(mock_config):
     """Тест поиска мэтчей без желаемых групп"""
-    await database.init_db()
-    
     await database.create_user(111, "user1", "User 1", 1)
     
     matches = await matcher.find_matches(111)
@@ -27,8 +23,6 @@ async def test_find_matches_no_desired_groups(mock_config):
 @pytest.mark.asyncio
 async def test_find_matches_simple_match(mock_config):
     """Тест поиска простого мэтча"""
-    await database.init_db()
-    
     # User 1: группа 1, хочет в группу 2
     await database.create_user(111, "user1", "User 1", 1)
     await database.set_desired_groups(111, [2])
@@ -47,8 +41,6 @@ async def test_find_matches_simple_match(mock_config):
 @pytest.mark.asyncio
 async def test_find_matches_multiple_matches(mock_config):
     """Тест поиска нескольких мэтчей"""
-    await database.init_db()
-    
     # User 1: группа 1, хочет в группу 2 или 3
     await database.create_user(111, "user1", "User 1", 1)
     await database.set_desired_groups(111, [2, 3])
@@ -69,8 +61,6 @@ async def test_find_matches_multiple_matches(mock_config):
 @pytest.mark.asyncio
 async def test_find_matches_no_match(mock_config):
     """Тест поиска мэтчей когда их нет"""
-    await database.init_db()
-    
     # User 1: группа 1, хочет в группу 2
     await database.create_user(111, "user1", "User 1", 1)
     await database.set_desired_groups(111, [2])
@@ -86,8 +76,6 @@ async def test_find_matches_no_match(mock_config):
 @pytest.mark.asyncio
 async def test_find_matches_exclude_self(mock_config):
     """Тест что мэтч не включает самого пользователя"""
-    await database.init_db()
-    
     # User 1: группа 1, хочет в группу 1 (сам в себя)
     await database.create_user(111, "user1", "User 1", 1)
     await database.set_desired_groups(111, [1])
@@ -137,8 +125,6 @@ async def test_send_match_notification_no_username(mock_config):
 @pytest.mark.asyncio
 async def test_find_matches_after_user_deleted(mock_config):
     """Тест поиска мэтчей после удаления пользователя (больше не ищу)"""
-    await database.init_db()
-    
     # User 1: группа 1, хочет в группу 2
     await database.create_user(111, "user1", "User 1", 1)
     await database.set_desired_groups(111, [2])
@@ -163,8 +149,6 @@ async def test_find_matches_after_user_deleted(mock_config):
 @pytest.mark.asyncio
 async def test_find_matches_deleted_user_not_in_results(mock_config):
     """Тест что удаленный пользователь не появляется в результатах поиска"""
-    await database.init_db()
-    
     # User 1: группа 1, хочет в группу 2
     await database.create_user(111, "user1", "User 1", 1)
     await database.set_desired_groups(111, [2])
@@ -195,8 +179,6 @@ async def test_find_matches_deleted_user_not_in_results(mock_config):
 @pytest.mark.asyncio
 async def test_find_matches_multiple_users_deleted(mock_config):
     """Тест поиска мэтчей после удаления нескольких пользователей"""
-    await database.init_db()
-    
     # User 1: группа 1, хочет в группу 2, 3, 4
     await database.create_user(111, "user1", "User 1", 1)
     await database.set_desired_groups(111, [2, 3, 4])
@@ -231,8 +213,6 @@ async def test_find_matches_multiple_users_deleted(mock_config):
 @pytest.mark.asyncio
 async def test_find_matches_bidirectional_after_deletion(mock_config):
     """Тест что мэтчи работают в обе стороны и корректно обновляются после удаления"""
-    await database.init_db()
-    
     # User 1: группа 1, хочет в группу 2
     await database.create_user(111, "user1", "User 1", 1)
     await database.set_desired_groups(111, [2])
@@ -261,8 +241,6 @@ async def test_find_matches_bidirectional_after_deletion(mock_config):
 @pytest.mark.asyncio
 async def test_find_matches_partial_match_after_deletion(mock_config):
     """Тест частичного мэтча после удаления одного из участников"""
-    await database.init_db()
-    
     # User 1: группа 1, хочет в группу 2 и 3
     await database.create_user(111, "user1", "User 1", 1)
     await database.set_desired_groups(111, [2, 3])
@@ -299,8 +277,6 @@ async def test_find_matches_partial_match_after_deletion(mock_config):
 @pytest.mark.asyncio
 async def test_find_matches_no_matches_after_all_deleted(mock_config):
     """Тест что после удаления всех потенциальных мэтчей результат пустой"""
-    await database.init_db()
-    
     # User 1: группа 1, хочет в группу 2
     await database.create_user(111, "user1", "User 1", 1)
     await database.set_desired_groups(111, [2])
@@ -324,8 +300,6 @@ async def test_find_matches_no_matches_after_all_deleted(mock_config):
 @pytest.mark.asyncio
 async def test_find_matches_cascade_deletion(mock_config):
     """Тест что CASCADE удаление желаемых групп не влияет на поиск мэтчей"""
-    await database.init_db()
-    
     # User 1: группа 1, хочет в группу 2
     await database.create_user(111, "user1", "User 1", 1)
     await database.set_desired_groups(111, [2])
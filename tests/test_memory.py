@@ -0,0 +1,90 @@
+"""Тесты для utils/memory.py"""
+import logging
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+# Хранилища регистрируются при импорте модулей, которые их создают
+import handlers.profile  # noqa: F401
+import utils.stats  # noqa: F401
+from handlers.start import RegistrationStates, registration_data
+from utils import memory, metrics
+
+
+@pytest.fixture(autouse=True)
+def _restore_registry():
+    stores = dict(memory._stores)
+    fsm_storage = memory._fsm_storage
+    yield
+    memory._stores.clear()
+    memory._stores.update(stores)
+    memory._fsm_storage = fsm_storage
+    memory.allocation_tracker.stop()
+
+
+def test_owning_modules_register_stores():
+    """Тест регистрации хранилищ модулями, которые их создают"""
+    registration_data[1] = {'current_group': 101}
+    try:
+        sizes = {store['name']: store for store in memory.store_sizes()}
+        assert sizes['registration_data']['count'] == 1
+        assert sizes['registration_data']['bytes'] > 0
+        assert {'edit_data', 'stats_cache', 'match_index_users', 'match_digests_pending'} <= set(sizes)
+        assert 'bytes' not in sizes['match_index_users']
+    finally:
+        registration_data.pop(1)
+
+
+def test_deep_sizeof_counts_contents_and_stops_at_limit():
+    """Тест оценки размера: содержимое учитывается, обход ограничен"""
+    small, truncated = memory.deep_sizeof({1: [1]})
+    big, _ = memory.deep_sizeof({1: ["x" * 10000]})
+    assert not truncated and big > small + 10000
+    _, truncated = memory.deep_sizeof(list(range(100)), limit=10)
+    assert truncated
+
+
+@pytest.mark.asyncio
+async def test_fsm_sessions_by_state():
+    """Тест подсчёта сессий FSM по состояниям, включая закончившие сценарий"""
+    storage = MemoryStorage()
+    memory.register_fsm_storage(storage)
+    for user_id in (1, 2):
+        await storage.set_state(StorageKey(bot_id=0, chat_id=user_id, user_id=user_id),
+                                RegistrationStates.selecting_program)
+    await storage.set_state(StorageKey(bot_id=0, chat_id=3, user_id=3), None)
+
+    assert memory.fsm_sessions() == {RegistrationStates.selecting_program.state: 2, "без состояния": 1}
+    memory.register_fsm_storage(object())
+    assert memory.fsm_sessions() is None
+
+
+@pytest.mark.asyncio
+async def test_allocation_diff_between_reports():
+    """Тест tracemalloc: второй отчёт показывает рост с первого"""
+    memory.allocation_tracker.start(1)
+    first = await memory.memory_report()
+    assert first['allocations']['diff'] is None
+    kept = [bytearray(1024) for _ in range(1000)]
+    second = await memory.memory_report()
+    assert sum(size for _, size, _ in second['allocations']['diff']) >= 1024 * 1000
+    assert kept
+
+    text = memory.format_memory_report(second)
+    assert "Рост с прошлого /memory" in text and "registration_data" in text
+    memory.allocation_tracker.stop()
+    assert (await memory.memory_report())['allocations'] is None
+
+
+def test_monitor_sets_gauges_and_warns_once(caplog):
+    """Тест периодических метрик: RSS, хранилища и одно предупреждение при превышении порога"""
+    memory.register_store("test_store", lambda: 7)
+    monitor = memory.MemoryMonitor(60, warn_bytes=1)
+    with caplog.at_level(logging.WARNING, logger="utils.memory"):
+        monitor.sample()
+        monitor.sample()
+
+    snapshot = metrics.snapshot()
+    assert snapshot['memory_store_test_store']['value'] == 7
+    assert snapshot['process_rss_bytes']['value'] > 0
+    assert len([r for r in caplog.records if "больше порога" in r.getMessage()]) == 1
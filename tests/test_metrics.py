@@ -0,0 +1,51 @@
+"""Тесты для utils/metrics.py и команды /metrics"""
+import asyncio
+import logging
+from unittest.mock import AsyncMock
+
+import pytest
+
+from handlers import admin
+from keyboards.keyboards import MESSAGE_LIMIT
+from utils import metrics
+
+
+def test_format_snapshot():
+    """Тест текстового вида счётчиков, gauge и гистограмм"""
+    counter, gauge, histogram = metrics.Counter(), metrics.Gauge(), metrics.Histogram()
+    counter.inc(3)
+    gauge.set(0.25)
+    histogram.observe(0.5)
+    lines = metrics.format_snapshot({
+        'requests': counter.snapshot(), 'lag': gauge.snapshot(), 'latency': histogram.snapshot(),
+    })
+    assert lines == ["requests 3", "lag 0.25", "latency count=1 sum=0.5 p50=0.5 p95=0.5 p99=0.5"]
+
+
+@pytest.mark.asyncio
+async def test_reporter_logs_all_metrics(caplog):
+    """Тест что метрики периодически пишутся в лог одной строкой"""
+    metrics.counter("test_reporter_events").inc()
+    metrics.gauge("event_loop_lag_max").set(0.1)
+    reporter = metrics.MetricsReporter(0.01)
+    with caplog.at_level(logging.INFO, logger="utils.metrics"):
+        reporter.start()
+        await asyncio.sleep(0.05)
+        await reporter.stop()
+    message = caplog.records[0].getMessage()
+    assert "test_reporter_events 1" in message
+    assert "event_loop_lag_max 0.1" in message
+
+
+@pytest.mark.asyncio
+async def test_metrics_command_splits_long_output(monkeypatch):
+    """Тест что /metrics отправляет все метрики сообщениями в пределах лимита Telegram"""
+    values = {f"metric_{i:04d}": {'value': i} for i in range(1000)}
+    monkeypatch.setattr(metrics, "snapshot", lambda: values)
+    message = AsyncMock()
+    await admin.cmd_metrics(message)
+
+    texts = [call.args[0] for call in message.answer.call_args_list]
+    assert len(texts) > 1
+    assert all(len(text) <= MESSAGE_LIMIT for text in texts)
+    assert "\n".join(texts).splitlines() == [f"metric_{i:04d} {i}" for i in range(1000)]
@@ -0,0 +1,109 @@
+"""Тесты для utils/notifications.py"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+
+import database
+from utils import matcher
+from utils.notifications import MESSAGE_LIMIT, MatchNotifier, format_match_digest
+
+
+def _match(telegram_id, username="user"):
+    return {
+        'telegram_id': telegram_id,
+        'username': username,
+        'first_name': "User",
+        'current_group': 2,
+        'desired_group': 1,
+    }
+
+
+def test_digest_single_match():
+    """Тест что один мэтч оформляется прежним сообщением"""
+    texts = format_match_digest([_match(222, "user2")])
+    assert len(texts) == 1
+    assert texts[0].startswith("🎉 Есть мэтч!")
+    assert "@user2" in texts[0]
+
+
+def test_digest_is_chunked_by_message_limit():
+    """Тест что длинный дайджест делится на сообщения не длиннее лимита Telegram"""
+    matches = [_match(i, "u" * 30 + str(i)) for i in range(200)]
+    texts = format_match_digest(matches)
+
+    assert len(texts) > 1
+    assert all(len(text) <= MESSAGE_LIMIT for text in texts)
+    assert texts[0].startswith("🎉 Нашлось 200 мэтч(ей)!")
+    joined = "".join(texts)
+    assert all(f"@{'u' * 30}{i}\n" in joined for i in range(200))
+
+
+@pytest.mark.asyncio
+async def test_notifier_window_merges_per_recipient():
+    """Тест что в режиме окна мэтчи получателя уходят одним сообщением"""
+    notifier = MatchNotifier(0.05)
+    bot = AsyncMock()
+
+    await notifier.notify(bot, 111, [_match(222)])
+    await notifier.notify(bot, 111, [_match(333), _match(222)])
+    await notifier.notify(bot, 444, [_match(222)])
+    bot.send_message.assert_not_called()
+
+    await asyncio.sleep(0.1)
+    recipients = [call.args[0] for call in bot.send_message.call_args_list]
+    assert sorted(recipients) == [111, 444]
+    text_111 = next(call.args[1] for call in bot.send_message.call_args_list if call.args[0] == 111)
+    assert text_111.startswith("🎉 Нашлось 2 мэтч(ей)!")
+
+
+@pytest.mark.asyncio
+async def test_notifier_flush_sends_pending():
+    """Тест что при остановке накопленные дайджесты отправляются сразу"""
+    notifier = MatchNotifier(10)
+    bot = AsyncMock()
+
+    await notifier.notify(bot, 111, [_match(222)])
+    assert notifier.pending_count() == 1
+
+    await notifier.flush()
+    bot.send_message.assert_called_once()
+    assert notifier.pending_count() == 0
+
+
+@pytest.mark.asyncio
+async def test_check_and_notify_sends_one_message_per_recipient(mock_config):
+    """Тест что несколько мэтчей приходят пользователю одним сообщением"""
+    await database.create_user(111, "user1", "User 1", 1)
+    await database.set_desired_groups(111, [2, 3])
+    for telegram_id, group in ((222, 2), (333, 3), (444, 2)):
+        await database.create_user(telegram_id, f"user{telegram_id}", "User", group)
+        await database.set_desired_groups(telegram_id, [1])
+
+    bot = AsyncMock()
+    matches = await matcher.check_and_notify_new_matches(111, bot)
+
+    assert len(matches) == 3
+    recipients = [call.args[0] for call in bot.send_message.call_args_list]
+    assert sorted(recipients) == [111, 222, 333, 444]
+
+
+@pytest.mark.asyncio
+async def test_check_and_notify_skips_notified_pairs(mock_config):
+    """Тест что повторная проверка уведомляет только о новых мэтчах"""
+    await database.create_user(111, "user1", "User 1", 1)
+    await database.set_desired_groups(111, [2])
+    await database.create_user(222, "user2", "User 2", 2)
+    await database.set_desired_groups(222, [1])
+    await database.load_match_index()
+
+    assert len(await matcher.check_and_notify_new_matches(111, AsyncMock())) == 1
+
+    bot = AsyncMock()
+    assert await matcher.check_and_notify_new_matches(111, bot) == []
+    bot.send_message.assert_not_called()
+
+    await database.create_user(333, "user3", "User 3", 2)
+    await database.set_desired_groups(333, [1])
+    matches = await matcher.check_and_notify_new_matches(111, bot)
+    assert [match['telegram_id'] for match in matches] == [333]
+    assert sorted(call.args[0] for call in bot.send_message.call_args_list) == [111, 333]
@@ -0,0 +1,60 @@
+"""Тесты для handlers/profile.py"""
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from aiogram.types import CallbackQuery
+
+from config import DEFAULT_PROGRAM
+from handlers import profile
+from middlewares.callback_answer import CallbackAnswer
+from utils.debounce import keyboard_debouncer
+
+
+def _make_callback(data: str, user_id: int = 111):
+    callback = MagicMock(spec=CallbackQuery)
+    callback.id = "1"
+    callback.data = data
+    callback.from_user = MagicMock(id=user_id)
+    callback.message = AsyncMock()
+    return callback
+
+
+@pytest.mark.asyncio
+async def test_edit_rejects_groups_outside_program(monkeypatch):
+    """Тест что при редактировании нельзя выбрать группу не из своей программы"""
+    monkeypatch.setattr(profile.database, "get_desired_groups", AsyncMock(return_value=[2]))
+    monkeypatch.setattr(profile, "count_matches", AsyncMock(return_value=0))
+    state = AsyncMock()
+
+    # Данных редактирования нет (например, бот перезапускался) — алерт
+    callback_answer = CallbackAnswer()
+    await profile.process_edit_current_group(_make_callback("select_group_3"), state, callback_answer)
+    assert callback_answer.show_alert is True
+
+    profile.edit_data[111] = {'program': DEFAULT_PROGRAM}
+    try:
+        for data in ("select_group_999999", "select_group_x"):
+            callback = _make_callback(data)
+            callback_answer = CallbackAnswer()
+            await profile.process_edit_current_group(callback, state, callback_answer)
+            assert callback_answer.show_alert is True
+            callback.message.edit_text.assert_not_called()
+        state.set_state.assert_not_called()
+
+        callback = _make_callback("select_group_3")
+        await profile.process_edit_current_group(callback, state, CallbackAnswer())
+        assert profile.edit_data[111]['current_group'] == 3
+        callback.message.edit_text.assert_awaited_once()
+
+        profile.edit_data[111] = {'desired_groups': set(), 'user_group': 1, 'page': 0}
+        for data in ("toggle_desired_1", "toggle_desired_999999", "toggle_desired_"):
+            callback_answer = CallbackAnswer()
+            await profile.process_edit_desired_toggle(_make_callback(data), state, callback_answer)
+            assert callback_answer.show_alert is True
+        assert profile.edit_data[111]['desired_groups'] == set()
+
+        await profile.process_edit_desired_toggle(_make_callback("toggle_desired_2"), state, CallbackAnswer())
+        assert profile.edit_data[111]['desired_groups'] == {2}
+    finally:
+        profile.edit_data.pop(111, None)
+        await keyboard_debouncer.flush()
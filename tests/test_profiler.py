@@ -0,0 +1,77 @@
+"""Тесты для utils/profiler.py и middlewares/profiler.py"""
+import asyncio
+import pstats
+import time
+import pytest
+
+from middlewares.profiler import ProfilerMiddleware
+from utils.profiler import Profiler, format_report
+
+
+def _busy(seconds: float):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+
+
+async def _waiting_handler(event, data):
+    await asyncio.sleep(0.05)
+    _busy(0.02)
+
+
+@pytest.mark.asyncio
+async def test_profile_next_updates(tmp_path):
+    """Тест профилирования следующих N апдейтов: файлы pstats и collapsed с ожиданием и работой хендлера"""
+    profiler = Profiler(str(tmp_path), 0.002)
+    middleware = ProfilerMiddleware(profiler)
+    reports = []
+
+    async def _on_done(report):
+        reports.append(report)
+
+    assert profiler.start(60, updates=2, on_done=_on_done) is True
+    assert profiler.start(60) is False
+    await asyncio.gather(middleware(_waiting_handler, object(), {}), middleware(_waiting_handler, object(), {}))
+    for _ in range(100):
+        if reports:
+            break
+        await asyncio.sleep(0.01)
+
+    assert not profiler.active
+    [report] = reports
+    assert report['updates'] == 2
+    assert report['samples'] > 0
+
+    stats = pstats.Stats(report['pstats'])
+    assert any(func[2] == "_busy" for func in stats.stats)
+    collapsed = open(report['collapsed'], encoding="utf-8").read().splitlines()
+    # Цепочка await задачи доходит до sleep внутри хендлера
+    assert any(line.startswith("task ") and "_waiting_handler" in line and "sleep" in line for line in collapsed)
+    assert any(line.startswith("loop;") and "_busy" in line for line in collapsed)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed)
+    assert "_busy" in format_report(report)
+
+
+@pytest.mark.asyncio
+async def test_profile_window_ends_by_time(tmp_path):
+    """Тест что профилирование выключается по истечении окна"""
+    profiler = Profiler(str(tmp_path), 0.005)
+    profiler.start(0.05)
+    await asyncio.sleep(0.2)
+    assert not profiler.active
+    assert len(list(tmp_path.iterdir())) == 2
+    assert await profiler.stop() is None
+
+
+@pytest.mark.asyncio
+async def test_middleware_ignores_inactive_profiler(tmp_path):
+    """Тест что выключенный профилировщик не учитывает апдейты"""
+    profiler = Profiler(str(tmp_path), 0.005)
+    middleware = ProfilerMiddleware(profiler)
+
+    async def _handler(event, data):
+        return "ok"
+
+    assert await middleware(_handler, object(), {}) == "ok"
+    assert profiler._updates_done == 0
+    assert list(tmp_path.iterdir()) == []
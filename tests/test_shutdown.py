@@ -0,0 +1,80 @@
+"""Тесты для мягкой остановки бота"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+
+import bot
+import database
+from middlewares.in_flight import InFlightMiddleware
+from utils import match_queue, sweep
+
+
+@pytest.mark.asyncio
+async def test_in_flight_waits_for_handlers():
+    """Тест что остановка дожидается начатых апдейтов"""
+    in_flight = InFlightMiddleware()
+    release = asyncio.Event()
+
+    async def _handler(event, data):
+        await release.wait()
+
+    task = asyncio.create_task(in_flight(_handler, object(), {}))
+    await asyncio.sleep(0)
+    assert in_flight.count == 1
+    assert await in_flight.wait_idle(0.05) is False
+
+    release.set()
+    assert await in_flight.wait_idle(1) is True
+    await task
+    assert in_flight.count == 0
+
+
+@pytest.mark.asyncio
+async def test_periodic_sweep_stops_on_event(monkeypatch):
+    """Тест что периодическая проверка завершается по событию остановки"""
+    monkeypatch.setattr(sweep, "sweep_matches", AsyncMock(return_value=0))
+    stop = asyncio.Event()
+    task = asyncio.create_task(sweep.run_periodic_sweep(AsyncMock(), 0.01, stop))
+    await asyncio.sleep(0.05)
+
+    stop.set()
+    await asyncio.wait_for(task, 1)
+    assert sweep.sweep_matches.await_count >= 1
+
+
+@pytest.mark.asyncio
+async def test_shutdown_drains_before_closing_storage(monkeypatch, mock_config):
+    """Тест что хранилище закрывается только после выполнения отложенных перепроверок"""
+    await database.open_storage()
+
+    events = []
+
+    async def _check(telegram_id, _bot):
+        await database.create_user(telegram_id, None, "User", 1)
+        events.append(("recheck", telegram_id))
+        return []
+
+    close_storage = database.close_storage
+
+    async def _close_storage():
+        events.append(("close_storage",))
+        await close_storage()
+
+    queue = match_queue.MatchRecheckQueue(10)
+    monkeypatch.setattr(match_queue, "check_and_notify_new_matches", _check)
+    monkeypatch.setattr(bot, "recheck_queue", queue)
+    monkeypatch.setattr(database, "close_storage", _close_storage)
+    monkeypatch.setattr(bot.config, "MATCH_INDEX_SNAPSHOT_PATH", mock_config + ".snapshot")
+
+    fake_bot = AsyncMock()
+    queue.start(fake_bot)
+    queue.enqueue(111)
+
+    sweep_stop = asyncio.Event()
+    sweep_task = asyncio.create_task(sweep.run_periodic_sweep(fake_bot, 3600, sweep_stop))
+    await bot.shutdown(fake_bot, InFlightMiddleware(), sweep_stop, sweep_task)
+
+    assert events == [("recheck", 111), ("close_storage",)]
+    assert sweep_task.done()
+    fake_bot.session.close.assert_awaited_once()
+    assert await database.user_exists(111) is True
@@ -0,0 +1,99 @@
+"""Тесты для utils/snapshot.py"""
+import pytest
+
+import database
+from utils.match_index import MatchIndex
+from utils.snapshot import load_snapshot, save_snapshot
+
+
+def _program_of(group_id):
+    return "a" if group_id <= 10 else "b"
+
+
+def _state(index):
+    return {telegram_id: index.get_user(telegram_id) for telegram_id in (111, 222, 333, 444)}
+
+
+def test_snapshot_roundtrip(tmp_path):
+    """Тест что индекс из снимка совпадает с исходным"""
+    path = str(tmp_path / "index.snapshot")
+    index = MatchIndex(_program_of)
+    index.set_user(111, 1, [2, 3])
+    index.set_user(222, 2, [1])
+    index.set_user(333, 11, [12])
+    index.set_user(444, 4, [])
+
+    assert save_snapshot(index, path, 42) > 0
+
+    restored = MatchIndex(_program_of)
+    assert load_snapshot(restored, path, 42) is True
+    assert restored.ready
+    assert _state(restored) == _state(index)
+    assert restored.candidates(111) == [(222, 2)]
+    assert restored.buckets("b") == {(11, 12): {333}}
+    assert restored.user_count() == 4
+
+
+def test_snapshot_rejected(tmp_path):
+    """Тест что устаревший, повреждённый или отсутствующий снимок не загружается"""
+    path = tmp_path / "index.snapshot"
+    index = MatchIndex(_program_of)
+    assert load_snapshot(index, str(path), 1) is False
+
+    index.set_user(111, 1, [2])
+    save_snapshot(index, str(path), 1)
+    assert load_snapshot(MatchIndex(_program_of), str(path), 2) is False
+
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xFF
+    path.write_bytes(bytes(data))
+    restored = MatchIndex(_program_of)
+    assert load_snapshot(restored, str(path), 1) is False
+    assert not restored.ready
+
+
+@pytest.mark.asyncio
+async def test_change_counter_tracks_writes(mock_config):
+    """Тест что счётчик изменений БД растёт при изменении пользователей"""
+    counter = await database.get_change_counter()
+
+    await database.create_user(111, "user1", "User 1", 1)
+    await database.set_desired_groups(111, [2])
+    after_writes = await database.get_change_counter()
+    assert after_writes > counter
+
+    # Уведомлённые пары на индекс не влияют
+    await database.add_notified_pairs([(111, 222)])
+    assert await database.get_change_counter() == after_writes
+
+    await database.delete_user(111)
+    assert await database.get_change_counter() > after_writes
+
+
+@pytest.mark.asyncio
+async def test_snapshot_skipped_after_out_of_process_write(monkeypatch, mock_config, tmp_path):
+    """Тест что снимок не сохраняется, если БД менял другой процесс, а свои записи сохранению не мешают"""
+    import bot
+    from storage.sqlite import SQLiteRepository
+    from utils.change_feed import ExternalWriteWatcher
+    from utils.match_index import match_index
+
+    path = tmp_path / "index.snapshot"
+    monkeypatch.setattr("config.MATCH_INDEX_SNAPSHOT_PATH", str(path))
+    await database.open_storage()
+    try:
+        watcher = ExternalWriteWatcher(interval=1)
+        await watcher.mark()
+        await database.load_match_index()
+        await database.create_user(111, "user1", "User 1", 1)
+        await database.set_desired_groups(111, [2])
+        await bot.save_match_index_snapshot(watcher=watcher)
+        assert load_snapshot(MatchIndex(_program_of), str(path), await database.get_change_counter())
+
+        # manage.py import при работающем боте: индекс об этом пользователе не знает
+        await SQLiteRepository(mock_config).create_user(222, "user2", "User 2", 2)
+        await bot.save_match_index_snapshot(watcher=watcher)
+        assert not path.exists()
+        assert match_index.get_user(222) is None
+    finally:
+        await database.close_storage()
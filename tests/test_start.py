@@ -0,0 +1,98 @@
+"""Тесты для handlers/start.py"""
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from aiogram.types import CallbackQuery
+
+from config import DEFAULT_PROGRAM
+from handlers import start
+from keyboards.keyboards import MESSAGE_LIMIT
+from middlewares.callback_answer import CallbackAnswer
+from utils.debounce import keyboard_debouncer
+
+
+def _make_callback(data: str, user_id: int = 111):
+    callback = MagicMock(spec=CallbackQuery)
+    callback.id = "1"
+    callback.data = data
+    callback.from_user = MagicMock(id=user_id)
+    callback.message = AsyncMock()
+    return callback
+
+
+@pytest.mark.asyncio
+async def test_unknown_program_answered_with_alert():
+    """Тест что устаревшая или подделанная кнопка программы получает алерт, а не ошибку"""
+    state = AsyncMock()
+    for handler, data in (
+        (start.process_program_selection, "select_program_unknown"),
+        (start.process_groups_page, "groups_page_unknown_1"),
+        (start.process_groups_page, f"groups_page_{DEFAULT_PROGRAM}_x"),
+    ):
+        callback = _make_callback(data)
+        callback_answer = CallbackAnswer()
+        args = (callback, state, callback_answer) if handler is start.process_program_selection else (callback, callback_answer)
+        await handler(*args)
+        assert callback_answer.show_alert is True
+        callback.message.edit_text.assert_not_called()
+        callback.message.edit_reply_markup.assert_not_called()
+    state.set_state.assert_not_called()
+
+    callback = _make_callback(f"select_program_{DEFAULT_PROGRAM}")
+    await start.process_program_selection(callback, state, CallbackAnswer())
+    callback.message.edit_text.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_unknown_groups_answered_with_alert():
+    """Тест что id группы не из каталога или не из программы пользователя получает алерт"""
+    state = AsyncMock()
+    for data in ("select_group_999999", "select_group_x", "select_group_"):
+        callback = _make_callback(data)
+        callback_answer = CallbackAnswer()
+        await start.process_group_selection(callback, state, callback_answer)
+        assert callback_answer.show_alert is True
+        callback.message.edit_text.assert_not_called()
+    assert 111 not in start.registration_data
+
+    await start.process_group_selection(_make_callback("select_group_1"), state, CallbackAnswer())
+    try:
+        # Текущая группа и группа другой программы желаемыми быть не могут
+        for data in ("toggle_desired_1", "toggle_desired_999999"):
+            callback_answer = CallbackAnswer()
+            await start.process_desired_group_toggle(_make_callback(data), state, callback_answer)
+            assert callback_answer.show_alert is True
+        assert start.registration_data[111]['desired_groups'] == set()
+
+        callback_answer = CallbackAnswer()
+        await start.process_desired_group_toggle(_make_callback("toggle_desired_2"), state, callback_answer)
+        assert callback_answer.show_alert is None
+        assert start.registration_data[111]['desired_groups'] == {2}
+    finally:
+        start.registration_data.pop(111, None)
+        await keyboard_debouncer.flush()
+
+
+@pytest.mark.asyncio
+async def test_long_schedule_split_across_messages():
+    """Тест что расписание большой программы уходит несколькими сообщениями, клавиатура — под последним"""
+    from utils.groups import Group, catalog
+
+    catalog.load(
+        [("big", "БИГ"), ("small", "МАЛ")],
+        [Group(1000 + i, "big", i, "понедельник, 10:00 — 11:20") for i in range(1, 501)]
+    )
+    try:
+        callback = _make_callback("select_program_big")
+        await start.process_program_selection(callback, AsyncMock(), CallbackAnswer())
+    finally:
+        catalog.load_from_config()
+
+    texts = [callback.message.edit_text.call_args.args[0]]
+    texts += [call.args[0] for call in callback.message.answer.call_args_list]
+    assert len(texts) > 1
+    assert all(len(text) <= MESSAGE_LIMIT for text in texts)
+    assert "БИГ-1:" in texts[0] and "БИГ-500:" in texts[-1]
+    assert texts[-1].endswith("📍 Выбери группу, в которой ты сейчас учишься:")
+    assert "reply_markup" not in callback.message.edit_text.call_args.kwargs
+    assert callback.message.answer.call_args_list[-1].kwargs['reply_markup'] is not None
@@ -0,0 +1,87 @@
+"""Тесты для utils/stats.py"""
+import pytest
+import database
+from utils import stats
+
+
+def test_count_matchable_pairs():
+    """Тест подсчёта пар для обмена по матрице спроса"""
+    matrix = {(1, 2): 3, (2, 1): 2, (1, 3): 1, (3, 4): 5}
+    assert stats.count_matchable_pairs(matrix) == 6
+
+
+def test_count_unmatched_demand():
+    """Тест подсчёта желаний без встречного"""
+    matrix = {(1, 2): 3, (2, 1): 2, (1, 3): 1, (3, 4): 5}
+    assert stats.count_unmatched_demand(matrix) == 6
+
+
+@pytest.mark.asyncio
+async def test_aggregates_from_db(mock_config):
+    """Тест агрегатов по БД и форматирования статистики"""
+    await database.create_user(111, "user1", "User 1", 1)
+    await database.set_desired_groups(111, [2, 3])
+    await database.create_user(222, "user2", "User 2", 2)
+    await database.set_desired_groups(222, [1])
+    await database.create_user(333, "user3", "User 3", 2)
+    
+    assert await database.get_group_population() == {1: 1, 2: 2}
+    assert await database.get_demand_matrix() == {(1, 2): 1, (1, 3): 1, (2, 1): 1}
+    
+    result = await stats._compute_stats()
+    assert result['matchable_pairs'] == 1
+    assert result['unmatched_demand'] == 1
+    
+    texts = stats.format_stats(result)
+    assert len(texts) == 1
+    text = texts[0]
+    assert "📊 Статистика" in text
+    assert text.count("<pre>") == text.count("</pre>") == 1
+    assert "Пар для обмена сейчас: 1" in text
+
+
+def test_long_stats_split_into_messages():
+    """Тест что статистика длиннее лимита Telegram делится на сообщения, <pre> в каждом закрыт"""
+    from utils.groups import Group, catalog
+    from utils.notifications import MESSAGE_LIMIT
+    
+    catalog.load(
+        [("small", "МАЛ"), ("big", "БИГ")],
+        [Group(i, "small", i, "10:00 — 11:20") for i in range(1, 9)]
+        + [Group(100 + i, "big", i, "10:00 — 11:20") for i in range(1, 301)]
+    )
+    try:
+        matrix = {(100 + i, 100 + j): 1 for i in range(1, 301) for j in range(1, 4) if i != j}
+        matrix.update({(i, i % 8 + 1): 2 for i in range(1, 9)})
+        result = {
+            'population': {100 + i: 1 for i in range(1, 301)},
+            'matrix': matrix,
+            'matchable_pairs': 0,
+            'unmatched_demand': 0,
+        }
+        texts = stats.format_stats(result)
+        assert len(texts) > 1
+        assert all(len(text) <= MESSAGE_LIMIT for text in texts)
+        assert all(text.count("<pre>") == text.count("</pre>") for text in texts)
+        joined = "\n".join(texts)
+        assert joined.count("→") == len(matrix) - 8
+        assert "Желаний без встречного: 0" in texts[-1]
+    finally:
+        catalog.load_from_config()
+
+
+def test_titles_escaped():
+    """Тест что названия программ и групп экранируются для HTML"""
+    from utils.groups import Group, catalog
+    
+    catalog.load(
+        [("odd", "R&D <1>")],
+        [Group(100 + i, "odd", i, "10:00 — 11:20") for i in range(1, 13)]
+    )
+    try:
+        result = {'population': {101: 1}, 'matrix': {(101, 102): 1}, 'matchable_pairs': 0, 'unmatched_demand': 1}
+        text = "".join(stats.format_stats(result))
+        assert "R&amp;D &lt;1&gt;" in text
+        assert "R&D" not in text and "<1>" not in text
+    finally:
+        catalog.load_from_config()
@@ -0,0 +1,144 @@
+"""Тесты для storage/: оба хранилища должны вести себя одинаково"""
+import pytest
+
+import config
+import database
+from storage import IntegrityError, InMemoryRepository, SQLiteRepository
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+async def backend(request, monkeypatch, mock_config):
+    """Фасад database поверх каждого из хранилищ"""
+    await database.init_db(request.param, mock_config)
+    await database.open_storage()
+    yield request.param
+    await database.close_storage()
+
+
+def test_create_repository(mock_config):
+    """Тест выбора хранилища по имени"""
+    assert isinstance(database.create_repository("memory"), InMemoryRepository)
+    repository = database.create_repository("sqlite", mock_config)
+    assert isinstance(repository, SQLiteRepository)
+    assert repository.path == mock_config
+    assert database.create_repository("sqlite").path == config.DATABASE_PATH
+    with pytest.raises(ValueError):
+        database.create_repository("redis")
+
+
+@pytest.mark.asyncio
+async def test_users_crud(backend):
+    """Тест создания, изменения и удаления пользователей"""
+    await database.create_user(111, "user1", "User 1", 1)
+    await database.create_user(222, None, "User 2", 2)
+
+    assert await database.user_exists(111) is True
+    assert await database.user_exists(333) is False
+    user = await database.get_user(111)
+    assert user['username'] == "user1"
+    assert user['current_group'] == 1
+    assert user['created_at'] is not None
+
+    with pytest.raises(IntegrityError):
+        await database.create_user(111, "dup", "Duplicate", 3)
+
+    await database.update_user_group(111, 3)
+    assert [u['telegram_id'] for u in await database.get_users_from_group(3)] == [111]
+    assert await database.get_users_from_group(1) == []
+
+    assert set(await database.get_users([111, 222, 333])) == {111, 222}
+    assert [u['telegram_id'] for u in await database.get_all_users()] == [111, 222]
+
+    await database.delete_user(111)
+    assert await database.get_user(111) is None
+    assert await database.get_desired_groups(111) == []
+
+
+@pytest.mark.asyncio
+async def test_desired_groups_and_aggregates(backend):
+    """Тест желаемых групп, строк индекса мэтчей и агрегатов"""
+    await database.create_user(111, "user1", "User 1", 1)
+    await database.create_user(222, "user2", "User 2", 2)
+    await database.create_user(333, "user3", "User 3", 2)
+    await database.set_desired_groups(111, [2, 3])
+    await database.set_desired_groups(222, [1])
+    await database.set_desired_groups(333, [1])
+
+    assert sorted(await database.get_desired_groups(111)) == [2, 3]
+    await database.set_desired_groups(111, [2])
+    assert await database.get_desired_groups(111) == [2]
+
+    assert sorted(await database.get_match_rows(), key=str) == sorted(
+        [(111, 1, 2), (222, 2, 1), (333, 2, 1)], key=str
+    )
+    assert await database.get_group_population() == {1: 1, 2: 2}
+    assert await database.get_demand_matrix() == {(1, 2): 1, (2, 1): 2}
+
+    # Агрегаты мэтчей: кто из желаемых групп хочет в текущую (без самого пользователя)
+    assert await database.count_matches(1, [2, 3]) == 2
+    assert await database.count_matches(1, [2], exclude=222) == 1
+    assert await database.count_matches(1, [3]) == 0
+    assert await database.count_matches(1, []) == 0
+    assert await database.has_matches(2, [1]) is True
+    assert await database.has_matches(2, [1], exclude=111) is False
+    assert await database.has_matches(1, []) is False
+
+    # Желаемые группы несуществующего пользователя — нарушение внешнего ключа
+    with pytest.raises(IntegrityError):
+        await database.set_desired_groups(999, [1])
+
+
+@pytest.mark.asyncio
+async def test_notified_pairs(backend):
+    """Тест отметок об уведомлённых парах"""
+    await database.create_user(111, "user1", "User 1", 1)
+    await database.create_user(222, "user2", "User 2", 2)
+    await database.create_user(333, "user3", "User 3", 2)
+
+    await database.add_notified_pairs([(111, 222), (111, 333)])
+    assert await database.get_notified_pairs() == {(111, 222), (111, 333)}
+    assert await database.get_notified_partners(111) == {222, 333}
+    assert await database.get_notified_partners(333) == {111}
+    await database.remove_notified_pairs([(111, 333)])
+    assert await database.get_notified_pairs() == {(111, 222)}
+
+    # Удаление пользователя убирает и его пары
+    await database.delete_user(222)
+    assert await database.get_notified_pairs() == set()
+
+
+@pytest.mark.asyncio
+async def test_catalog_and_bulk(backend):
+    """Тест каталога групп и массовой загрузки"""
+    assert await database.get_programs() == [("iad", "ИАД")]
+    groups = await database.get_groups("iad")
+    assert [g.number for g in groups] == list(range(1, 11))
+
+    users = [
+        {'telegram_id': 111, 'username': "a", 'first_name': "A", 'current_group': 1, 'desired_groups': [2]},
+        {'telegram_id': 222, 'username': None, 'first_name': "B", 'current_group': 2, 'desired_groups': []},
+    ]
+    assert await database.import_users(users) == 2
+    assert await database.import_users(users) == 0
+    users[0]['current_group'] = 3
+    assert await database.import_users(users[:1], replace=True) == 1
+
+    exported = [user async for user in database.iter_users_with_desired(chunk_size=1)]
+    assert exported == [
+        {'telegram_id': 111, 'username': "a", 'first_name': "A", 'current_group': 3, 'desired_groups': [2]},
+        {'telegram_id': 222, 'username': None, 'first_name': "B", 'current_group': 2, 'desired_groups': []},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_memory_change_log_is_capped():
+    """Тест что журнал изменений хранилища в памяти не растёт без ChangeFeed"""
+    repository = InMemoryRepository(change_log_keep=3)
+    await repository.init()
+    for telegram_id in range(1, 6):
+        await repository.create_user(telegram_id, None, "User", 1)
+
+    assert await repository.get_change_log_bounds() == (3, 5)
+    assert await repository.get_change_log(3) == [(4, 4), (5, 5)]
+    await repository.prune_change_log(1)
+    assert await repository.get_change_log(0) == [(5, 5)]
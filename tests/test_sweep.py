@@ -0,0 +1,70 @@
+"""Тесты для utils/sweep.py"""
+import pytest
+from unittest.mock import AsyncMock
+
+import database
+from utils import matcher
+from utils.sweep import compute_mutual_pairs, sweep_matches
+
+
+def test_compute_mutual_pairs():
+    """Тест вычисления взаимных пар по матрице спроса"""
+    rows = [
+        (111, 1, 2), (111, 1, 3),
+        (222, 2, 1),
+        (333, 3, 1),
+        (444, 3, 2),
+        (555, 4, None),
+    ]
+    pairs = compute_mutual_pairs(rows)
+    assert pairs == {
+        (111, 222): (1, 2),
+        (111, 333): (1, 3),
+    }
+
+
+def test_compute_mutual_pairs_orders_by_user_id():
+    """Тест что пара хранится как (меньший id, больший id) с группами в том же порядке"""
+    pairs = compute_mutual_pairs([(900, 5, 6), (100, 6, 5)])
+    assert pairs == {(100, 900): (6, 5)}
+
+
+@pytest.mark.asyncio
+async def test_sweep_notifies_only_new_pairs(mock_config):
+    """Тест что периодическая проверка уведомляет только о новых мэтчах"""
+    # Пользователи добавлены в обход хендлеров (импорт, починка БД)
+    await database.create_user(111, "user1", "User 1", 1)
+    await database.set_desired_groups(111, [2])
+    await database.create_user(222, "user2", "User 2", 2)
+    await database.set_desired_groups(222, [1])
+    
+    bot = AsyncMock()
+    assert await sweep_matches(bot) == 1
+    assert {call.args[0] for call in bot.send_message.call_args_list} == {111, 222}
+    
+    bot.reset_mock()
+    assert await sweep_matches(bot) == 0
+    bot.send_message.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_sweep_skips_pairs_notified_on_edit(mock_config):
+    """Тест что мэтчи, уведомлённые при изменении профиля, не дублируются"""
+    await database.create_user(111, "user1", "User 1", 1)
+    await database.set_desired_groups(111, [2])
+    await database.create_user(222, "user2", "User 2", 2)
+    await database.set_desired_groups(222, [1])
+    
+    await matcher.check_and_notify_new_matches(222, AsyncMock())
+    
+    bot = AsyncMock()
+    assert await sweep_matches(bot) == 0
+    bot.send_message.assert_not_called()
+
+
+def test_bench_sweep_command(capsys):
+    """Тест замера вычисления мэтчей на синтетической базе"""
+    import manage
+
+    assert manage.main(["bench-sweep", "--users", "200", "--groups", "4", "--repeat", "1"]) == 0
+    assert "взаимных пар" in capsys.readouterr().out
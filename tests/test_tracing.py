@@ -0,0 +1,200 @@
+"""Тесты для utils/tracing.py и middlewares/tracing.py"""
+import asyncio
+import json
+import pytest
+from aiohttp import ClientSession, web
+from aiogram.methods import SendMessage
+from aiogram.types import Update
+from unittest.mock import MagicMock
+
+import database
+from middlewares.tracing import BotApiTracingMiddleware, TracingMiddleware
+from utils import tracing
+
+
+class _ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    async def export(self, spans):
+        self.spans.extend(spans)
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    """Трассировка всех апдейтов в список"""
+    exporter = _ListExporter()
+    tracer = tracing.Tracer()
+    tracer.configure(1.0, exporter)
+    monkeypatch.setattr(tracing, "tracer", tracer)
+    monkeypatch.setattr("middlewares.tracing.tracer", tracer)
+    monkeypatch.setattr("storage.sqlite.tracer", tracer)
+    yield exporter
+
+
+@pytest.mark.asyncio
+async def test_spans_nest_across_tasks_and_database(monkeypatch, exporter):
+    """Тест что вызовы database.* и задачи, начатые внутри трассы, становятся её дочерними спанами"""
+    monkeypatch.setattr(database, "_repository", database.create_repository("memory"))
+
+    async def _background():
+        async with tracing.tracer.span("background"):
+            await database.user_exists(1)
+
+    async with tracing.tracer.trace("update", update_id=1) as root:
+        await database.user_exists(1)
+        await asyncio.create_task(_background())
+    await tracing.tracer.flush()
+
+    spans = {span['name']: span for span in exporter.spans}
+    assert set(spans) == {"update", "db.user_exists", "background"}
+    assert all(span['trace_id'] == root.trace_id for span in exporter.spans)
+    assert spans['background']['parent_id'] == root.span_id
+    nested = [s for s in exporter.spans if s['name'] == "db.user_exists" and s['parent_id'] == spans['background']['span_id']]
+    assert len(nested) == 1
+    assert spans['update']['parent_id'] is None
+
+
+@pytest.mark.asyncio
+async def test_unsampled_updates_record_nothing(monkeypatch, exporter):
+    """Тест что вне выбранной трассы спаны не создаются"""
+    tracing.tracer.sample_rate = 0.5
+    monkeypatch.setattr(tracing.random, "random", lambda: 0.9)
+
+    async with tracing.tracer.trace("update") as root:
+        assert root is None
+        async with tracing.tracer.span("db.get_user") as span:
+            assert span is None
+    await tracing.tracer.flush()
+    assert exporter.spans == []
+
+
+@pytest.mark.asyncio
+async def test_sqlite_spans(mock_config, exporter):
+    """Тест спанов чтения и записи SQLite (с пулом и писателем)"""
+    await database.open_storage()
+    try:
+        async with tracing.tracer.trace("update"):
+            await database.create_user(1, None, "User", 1)
+            await database.get_user(1)
+    finally:
+        await database.close_storage()
+    await tracing.tracer.flush()
+
+    by_name = {span['name']: span for span in exporter.spans}
+    assert by_name['sqlite.write']['attributes'] == {'batched': True}
+    assert by_name['sqlite.write']['parent_id'] == by_name['db.create_user']['span_id']
+    assert by_name['sqlite.read']['attributes']['pooled'] is True
+    assert 'pool_wait_ms' in by_name['sqlite.read']['attributes']
+
+
+@pytest.mark.asyncio
+async def test_error_is_recorded(exporter):
+    """Тест что исключение внутри спана попадает в запись и пробрасывается дальше"""
+    with pytest.raises(RuntimeError):
+        async with tracing.tracer.trace("update"):
+            raise RuntimeError("boom")
+    await tracing.tracer.flush()
+    assert exporter.spans[0]['error'] == "RuntimeError: boom"
+
+
+@pytest.mark.asyncio
+async def test_middlewares(exporter):
+    """Тест спанов апдейта, хендлера и метода Bot API"""
+    middleware = TracingMiddleware()
+    user = MagicMock(id=42)
+    update = Update.model_validate({
+        'update_id': 7,
+        'message': {
+            'message_id': 1, 'date': 0, 'text': "/start",
+            'chat': {'id': 42, 'type': "private"}, 'from': {'id': 42, 'is_bot': False, 'first_name': "A"},
+        },
+    })
+
+    async def cmd_start(event, data):
+        return await BotApiTracingMiddleware()(_make_request, MagicMock(), SendMessage(chat_id=42, text="hi"))
+
+    async def _make_request(bot, method):
+        return "ok"
+
+    handler_object = MagicMock()
+    handler_object.callback = cmd_start
+
+    async def _dispatch(event, data):
+        return await middleware(cmd_start, event.message, {'handler': handler_object})
+
+    assert await middleware(_dispatch, update, {'event_from_user': user}) == "ok"
+    await tracing.tracer.flush()
+
+    root, handler, api = sorted(exporter.spans, key=lambda span: span['start_ns'])
+    assert root['attributes'] == {'update_id': 7, 'type': "message", 'user_id': 42}
+    assert handler['name'] == "handler test_middlewares.<locals>.cmd_start"
+    assert handler['attributes'] == {'command': "/start"}
+    assert api['name'] == "bot.sendMessage"
+    assert api['parent_id'] == handler['span_id'] and handler['parent_id'] == root['span_id']
+
+
+@pytest.mark.asyncio
+async def test_jsonl_and_otlp_collector(tmp_path):
+    """Тест экспорта в JSONL и через OTLP в локальный коллектор"""
+    tracer = tracing.Tracer()
+    tracer.configure(1.0, tracing.JsonlExporter(str(tmp_path / "direct.jsonl")))
+    async with tracer.trace("update", user_id=1, ok=True, ratio=0.5):
+        async with tracer.span("db.get_user"):
+            pass
+    await tracer.shutdown()
+    direct = [json.loads(line) for line in (tmp_path / "direct.jsonl").read_text().splitlines()]
+    assert [span['name'] for span in direct] == ["db.get_user", "update"]
+
+    runner = web.AppRunner(tracing.collector_app(tracing.JsonlExporter(str(tmp_path / "collected.jsonl"))))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        exporter = tracing.OTLPExporter(f"http://127.0.0.1:{port}/v1/traces")
+        await exporter.export(direct)
+        await exporter.close()
+        async with ClientSession() as session:
+            async with session.post(f"http://127.0.0.1:{port}/v1/traces", data="{}x") as response:
+                assert response.status == 400
+    finally:
+        await runner.cleanup()
+
+    collected = [json.loads(line) for line in (tmp_path / "collected.jsonl").read_text().splitlines()]
+    assert collected == direct
+
+
+def test_build_and_format_trees():
+    """Тест сборки дерева трассы и его текстового вида"""
+    spans = [
+        {'trace_id': "t", 'span_id': "a", 'parent_id': None, 'name': "update", 'start_ns': 0,
+         'end_ns': 5_000_000, 'duration_ms': 5.0, 'attributes': {'user_id': 1}, 'error': None},
+        {'trace_id': "t", 'span_id': "b", 'parent_id': "a", 'name': "db.get_user", 'start_ns': 1_000_000,
+         'end_ns': 3_000_000, 'duration_ms': 2.0, 'attributes': {}, 'error': None},
+    ]
+    [root] = tracing.build_trees(spans)
+    assert [child['name'] for child in root['children']] == ["db.get_user"]
+    lines = tracing.format_tree(root).splitlines()
+    assert "update user_id=1" in lines[0]
+    assert lines[1].split()[:2] == ["1.0", "2.0"]
+    assert "  db.get_user" in lines[1]
+
+
+@pytest.mark.asyncio
+async def test_full_batches_exported_before_shutdown_returns(exporter):
+    """Тест что отправки заполненных пачек отслеживаются и дожидаются при остановке"""
+    tracer = tracing.tracer
+    tracer.batch_size = 2
+    tracer.start()
+    for number in range(5):
+        async with tracer.trace(f"update{number}"):
+            pass
+    assert len(tracer._exports) == 2
+
+    await tracer.shutdown()
+    assert not tracer._exports
+    assert len(exporter.spans) == 5
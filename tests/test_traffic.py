@@ -0,0 +1,144 @@
+"""Тесты для utils/traffic.py (запись и воспроизведение апдейтов)"""
+import asyncio
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Update
+
+import bot as bot_module
+import database
+from utils import traffic
+from utils.groups import catalog
+
+NOW = 1700000000
+
+
+def _message_update(update_id: int, user_id: int, text: str) -> dict:
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id, 'date': NOW, 'text': text,
+            'chat': {'id': user_id, 'type': "private", 'first_name': "Иван", 'username': "ivan"},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': "Иван", 'last_name': "Петров", 'username': "ivan"},
+        },
+    }
+
+
+def _callback_update(update_id: int, user_id: int, data: str) -> dict:
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id), 'chat_instance': "1", 'data': data,
+            'from': {'id': user_id, 'is_bot': False, 'first_name': "Иван"},
+            'message': {
+                'message_id': 5, 'date': NOW, 'text': "🎉 Есть мэтч! @secret_user",
+                'chat': {'id': user_id, 'type': "private"},
+            },
+        },
+    }
+
+
+def test_anonymizer():
+    """Тест что id заменяются одинаково, а имена и свободный текст не записываются"""
+    anonymizer = traffic.Anonymizer("salt")
+    first = anonymizer.update(_message_update(1, 111, "/start ref123"))
+    second = anonymizer.update(_message_update(2, 111, "Привет, я Иван"))
+    menu = anonymizer.update(_message_update(3, 222, "🔍 Проверить мэтчи"))
+    callback = anonymizer.update(_callback_update(4, 111, "toggle_desired_3"))
+
+    user = first['message']['from']
+    assert user['id'] == first['message']['chat']['id'] == second['message']['from']['id'] != 111
+    assert user == {'id': user['id'], 'is_bot': False, 'first_name': "User"}
+    assert 'username' not in first['message']['chat']
+    assert menu['message']['from']['id'] not in (111, user['id'])
+    assert first['message']['text'] == "/start"
+    assert second['message']['text'] == "…"
+    assert menu['message']['text'] == "🔍 Проверить мэтчи"
+    assert callback['callback_query']['data'] == "toggle_desired_3"
+    assert callback['callback_query']['from']['id'] == user['id']
+    assert "secret_user" not in str(callback)
+    assert traffic.Anonymizer("other").map_id(111) != user['id']
+    Update.model_validate(callback)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("name", ["traffic.jsonl", "traffic.jsonl.gz"])
+async def test_recorder_round_trip(tmp_path, name):
+    """Тест записи апдейтов middleware и чтения записи"""
+    path = str(tmp_path / name)
+    recorder = traffic.TrafficRecorder(path, "salt")
+
+    async def _handler(event, data):
+        return "ok"
+
+    for update_id in (1, 2):
+        update = Update.model_validate(_message_update(update_id, 111, "/help"))
+        assert await recorder(_handler, update, {}) == "ok"
+    await recorder.close()
+
+    records = list(traffic.read_records(path))
+    assert [raw['update_id'] for _, raw in records] == [1, 2]
+    assert records[0][0] <= records[1][0]
+    assert records[0][1]['message']['from']['first_name'] == "User"
+
+
+@pytest.mark.asyncio
+async def test_replay_through_dispatcher(monkeypatch):
+    """Тест воспроизведения через настоящий Dispatcher с сессией-заглушкой"""
+    monkeypatch.setattr(database, "_repository", None)
+    await database.init_db("memory")
+    catalog.load(await database.get_programs(), await database.get_groups())
+
+    anonymizer = traffic.Anonymizer("salt")
+    records = [
+        (0.0, anonymizer.update(_message_update(1, 111, "/start"))),
+        (0.01, anonymizer.update(_message_update(2, 222, "/help"))),
+        (0.02, anonymizer.update(_message_update(3, 111, "/start"))),
+    ]
+    bot = Bot("123456:replay", session=traffic.StubSession())
+    dp = Dispatcher(storage=MemoryStorage())
+    bot_module.register_handlers(dp)
+
+    report = await traffic.replay(dp, bot, records, speed=2.0)
+
+    assert report['updates'] == 3
+    assert report['errors'] == 0
+    assert report['duration'] >= 0.01
+    assert report['api_calls']['sendMessage'] >= 3
+    assert report['latency'][100] >= report['latency'][50] > 0
+    text = traffic.format_replay_report(report)
+    assert "sendMessage" in text and "p99" in text
+
+
+@pytest.mark.asyncio
+async def test_stub_session_download_is_empty_and_counted():
+    """Тест что скачивание файла через сессию-заглушку отдаёт пустой файл и учитывается"""
+    session = traffic.StubSession()
+    chunks = [chunk async for chunk in session.stream_content("https://example.invalid/file")]
+    assert b"".join(chunks) == b""
+    assert session.calls["download"] == 1
+
+
+@pytest.mark.asyncio
+async def test_full_batch_flushed_by_background_task(tmp_path):
+    """Тест что полная пачка сбрасывается фоновой задачей, не дожидаясь интервала"""
+    path = str(tmp_path / "traffic.jsonl")
+    recorder = traffic.TrafficRecorder(path, "salt", batch_size=2, flush_interval=60)
+    recorder.start()
+    try:
+        for update_id in (1, 2):
+            recorder.record(_message_update(update_id, 111, "/help"))
+        await asyncio.sleep(0.05)
+        assert [raw['update_id'] for _, raw in traffic.read_records(path)] == [1, 2]
+    finally:
+        await recorder.close()
+
+
+def test_replay_into_sqlite_requires_database(tmp_path, capsys):
+    """Тест что replay не пишет в рабочую БД, если файл не указан явно"""
+    import manage
+
+    path = tmp_path / "traffic.jsonl"
+    path.write_text("")
+    assert manage.main(["replay", str(path), "--backend", "sqlite"]) == 1
+    assert "--database" in capsys.readouterr().out
@@ -0,0 +1,163 @@
+"""Резервные копии SQLite: онлайн-копирование по шагам, проверка, сжатие, ротация и восстановление"""
+import asyncio
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+SUFFIX = ".db.gz"
+
+
+def integrity_check(path: str) -> str:
+    """Результат PRAGMA integrity_check: "ok" или первые найденные ошибки"""
+    db = sqlite3.connect(path)
+    try:
+        rows = db.execute("PRAGMA integrity_check").fetchall()
+    except sqlite3.DatabaseError as e:
+        # Файл настолько повреждён, что проверка не запускается
+        return str(e)
+    finally:
+        db.close()
+    return "ok" if rows == [("ok",)] else "; ".join(row[0] for row in rows[:5])
+
+
+def copy_database(source: str, target: str, pages_per_step: int = 256, step_pause: float = 0.01):
+    """
+    Копия работающей БД через backup API по pages_per_step страниц с паузой step_pause между шагами.
+    На источнике держится транзакция чтения: в режиме WAL копия — согласованный снимок на её начало,
+    записи бота не ждут копирования и не заставляют начинать его заново.
+    """
+    src = sqlite3.connect(source, isolation_level=None)
+    dst = sqlite3.connect(target)
+    try:
+        src.execute("BEGIN")
+        src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        src.backup(dst, pages=pages_per_step, sleep=step_pause)
+        src.execute("COMMIT")
+    finally:
+        dst.close()
+        src.close()
+
+
+def _compress(source: str, target: str):
+    with open(source, "rb") as src, gzip.open(target, "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+
+
+def _decompress(source: str, target: str):
+    with gzip.open(source, "rb") as src, open(target, "wb") as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+
+
+def list_backups(backup_dir: str) -> List[Path]:
+    """Архивы копий, от старых к новым (имя содержит время создания)"""
+    directory = Path(backup_dir)
+    if not directory.is_dir():
+        return []
+    return sorted(directory.glob(f"*{SUFFIX}"))
+
+
+def create_backup(db_path: str, backup_dir: str, keep: int, pages_per_step: int = 256,
+                  step_pause: float = 0.01) -> Path:
+    """
+    Копия БД в backup_dir: снимок, integrity_check, сжатие gzip; остаются keep последних архивов.
+    Непрошедшая проверку копия удаляется, выбрасывается ValueError. Возвращает путь к архиву.
+    """
+    directory = Path(backup_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    archive = directory / f"{Path(db_path).stem}-{stamp}{SUFFIX}"
+    snapshot = directory / f".{archive.name}.tmp"
+    try:
+        copy_database(db_path, str(snapshot), pages_per_step, step_pause)
+        result = integrity_check(str(snapshot))
+        if result != "ok":
+            raise ValueError(f"Копия {db_path} не прошла проверку целостности: {result}")
+        partial = archive.with_name(archive.name + ".part")
+        _compress(str(snapshot), str(partial))
+        os.replace(partial, archive)
+    finally:
+        snapshot.unlink(missing_ok=True)
+
+    for old in list_backups(backup_dir)[:-keep] if keep > 0 else []:
+        old.unlink()
+    return archive
+
+
+def restore_backup(archive: str, db_path: str):
+    """
+    Восстановление БД из архива (бот должен быть остановлен).
+    Архив распаковывается рядом с БД и проверяется; только после этого заменяет файл БД.
+    """
+    target = Path(db_path)
+    restored = target.with_name(f".{target.name}.restore")
+    try:
+        _decompress(archive, str(restored))
+        result = integrity_check(str(restored))
+        if result != "ok":
+            raise ValueError(f"Архив {archive} не прошёл проверку целостности: {result}")
+        # Журнал WAL старой БД к восстановленной не относится
+        for suffix in ("-wal", "-shm"):
+            Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+        os.replace(restored, target)
+    finally:
+        restored.unlink(missing_ok=True)
+
+
+class BackupScheduler:
+    """
+    Резервное копирование раз в interval секунд. Копирование и сжатие идут в отдельном потоке,
+    копирование — маленькими шагами с паузами, поэтому на обработку апдейтов не влияет.
+    """
+
+    def __init__(self, db_path: str, backup_dir: str, interval: float, keep: int,
+                 pages_per_step: int = 256, step_pause: float = 0.01):
+        self.db_path = db_path
+        self.backup_dir = backup_dir
+        self.interval = interval
+        self.keep = keep
+        self.pages_per_step = pages_per_step
+        self.step_pause = step_pause
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.backup()
+            except Exception as e:
+                metrics.counter("backup_failures").inc()
+                logger.error("Ошибка резервного копирования: %s", e)
+
+    async def backup(self) -> Path:
+        """Одна резервная копия; возвращает путь к архиву"""
+        started = time.monotonic()
+        archive = await asyncio.to_thread(
+            create_backup, self.db_path, self.backup_dir, self.keep, self.pages_per_step, self.step_pause
+        )
+        duration = time.monotonic() - started
+        metrics.histogram("backup_duration_seconds").observe(duration)
+        metrics.gauge("backup_last_size_bytes").set(archive.stat().st_size)
+        logger.info("Резервная копия %s за %.1f с", archive, duration)
+        return archive
@@ -0,0 +1,109 @@
+"""HTTP-сессия бота для Bot API: пул соединений, таймауты, повторы и свой сервер Bot API"""
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from aiohttp import ClientTimeout
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+import config
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Методы, повтор которых после сетевой ошибки или 5xx ничего не дублирует.
+# getUpdates не повторяется здесь: у polling свой цикл с паузами.
+IDEMPOTENT_METHODS = {
+    "getMe", "getChat", "getChatMember", "getFile", "getMyCommands", "getWebhookInfo",
+    "setWebhook", "deleteWebhook", "setMyCommands", "deleteMyCommands",
+}
+
+
+class TunedAiohttpSession(AiohttpSession):
+    """
+    AiohttpSession с настраиваемым пулом соединений: лимиты, кэш DNS и keep-alive,
+    чтобы всплеск уведомлений шёл по уже открытым соединениям. Таймаут запроса
+    задаётся по методу (method_timeouts, остальным — timeout), установка соединения
+    ограничена connect_timeout.
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 0, dns_cache_ttl: Optional[int] = 300,
+                 keepalive_timeout: float = 60, connect_timeout: Optional[float] = 5,
+                 method_timeouts: Optional[Dict[str, float]] = None, **kwargs):
+        super().__init__(**kwargs)
+        self._connector_init.update(
+            limit=limit,
+            limit_per_host=limit_per_host,
+            use_dns_cache=dns_cache_ttl is not None,
+            ttl_dns_cache=dns_cache_ttl,
+            keepalive_timeout=keepalive_timeout,
+        )
+        self.connect_timeout = connect_timeout
+        self.method_timeouts = method_timeouts or {}
+
+    async def make_request(self, bot, method, timeout: Optional[int] = None):
+        if timeout is None:
+            timeout = self.method_timeouts.get(method.__api_method__, self.timeout)
+        # aiohttp принимает ClientTimeout там, где aiogram передаёт число секунд
+        return await super().make_request(
+            bot, method, ClientTimeout(total=timeout, sock_connect=self.connect_timeout)
+        )
+
+
+class RetryMiddleware(BaseRequestMiddleware):
+    """
+    Повтор запросов к Bot API.
+    При flood control (429) повторяется любой метод: Telegram его не выполнил, ждём retry_after
+    (если не дольше max_retry_after). Сетевые ошибки и 5xx повторяются только для IDEMPOTENT_METHODS,
+    с паузой backoff, 2·backoff, ... — иначе, например, сообщение могло бы уйти дважды.
+    """
+
+    def __init__(self, retries: int, backoff: float, max_retry_after: float):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_retry_after = max_retry_after
+
+    async def __call__(self, make_request, bot, method):
+        attempt = 0
+        while True:
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.retries or e.retry_after > self.max_retry_after:
+                    raise
+                delay = e.retry_after
+            except (TelegramNetworkError, TelegramServerError) as e:
+                if attempt >= self.retries or method.__api_method__ not in IDEMPOTENT_METHODS:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                logger.warning("%s: %s; повтор через %.1f с", method.__api_method__, e, delay)
+            attempt += 1
+            metrics.counter("bot_api_retries").inc()
+            await asyncio.sleep(delay)
+
+
+def api_server(url: str, is_local: bool = False) -> TelegramAPIServer:
+    """Адрес Bot API: пустой url — api.telegram.org, иначе свой сервер (telegram-bot-api)"""
+    if not url:
+        return PRODUCTION
+    return TelegramAPIServer.from_base(url.rstrip("/"), is_local=is_local)
+
+
+def create_bot_session() -> TunedAiohttpSession:
+    """Сессия бота по настройкам config.py"""
+    session = TunedAiohttpSession(
+        api=api_server(config.BOT_API_URL, config.BOT_API_LOCAL),
+        timeout=config.BOT_API_TIMEOUT,
+        limit=config.BOT_API_POOL_LIMIT,
+        limit_per_host=config.BOT_API_POOL_LIMIT_PER_HOST,
+        dns_cache_ttl=config.BOT_API_DNS_CACHE_TTL,
+        keepalive_timeout=config.BOT_API_KEEPALIVE,
+        connect_timeout=config.BOT_API_CONNECT_TIMEOUT,
+        method_timeouts=config.BOT_API_METHOD_TIMEOUTS,
+    )
+    session.middleware(RetryMiddleware(config.BOT_API_RETRIES, config.BOT_API_RETRY_BACKOFF,
+                                       config.BOT_API_MAX_RETRY_AFTER))
+    return session
@@ -0,0 +1,113 @@
+"""Массовый импорт и экспорт пользователей (CSV / JSONL)"""
+import csv
+import json
+import logging
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple, Union
+
+import database
+from utils.groups import catalog
+
+logger = logging.getLogger(__name__)
+
+CSV_FIELDS = ['telegram_id', 'username', 'first_name', 'current_group', 'desired_groups']
+
+# Разделитель желаемых групп в CSV
+CSV_GROUPS_SEPARATOR = ";"
+
+
+def detect_format(path: str) -> str:
+    """Формат файла по расширению: csv или jsonl"""
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def _read_raw(file: TextIO, fmt: str) -> Iterator[Tuple[int, Union[Dict, str]]]:
+    """Записи файла с номерами строк: для CSV — словари, для JSONL — строки (разбираются в read_users)"""
+    if fmt == "csv":
+        for line_no, row in enumerate(csv.DictReader(file), start=2):
+            groups = row.get('desired_groups') or ""
+            row['desired_groups'] = [g for g in groups.split(CSV_GROUPS_SEPARATOR) if g.strip()]
+            yield line_no, row
+    else:
+        for line_no, line in enumerate(file, start=1):
+            if line.strip():
+                yield line_no, line
+
+
+def validate_user(raw: Dict) -> Dict:
+    """
+    Проверка и нормализация записи пользователя.
+    Группы должны существовать в каталоге, желаемые — в той же программе и не совпадать с текущей.
+    """
+    telegram_id = int(raw['telegram_id'])
+    current_group = int(raw['current_group'])
+    if not catalog.exists(current_group):
+        raise ValueError(f"неизвестная группа {current_group}")
+
+    program = catalog.program_of(current_group)
+    raw_desired = raw.get('desired_groups') or []
+    if isinstance(raw_desired, str):
+        # Строка "23" иначе разобралась бы по символам в группы 2 и 3
+        raise ValueError("desired_groups должен быть списком")
+    desired_groups = sorted({int(g) for g in raw_desired})
+    for group in desired_groups:
+        if catalog.program_of(group) != program:
+            raise ValueError(f"желаемая группа {group} не из программы {program}")
+        if group == current_group:
+            raise ValueError(f"желаемая группа {group} совпадает с текущей")
+
+    return {
+        'telegram_id': telegram_id,
+        'username': raw.get('username') or None,
+        'first_name': raw.get('first_name') or "Пользователь",
+        'current_group': current_group,
+        'desired_groups': desired_groups,
+    }
+
+
+def read_users(file: TextIO, fmt: str, errors: Optional[List[str]] = None) -> Iterator[Dict]:
+    """Потоковое чтение и проверка пользователей; ошибочные строки пропускаются и попадают в errors"""
+    for line_no, raw in _read_raw(file, fmt):
+        try:
+            if isinstance(raw, str):
+                # json.JSONDecodeError — подкласс ValueError
+                raw = json.loads(raw)
+            yield validate_user(raw)
+        except (KeyError, TypeError, ValueError) as e:
+            message = f"строка {line_no}: {e}"
+            if errors is not None:
+                errors.append(message)
+            logger.warning(message)
+
+
+async def import_users(file: TextIO, fmt: str, replace: bool = False, chunk_size: int = 5000,
+                       errors: Optional[List[str]] = None) -> int:
+    """Импорт пользователей пачками по chunk_size (каждая пачка — одна транзакция)"""
+    imported = 0
+    chunk: Dict[int, Dict] = {}
+    for user in read_users(file, fmt, errors):
+        # Повтор id внутри пачки: побеждает последняя запись
+        chunk[user['telegram_id']] = user
+        if len(chunk) >= chunk_size:
+            imported += await database.import_users(list(chunk.values()), replace)
+            chunk = {}
+    if chunk:
+        imported += await database.import_users(list(chunk.values()), replace)
+    return imported
+
+
+async def export_users(file: TextIO, fmt: str, chunk_size: int = 5000) -> int:
+    """Потоковый экспорт всех пользователей с желаемыми группами"""
+    exported = 0
+    writer = None
+    if fmt == "csv":
+        writer = csv.DictWriter(file, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+    async for user in database.iter_users_with_desired(chunk_size):
+        if writer is not None:
+            row = dict(user)
+            row['desired_groups'] = CSV_GROUPS_SEPARATOR.join(str(g) for g in user['desired_groups'])
+            writer.writerow(row)
+        else:
+            file.write(json.dumps(user, ensure_ascii=False) + "\n")
+        exported += 1
+    return exported
@@ -0,0 +1,46 @@
+"""Кэш с ограниченным временем жизни записей"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class TTLCache:
+    """Кэш «ключ → значение», записи устаревают через ttl секунд"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._data: Dict[Hashable, Tuple[float, Any]] = {}
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    async def get_or_compute(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Значение из кэша или вычисленное; одновременные промахи вычисляют его один раз"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            value = self.get(key, missing)
+            if value is missing:
+                value = await factory()
+                self.set(key, value)
+        return value
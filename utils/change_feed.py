@@ -0,0 +1,133 @@
+"""Обновление индекса мэтчей по журналу изменений других воркеров и после записей в обход бота"""
+import asyncio
+import logging
+from typing import Optional, Tuple
+
+import database
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeFeed:
+    """
+    Фоновое чтение журнала изменений (таблица change_log).
+    Пользователи, которых изменили другие воркеры, перечитываются из БД в индекс мэтчей.
+    Если журнал успели очистить дальше прочитанного, индекс загружается заново целиком.
+    """
+
+    def __init__(self, interval: float, batch_size: int = 1000, prune_keep: Optional[int] = None):
+        self.interval = interval
+        self.batch_size = batch_size
+        # Очисткой журнала занимается один воркер
+        self.prune_keep = prune_keep
+        self.last_seq = 0
+        self._first_seq = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def mark(self):
+        """Запоминание текущей позиции журнала (перед загрузкой индекса)"""
+        _, self.last_seq = await database.get_change_log_bounds()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def poll(self) -> int:
+        """Применение новых записей журнала; возвращает число обновлённых пользователей"""
+        first, _ = await database.get_change_log_bounds()
+        self._first_seq = first
+        if first > self.last_seq + 1:
+            logger.warning("Журнал изменений очищен дальше прочитанного — полная загрузка индекса")
+            await self.mark()
+            await database.load_match_index()
+            metrics.counter("change_feed_full_reload").inc()
+            return 0
+
+        refreshed = 0
+        while True:
+            entries = await database.get_change_log(self.last_seq, self.batch_size)
+            if not entries:
+                break
+            telegram_ids = {telegram_id for _, telegram_id in entries}
+            await database.refresh_match_index(list(telegram_ids))
+            self.last_seq = entries[-1][0]
+            refreshed += len(telegram_ids)
+            if len(entries) < self.batch_size:
+                break
+        if refreshed:
+            metrics.counter("change_feed_refreshed_users").inc(refreshed)
+        return refreshed
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.poll()
+                # Очищаем пачками, когда журнал вырос вдвое против нормы
+                if self.prune_keep and self.last_seq - self._first_seq >= 2 * self.prune_keep:
+                    await database.prune_change_log(self.prune_keep)
+            except Exception as e:
+                logger.error("Ошибка чтения журнала изменений: %s", e)
+
+
+class ExternalWriteWatcher:
+    """
+    Один процесс без журнала изменений: записи в обход бота (manage.py import) видны только
+    по счётчику изменений БД. Если он сдвинулся сильнее, чем записи этого процесса,
+    индекс мэтчей загружается заново целиком.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        # (счётчик изменений, вклад этого процесса) на момент загрузки индекса
+        self.baseline: Tuple[int, int] = (0, 0)
+        self._task: Optional[asyncio.Task] = None
+
+    async def mark(self):
+        """Запоминание счётчика изменений (перед загрузкой индекса)"""
+        self.baseline = (await database.get_change_counter(), await database.get_own_changes())
+
+    async def external_changes(self) -> int:
+        """Сколько изменений с последней загрузки индекса внесли другие процессы"""
+        counter, own_changes = self.baseline
+        return (await database.get_change_counter() - counter) - (await database.get_own_changes() - own_changes)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def poll(self) -> bool:
+        """Перезагрузка индекса после чужих записей; возвращает True, если она была"""
+        changes = await self.external_changes()
+        if not changes:
+            return False
+        logger.info("БД изменена в обход бота (%s изменений) — полная загрузка индекса", changes)
+        await self.mark()
+        await database.load_match_index()
+        metrics.counter("external_write_reloads").inc()
+        return True
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.error("Ошибка проверки внешних изменений БД: %s", e)
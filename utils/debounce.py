@@ -0,0 +1,110 @@
+"""Отложенные (debounce) правки клавиатур"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, Tuple
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup, Message
+
+import config
+from utils.memory import register_store
+
+logger = logging.getLogger(__name__)
+
+
+class Debouncer:
+    """
+    Откладывает вызов до паузы заданной длины.
+    Для каждого ключа выполняется только последний запланированный вызов;
+    вызовы одного ключа идут строго по очереди.
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._pending: Dict[Hashable, Tuple[asyncio.Task, Callable[[], Awaitable]]] = {}
+        # Ключ -> уже начавшийся вызов
+        self._running: Dict[Hashable, asyncio.Task] = {}
+
+    def schedule(self, key: Hashable, func: Callable[[], Awaitable]):
+        """Запланировать вызов, отменив предыдущий ещё не начавшийся вызов с тем же ключом"""
+        self._cancel_pending(key)
+        self._pending[key] = (asyncio.create_task(self._run(key, func)), func)
+
+    def _cancel_pending(self, key: Hashable):
+        entry = self._pending.pop(key, None)
+        if entry is not None and not entry[0].done():
+            entry[0].cancel()
+
+    async def cancel(self, key: Hashable):
+        """
+        Отмена ожидающего вызова (например, когда сообщение уже заменено).
+        Начавшийся вызов не прерывается (запрос мог уже уйти), а дожидается:
+        после cancel() ни одна правка по этому ключу не придёт позже.
+        """
+        self._cancel_pending(key)
+        running = self._running.get(key)
+        if running is not None and running is not asyncio.current_task():
+            await asyncio.wait({running})
+
+    def pending_count(self) -> int:
+        """Количество ожидающих вызовов"""
+        return len(self._pending)
+
+    async def flush(self):
+        """Немедленное выполнение всех ожидающих вызовов после уже начавшихся (при остановке)"""
+        pending, self._pending = self._pending, {}
+        for task, _ in pending.values():
+            task.cancel()
+        if self._running:
+            await asyncio.wait(set(self._running.values()))
+        await asyncio.gather(*(self._call(key, func) for key, (_, func) in pending.items()))
+
+    async def _run(self, key: Hashable, func: Callable[[], Awaitable]):
+        await asyncio.sleep(self.delay)
+        previous = self._running.get(key)
+        if previous is not None:
+            # Пока ждём предыдущий вызов, этот ещё можно отменить; asyncio.wait не отменяет previous
+            await asyncio.wait({previous})
+        # Вызов начался — новые schedule() его уже не отменяют
+        task = asyncio.current_task()
+        if self._pending.get(key, (None,))[0] is task:
+            del self._pending[key]
+        self._running[key] = task
+        try:
+            await self._call(key, func)
+        finally:
+            if self._running.get(key) is task:
+                del self._running[key]
+
+    async def _call(self, key: Hashable, func: Callable[[], Awaitable]):
+        try:
+            await func()
+        except Exception as e:
+            logger.error("Ошибка отложенного вызова %s: %s", key, e)
+
+
+# Общий debouncer для перерисовки клавиатур выбора групп
+keyboard_debouncer = Debouncer(config.KEYBOARD_EDIT_DEBOUNCE)
+register_store("keyboard_edits_pending", keyboard_debouncer.pending_count)
+
+
+def _message_key(message: Message) -> tuple:
+    return (message.chat.id, message.message_id)
+
+
+def schedule_markup_edit(message: Message, build_markup: Callable[[], InlineKeyboardMarkup]):
+    """Отложенная перерисовка клавиатуры сообщения: отправляется только последнее состояние"""
+    async def _edit():
+        try:
+            await message.edit_reply_markup(reply_markup=build_markup())
+        except TelegramBadRequest as e:
+            # Пользователь вернул выбор к уже показанному состоянию
+            if "message is not modified" not in str(e).lower():
+                raise
+
+    keyboard_debouncer.schedule(_message_key(message), _edit)
+
+
+async def cancel_markup_edit(message: Message):
+    """Отмена отложенной перерисовки (сообщение будет отредактировано целиком); начатая дожидается"""
+    await keyboard_debouncer.cancel(_message_key(message))
@@ -0,0 +1,94 @@
+"""Каталог программ и групп"""
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import config
+
+
+class Group(NamedTuple):
+    """Группа программы. id глобально уникален, number — номер внутри программы"""
+    id: int
+    program: str
+    number: int
+    schedule: str
+
+
+class GroupCatalog:
+    """
+    Программы и группы в памяти.
+    Группы каждой программы хранятся отсортированным списком, поэтому страница
+    клавиатуры получается срезом за O(размер страницы).
+    """
+
+    def __init__(self):
+        self._titles: Dict[str, str] = {}
+        self._groups: Dict[int, Group] = {}
+        self._by_program: Dict[str, List[Group]] = {}
+
+    def load(self, programs: Iterable[Tuple[str, str]], groups: Iterable[Group]):
+        """Загрузка каталога (программы — пары (код, название))"""
+        self._titles = dict(programs)
+        self._groups = {}
+        self._by_program = {code: [] for code in self._titles}
+        for group in groups:
+            self._groups[group.id] = group
+            self._by_program.setdefault(group.program, []).append(group)
+        for program_groups in self._by_program.values():
+            program_groups.sort(key=lambda g: g.number)
+
+    def load_from_config(self):
+        """Загрузка каталога из config.PROGRAMS"""
+        self.load(
+            [(code, program['title']) for code, program in config.PROGRAMS.items()],
+            config_groups()
+        )
+
+    def programs(self) -> List[str]:
+        """Коды всех программ"""
+        return list(self._titles)
+
+    def has_program(self, program: str) -> bool:
+        return program in self._titles
+
+    def program_title(self, program: str) -> str:
+        return self._titles[program]
+
+    def get(self, group_id: int) -> Group:
+        return self._groups[group_id]
+
+    def exists(self, group_id: int) -> bool:
+        return group_id in self._groups
+
+    def program_of(self, group_id: int) -> Optional[str]:
+        """Программа группы (None для неизвестной группы)"""
+        group = self._groups.get(group_id)
+        return group.program if group else None
+
+    def label(self, group_id: int) -> str:
+        """Название группы вида «ИАД-3»"""
+        group = self._groups[group_id]
+        return f"{self._titles[group.program]}-{group.number}"
+
+    def program_groups(self, program: str) -> List[Group]:
+        """Все группы программы по порядку номеров"""
+        return self._by_program.get(program, [])
+
+    def page_count(self, program: str, page_size: int) -> int:
+        return max(1, -(-len(self.program_groups(program)) // page_size))
+
+    def page(self, program: str, page: int, page_size: int) -> List[Group]:
+        """Группы одной страницы программы"""
+        start = page * page_size
+        return self.program_groups(program)[start:start + page_size]
+
+
+def config_groups() -> List[Group]:
+    """Группы, описанные в config.PROGRAMS (id = first_group_id + номер - 1)"""
+    groups = []
+    for code, program in config.PROGRAMS.items():
+        for number, schedule in program['schedule'].items():
+            groups.append(Group(program['first_group_id'] + number - 1, code, number, schedule))
+    return groups
+
+
+catalog = GroupCatalog()
+catalog.load_from_config()
@@ -0,0 +1,153 @@
+"""
+Логирование без блокировки цикла событий.
+Записи кладутся в очередь (QueueHandler), а форматирование и запись в файл/stderr
+выполняет фоновый поток (QueueListener). Записи дополняются контекстом апдейта
+(update_id, user_id, handler), повторяющиеся ошибки ограничиваются по частоте.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import config
+from utils import metrics
+
+# Контекст текущего апдейта (выставляет LogContextMiddleware). Копируется в задачи, созданные хендлером.
+log_context: ContextVar[Optional[Dict]] = ContextVar("log_context", default=None)
+
+# Стандартные атрибуты LogRecord — всё остальное в записи считается полями из extra
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON: время, уровень, логгер, сообщение, контекст апдейта и поля extra"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Ограничение повторяющихся записей: с одного места в коде (файл и строка вызова)
+    проходит не больше burst записей уровня level и выше за period секунд.
+    Число пропущенных записей добавляется к следующей прошедшей (поле suppressed).
+    """
+
+    def __init__(self, burst: int, period: float, level: int = logging.WARNING):
+        super().__init__()
+        self.burst = burst
+        self.period = period
+        self.level = level
+        # место вызова -> (начало окна, записей в окне, пропущено)
+        self._windows: Dict[Tuple[str, int], List] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.level:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.period:
+            suppressed = window[2] if window is not None else 0
+            self._windows[key] = [now, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+        if window[1] < self.burst:
+            window[1] += 1
+            return True
+        window[2] += 1
+        metrics.counter("log_records_suppressed").inc()
+        return False
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler, который не блокирует: контекст апдейта добавляется к записи в потоке,
+    где она создана, а при переполненной очереди запись отбрасывается (метрика log_records_dropped).
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        for key, value in (log_context.get() or {}).items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        # Сообщение и трейсбек превращаются в строки здесь: аргументы могут измениться,
+        # пока запись ждёт в очереди
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.stack_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.counter("log_records_dropped").inc()
+
+
+def setup_logging(level: str = "INFO", fmt: str = "json", path: str = "", max_bytes: int = 10 * 1024 * 1024,
+                  backup_count: int = 5, queue_size: int = 10000, rate_limit_burst: int = 10,
+                  rate_limit_period: float = 60.0) -> logging.handlers.QueueListener:
+    """
+    Настройка корневого логгера: очередь + фоновый поток записи.
+    Без path записи идут в stderr, иначе — в файл с ротацией по размеру.
+    Возвращает запущенный QueueListener; его stop() дописывает очередь.
+    """
+    formatter = JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT)
+    if path:
+        output: logging.Handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+    else:
+        output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(formatter)
+
+    handler = ContextQueueHandler(queue.Queue(maxsize=queue_size))
+    handler.addFilter(RateLimitFilter(rate_limit_burst, rate_limit_period))
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+    # aiogram пишет INFO на каждый апдейт; длительность апдейта с контекстом пишет LogContextMiddleware
+    logging.getLogger("aiogram.event").setLevel(max(logging.WARNING, root.level))
+
+    listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def configure_from_config(suffix: Optional[str] = None) -> logging.handlers.QueueListener:
+    """Логирование по настройкам config.py; suffix добавляется к LOG_FILE (у каждого процесса свой файл)"""
+    path = config.LOG_FILE
+    if path and suffix:
+        path = f"{path}.{suffix}"
+    return setup_logging(
+        level=config.LOG_LEVEL, fmt=config.LOG_FORMAT, path=path, max_bytes=config.LOG_MAX_BYTES,
+        backup_count=config.LOG_BACKUP_COUNT, queue_size=config.LOG_QUEUE_SIZE,
+        rate_limit_burst=config.LOG_RATE_LIMIT_BURST, rate_limit_period=config.LOG_RATE_LIMIT_PERIOD,
+    )
@@ -0,0 +1,125 @@
+"""Контроль задержек цикла событий"""
+import asyncio
+import json
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional
+
+from middlewares.update_tracker import UpdateTracker
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LoopWatchdog:
+    """
+    Сторож цикла событий.
+    Задача-пульс раз в interval секунд засыпает и измеряет, насколько позже положенного
+    проснулась (метрики event_loop_lag / event_loop_lag_max). Отдельный поток следит за пульсом:
+    если цикл не отвечает дольше threshold, пока он ещё занят, снимается стек потока цикла
+    и записывается, какая задача и какой хендлер выполнялись.
+    """
+
+    def __init__(self, interval: float, threshold: float, tracker: Optional[UpdateTracker] = None,
+                 stack_dump_path: str = "", slow_callback_debug: bool = False):
+        self.interval = interval
+        self.threshold = threshold
+        self.tracker = tracker
+        self.stack_dump_path = stack_dump_path
+        self.slow_callback_debug = slow_callback_debug
+        self.stalls = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._beat = time.monotonic()
+        self._reported = False
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Запуск пульса и потока-сторожа (вызывается из работающего цикла)"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        if self.slow_callback_debug:
+            # Режим отладки asyncio: в лог попадает каждый колбэк дольше threshold (заметно замедляет цикл)
+            self._loop.slow_callback_duration = self.threshold
+            self._loop.set_debug(True)
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        lag_histogram = metrics.histogram("event_loop_lag")
+        lag_max = metrics.gauge("event_loop_lag_max")
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            lag_histogram.observe(lag)
+            if lag > lag_max.value:
+                lag_max.set(lag)
+            self._beat = time.monotonic()
+            self._reported = False
+
+    def _watch(self):
+        # Поток проверяет пульс чаще, чем цикл его обновляет, чтобы застать задержку в процессе
+        while not self._stop.wait(self.threshold / 2):
+            stalled = time.monotonic() - self._beat - self.interval
+            if stalled > self.threshold and not self._reported:
+                self._reported = True
+                self._report(stalled)
+
+    def _report(self, stalled: float):
+        self.stalls += 1
+        metrics.counter("event_loop_stalls").inc()
+        task = asyncio.current_task(self._loop)
+        handler = self.tracker.get(task) if self.tracker is not None else None
+        running = self.tracker.running() if self.tracker is not None else []
+        stack = self._loop_stack()
+        logger.warning(
+            "Цикл событий занят уже %.0f мс: задача %s, хендлер %s, выполняется хендлеров: %s\n%s",
+            stalled * 1000, task.get_name() if task else "—", handler or "—", len(running),
+            "".join(traceback.format_list(stack[-5:])),
+        )
+        if self.stack_dump_path:
+            self._dump(stalled, task, handler, running, stack)
+
+    def _loop_stack(self) -> List[traceback.FrameSummary]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        return traceback.extract_stack(frame) if frame is not None else []
+
+    def _dump(self, stalled: float, task: Optional[asyncio.Task], handler: Optional[Dict],
+              running: List[Dict], stack: List[traceback.FrameSummary]):
+        """Запись образца стека для разбора (JSONL, одна строка на задержку)"""
+        record = {
+            'time': time.time(),
+            'stalled_ms': round(stalled * 1000),
+            'task': task.get_name() if task else None,
+            'handler': handler,
+            'running': running,
+            'stack': [f"{frame.filename}:{frame.lineno}:{frame.name}" for frame in stack],
+        }
+        try:
+            with open(self.stack_dump_path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        except OSError as e:
+            logger.error("Не удалось записать образец стека: %s", e)
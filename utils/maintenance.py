@@ -0,0 +1,124 @@
+"""Плановое обслуживание БД: удаление неактивных пользователей, статистика планировщика, vacuum"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+import database
+import keyboards.keyboards as kb
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def format_expiry_warning(grace_days: int) -> str:
+    """Текст предупреждения об удалении за неактивность"""
+    return (
+        "⏳ Ты давно не обновлял свои данные.\n\n"
+        f"Если обмен больше не нужен, через {grace_days} дн. я удалю твою анкету, "
+        "чтобы тебя не находили для обмена зря.\n"
+        "Если ещё ищешь — нажми кнопку ниже."
+    )
+
+
+class MaintenanceScheduler:
+    """
+    Фоновое обслуживание раз в interval секунд.
+    Пользователи без изменений дольше user_ttl получают предупреждение с кнопкой «Я ещё ищу»
+    и удаляются, если не ответили за grace. Затем обновляется статистика планировщика
+    запросов и файлу возвращаются свободные страницы. Всё делается пачками по batch_size
+    с паузами: записи обслуживания идут через общего писателя между записями пользователей.
+    """
+
+    def __init__(self, bot, interval: float, user_ttl: Optional[timedelta], grace: timedelta,
+                 batch_size: int = 100, batch_pause: float = 0.5, vacuum_pages: int = 256):
+        self.bot = bot
+        self.interval = interval
+        self.user_ttl = user_ttl
+        self.grace = grace
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.vacuum_pages = vacuum_pages
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                result = await self.run_once()
+                if any(result.values()):
+                    logger.info("Обслуживание БД: %s", result)
+            except Exception as e:
+                logger.error("Ошибка обслуживания БД: %s", e)
+
+    async def run_once(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Один проход обслуживания; возвращает число предупреждённых, удалённых и освобождённых страниц"""
+        now = now or datetime.now()
+        result = {'warned': 0, 'expired': 0, 'vacuumed_pages': 0}
+        if self.user_ttl is not None:
+            # Сначала удаление: предупреждённые в этом же проходе не могут попасть под него
+            result['expired'] = await self.expire_users(now)
+            result['warned'] = await self.warn_users(now)
+        await database.optimize()
+        result['vacuumed_pages'] = await self.reclaim_space()
+        return result
+
+    async def warn_users(self, now: datetime) -> int:
+        """Предупреждение неактивных пользователей об удалении"""
+        warned = 0
+        text = format_expiry_warning(self.grace.days)
+        while True:
+            telegram_ids = await database.get_users_to_warn(now - self.user_ttl, self.batch_size)
+            if not telegram_ids:
+                break
+            for telegram_id in telegram_ids:
+                try:
+                    await self.bot.send_message(telegram_id, text, reply_markup=kb.get_keep_active_keyboard())
+                except Exception as e:
+                    # Заблокировавший бота пользователь тоже считается предупреждённым и удалится через grace
+                    logger.debug("Не удалось предупредить %s: %s", telegram_id, e)
+            await database.mark_expiry_warned(telegram_ids)
+            warned += len(telegram_ids)
+            metrics.counter("users_expiry_warned").inc(len(telegram_ids))
+            if len(telegram_ids) < self.batch_size:
+                break
+            await asyncio.sleep(self.batch_pause)
+        return warned
+
+    async def expire_users(self, now: datetime) -> int:
+        """Удаление пользователей, не ответивших на предупреждение"""
+        expired = 0
+        while True:
+            telegram_ids = await database.get_users_to_expire(now - self.user_ttl, now - self.grace, self.batch_size)
+            if not telegram_ids:
+                break
+            await database.delete_users(telegram_ids)
+            expired += len(telegram_ids)
+            metrics.counter("users_expired").inc(len(telegram_ids))
+            if len(telegram_ids) < self.batch_size:
+                break
+            await asyncio.sleep(self.batch_pause)
+        return expired
+
+    async def reclaim_space(self) -> int:
+        """Инкрементальный vacuum по vacuum_pages страниц за пачку, пока есть свободные"""
+        reclaimed = 0
+        while True:
+            pages = await database.incremental_vacuum(self.vacuum_pages)
+            reclaimed += pages
+            if pages < self.vacuum_pages:
+                break
+            await asyncio.sleep(self.batch_pause)
+        return reclaimed
@@ -0,0 +1,148 @@
+"""Индекс пользователей для поиска мэтчей в памяти"""
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from utils.groups import catalog
+from utils.memory import register_store
+
+Bucket = Tuple[int, int]
+
+
+class MatchIndex:
+    """
+    Пользователи, разложенные по корзинам (текущая группа, желаемая группа).
+    Корзины разбиты на партиции по программам: поиск кандидатов и агрегаты
+    затрагивают только партицию программы пользователя.
+    """
+
+    def __init__(self, program_of: Callable[[int], Optional[str]]):
+        self._program_of = program_of
+        self._partitions: Dict[Optional[str], Dict[Bucket, Set[int]]] = {}
+        self._users: Dict[int, Tuple[int, FrozenSet[int]]] = {}
+        self.ready = False
+
+    def clear(self):
+        self._partitions = {}
+        self._users = {}
+        self.ready = False
+
+    def load(self, rows: Iterable[Tuple[int, int, Optional[int]]]):
+        """
+        Полная загрузка из строк (telegram_id, current_group, desired_group).
+        desired_group = None для пользователя без желаемых групп.
+        """
+        self.clear()
+        desired: Dict[int, Set[int]] = {}
+        current: Dict[int, int] = {}
+        for telegram_id, current_group, desired_group in rows:
+            current[telegram_id] = current_group
+            groups = desired.setdefault(telegram_id, set())
+            if desired_group is not None:
+                groups.add(desired_group)
+        for telegram_id, current_group in current.items():
+            self.set_user(telegram_id, current_group, desired[telegram_id])
+        self.ready = True
+
+    def restore(self, users: Dict[int, Tuple[int, FrozenSet[int]]], buckets: Iterable[Tuple[Bucket, Iterable[int]]]):
+        """
+        Полная загрузка из готовых данных (например, из снимка на диске):
+        users — {telegram_id: (текущая группа, желаемые группы)}, buckets — пары (корзина, id).
+        """
+        self.clear()
+        self._users = users
+        for (current_group, desired_group), bucket_users in buckets:
+            bucket = set(bucket_users)
+            if bucket:
+                self._partition(current_group)[(current_group, desired_group)] = bucket
+        self.ready = True
+
+    def users(self) -> Iterable[Tuple[int, Tuple[int, FrozenSet[int]]]]:
+        """Все пользователи: пары (telegram_id, (текущая группа, желаемые группы))"""
+        return self._users.items()
+
+    def _partition(self, current_group: int) -> Dict[Bucket, Set[int]]:
+        return self._partitions.setdefault(self._program_of(current_group), {})
+
+    def set_user(self, telegram_id: int, current_group: int, desired_groups: Iterable[int]):
+        """Добавление или полная замена данных пользователя"""
+        self.remove_user(telegram_id)
+        desired = frozenset(desired_groups)
+        self._users[telegram_id] = (current_group, desired)
+        partition = self._partition(current_group)
+        for desired_group in desired:
+            partition.setdefault((current_group, desired_group), set()).add(telegram_id)
+
+    def set_current_group(self, telegram_id: int, current_group: int):
+        _, desired = self._users.get(telegram_id, (None, frozenset()))
+        self.set_user(telegram_id, current_group, desired)
+
+    def set_desired_groups(self, telegram_id: int, desired_groups: Iterable[int]):
+        entry = self._users.get(telegram_id)
+        if entry is not None:
+            self.set_user(telegram_id, entry[0], desired_groups)
+
+    def remove_user(self, telegram_id: int):
+        entry = self._users.pop(telegram_id, None)
+        if entry is None:
+            return
+        current_group, desired = entry
+        partition = self._partition(current_group)
+        for desired_group in desired:
+            bucket = partition.get((current_group, desired_group))
+            if bucket is not None:
+                bucket.discard(telegram_id)
+                if not bucket:
+                    del partition[(current_group, desired_group)]
+
+    def get_user(self, telegram_id: int) -> Optional[Tuple[int, FrozenSet[int]]]:
+        """(текущая группа, желаемые группы) пользователя"""
+        return self._users.get(telegram_id)
+
+    def candidates(self, telegram_id: int) -> List[Tuple[int, int]]:
+        """
+        Кандидаты на обмен: пары (telegram_id кандидата, его текущая группа)
+        для всех, кто сидит в желаемой группе пользователя и хочет в его группу.
+        """
+        entry = self._users.get(telegram_id)
+        if entry is None:
+            return []
+        current_group, desired = entry
+        partition = self._partition(current_group)
+        result = []
+        for desired_group in sorted(desired):
+            for candidate in sorted(partition.get((desired_group, current_group), ())):
+                if candidate != telegram_id:
+                    result.append((candidate, desired_group))
+        return result
+
+    def _candidate_buckets(self, current_group: int, desired_groups: Iterable[int]):
+        partition = self._partition(current_group)
+        for desired_group in set(desired_groups):
+            bucket = partition.get((desired_group, current_group))
+            if bucket:
+                yield bucket
+
+    def count_candidates(self, current_group: int, desired_groups: Iterable[int],
+                         exclude: Optional[int] = None) -> int:
+        """Число кандидатов для (текущая группа, желаемые группы) по размерам корзин, без списка"""
+        return sum(len(bucket) - (exclude in bucket) for bucket in self._candidate_buckets(current_group, desired_groups))
+
+    def has_candidates(self, current_group: int, desired_groups: Iterable[int],
+                       exclude: Optional[int] = None) -> bool:
+        return any(
+            len(bucket) > 1 or exclude not in bucket for bucket in self._candidate_buckets(current_group, desired_groups)
+        )
+
+    def buckets(self, program: Optional[str]) -> Dict[Bucket, Set[int]]:
+        """Все непустые корзины программы"""
+        return self._partitions.get(program, {})
+
+    def programs(self) -> List[Optional[str]]:
+        return list(self._partitions)
+
+    def user_count(self) -> int:
+        return len(self._users)
+
+
+match_index = MatchIndex(catalog.program_of)
+# Индекс большой: в отчёте о памяти только число пользователей, без обхода
+register_store("match_index_users", match_index.user_count)
@@ -0,0 +1,92 @@
+"""Фоновая перепроверка мэтчей после изменения профиля"""
+import asyncio
+import logging
+from typing import Optional, Set
+
+import config
+from utils.debounce import Debouncer
+from utils.matcher import check_and_notify_new_matches
+from utils.memory import register_store
+
+logger = logging.getLogger(__name__)
+
+
+class MatchRecheckQueue:
+    """
+    Очередь перепроверок мэтчей с объединением по пользователю.
+    Повторные запросы для одного пользователя в пределах окна схлопываются в одну
+    перепроверку, которая выполняется фоновым воркером вне обработки апдейта.
+    """
+
+    def __init__(self, window: float):
+        self._debouncer = Debouncer(window)
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._queued: Set[int] = set()
+        self._worker: Optional[asyncio.Task] = None
+        self._bot = None
+
+    def start(self, bot):
+        """Запуск фонового воркера"""
+        self._bot = bot
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановка воркера (ожидающие перепроверки отбрасываются)"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def drain(self, timeout: float) -> bool:
+        """
+        Выполнение всех ожидающих перепроверок (не дожидаясь окна) и остановка воркера.
+        Возвращает False, если за timeout секунд очередь не опустела.
+        """
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning("Не выполнено перепроверок мэтчей при остановке: %s", self.pending_count())
+            return False
+        finally:
+            await self.stop()
+
+    async def _drain(self):
+        await self._debouncer.flush()
+        await self._queue.join()
+
+    def enqueue(self, telegram_id: int):
+        """Запланировать перепроверку мэтчей пользователя"""
+        self._debouncer.schedule(telegram_id, lambda: self._push(telegram_id))
+
+    def pending_count(self) -> int:
+        """Количество перепроверок, ожидающих окна или воркера"""
+        return self._debouncer.pending_count() + len(self._queued)
+
+    async def _push(self, telegram_id: int):
+        if telegram_id in self._queued:
+            return
+        self._queued.add(telegram_id)
+        await self._queue.put(telegram_id)
+
+    async def _run(self):
+        while True:
+            telegram_id = await self._queue.get()
+            self._queued.discard(telegram_id)
+            try:
+                await self._recheck(telegram_id)
+            except Exception as e:
+                logger.error("Ошибка перепроверки мэтчей для %s: %s", telegram_id, e)
+            finally:
+                self._queue.task_done()
+
+    async def _recheck(self, telegram_id: int):
+        # Итог приходит пользователю дайджестом мэтчей из check_and_notify_new_matches
+        await check_and_notify_new_matches(telegram_id, self._bot)
+
+
+recheck_queue = MatchRecheckQueue(config.MATCH_RECHECK_WINDOW)
+register_store("match_rechecks_pending", recheck_queue.pending_count)
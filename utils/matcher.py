@@ -1,7 +1,8 @@
 """Логика поиска мэтчей"""
-from typing import List, Dict
+from typing import Dict, Iterable, List, Optional
 import database
-from keyboards.keyboards import format_group_text
+from utils.match_index import match_index
+from utils.notifications import match_notifier, send_match_notification
 
 
 async def find_matches(telegram_id: int) -> List[Dict]:
@@ -12,6 +13,9 @@ async def find_matches(telegram_id: int) -> List[Dict]:
     1. User A в группе X, хочет в группу Y
     2. User B в группе Y, хочет в группу X
     """
+    if match_index.ready:
+        return await _find_matches_indexed(telegram_id)
+    
     user = await database.get_user(telegram_id)
     if not user:
         return []
@@ -49,51 +53,95 @@ async def find_matches(telegram_id: int) -> List[Dict]:
     return matches
 
 
-async def send_match_notification(bot, user_id: int, match_user: Dict):
-    """Отправка уведомления о мэтче пользователю"""
-    try:
-        username_display = f"@{match_user['username']}" if match_user['username'] else match_user['first_name']
-        
-        await bot.send_message(
-            user_id,
-            f"🎉 Есть мэтч!\n\n"
-            f"Нашёлся человек для обмена:\n\n"
-            f"👤 {username_display}\n"
-            f"📍 Сейчас в: {format_group_text(match_user['current_group'])}\n"
-            f"🎯 Хочет в: {format_group_text(match_user['desired_group'])} (твою группу!)\n\n"
-            f"💬 Напиши ему и договоритесь об обмене!"
-        )
-        return True
-    except Exception:
-        # Если не удалось отправить (пользователь заблокировал бота и т.д.)
-        return False
+async def count_matches(current_group: int, desired_groups: Iterable[int], exclude: Optional[int] = None) -> int:
+    """
+    Число мэтчей для пары (текущая группа, желаемые группы) без выборки самих кандидатов:
+    по размерам корзин индекса или одним COUNT в БД. exclude — сам пользователь.
+    """
+    if match_index.ready:
+        return match_index.count_candidates(current_group, desired_groups, exclude)
+    return await database.count_matches(current_group, list(desired_groups), exclude)
+
+
+async def has_matches(current_group: int, desired_groups: Iterable[int], exclude: Optional[int] = None) -> bool:
+    """Есть ли хоть один мэтч (проверка останавливается на первом кандидате)"""
+    if match_index.ready:
+        return match_index.has_candidates(current_group, desired_groups, exclude)
+    return await database.has_matches(current_group, list(desired_groups), exclude)
+
+
+def _match_info(user: Dict, current_group: int, desired_group: int) -> Dict:
+    return {
+        'telegram_id': user['telegram_id'],
+        'username': user['username'],
+        'first_name': user['first_name'],
+        'current_group': current_group,
+        'desired_group': desired_group
+    }
+
+
+async def _find_matches_indexed(telegram_id: int) -> List[Dict]:
+    """Поиск мэтчей по индексу в памяти: один запрос к БД за данными кандидатов"""
+    entry = match_index.get_user(telegram_id)
+    if entry is None:
+        return []
+    user_current_group = entry[0]
+    
+    candidates = match_index.candidates(telegram_id)
+    users = await database.get_users([candidate_id for candidate_id, _ in candidates])
+    
+    return [
+        _match_info(users[candidate_id], candidate_group, user_current_group)
+        for candidate_id, candidate_group in candidates if candidate_id in users
+    ]
 
 
 async def check_and_notify_new_matches(telegram_id: int, bot):
     """
     Проверка новых мэтчей после изменения данных и отправка уведомлений.
-    Отправляет уведомления обоим участникам мэтча.
+    Пары, о которых уже уведомляли, пропускаются; строки из БД читаются только
+    для пользователя и тех, кому действительно уходит уведомление.
+    Пользователь получает все свои новые мэтчи одним дайджестом, каждый второй участник — свой.
     Возвращает список новых мэтчей.
     """
-    matches = await find_matches(telegram_id)
-    user = await database.get_user(telegram_id)
+    notified = await database.get_notified_partners(telegram_id)
     
-    if not user:
-        return []
+    if match_index.ready:
+        entry = match_index.get_user(telegram_id)
+        if entry is None:
+            return []
+        candidates = [
+            (candidate_id, candidate_group) for candidate_id, candidate_group in match_index.candidates(telegram_id)
+            if candidate_id not in notified
+        ]
+        if not candidates:
+            return []
+        users = await database.get_users([telegram_id] + [candidate_id for candidate_id, _ in candidates])
+        user = users.get(telegram_id)
+        if not user:
+            return []
+        matches = [
+            _match_info(users[candidate_id], candidate_group, entry[0])
+            for candidate_id, candidate_group in candidates if candidate_id in users
+        ]
+    else:
+        matches = [match for match in await find_matches(telegram_id) if match['telegram_id'] not in notified]
+        if not matches:
+            return []
+        user = await database.get_user(telegram_id)
+        if not user:
+            return []
     
-    # Отправляем уведомления о мэтчах
+    # Уведомления, сгруппированные по получателю
+    digests = {telegram_id: matches}
     for match in matches:
-        # Уведомляем текущего пользователя
-        await send_match_notification(bot, telegram_id, match)
-        
-        # Уведомляем второго участника мэтча
-        match_user_info = {
-            'username': user['username'],
-            'first_name': user['first_name'],
-            'current_group': user['current_group'],
-            'desired_group': match['current_group']  # Он хочет в группу match'а
-        }
-        await send_match_notification(bot, match['telegram_id'], match_user_info)
+        # Второй участник мэтча узнаёт о текущем пользователе (он хочет в группу match'а)
+        digests.setdefault(match['telegram_id'], []).append(
+            _match_info(user, user['current_group'], match['current_group'])
+        )
+    await match_notifier.notify_many(bot, digests)
+    
+    # Запоминаем уведомлённые пары, чтобы ни периодическая, ни повторная проверка их не повторяли
+    await database.add_notified_pairs([(telegram_id, match['telegram_id']) for match in matches])
     
     return matches
-
@@ -0,0 +1,254 @@
+"""Учёт памяти процесса: размеры хранилищ в памяти, сессии FSM, RSS и tracemalloc"""
+import asyncio
+import logging
+import os
+import resource
+import sys
+import tracemalloc
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Хранилища в памяти процесса: имя -> (число записей, сам объект для оценки размера)
+_stores: Dict[str, Tuple[Callable[[], int], Optional[Callable[[], Any]]]] = {}
+_fsm_storage: Optional[MemoryStorage] = None
+
+# Сколько объектов обходить при оценке размера одного хранилища
+DEEP_SIZE_LIMIT = 200000
+
+
+def register_store(name: str, count: Callable[[], int], obj: Optional[Callable[[], Any]] = None):
+    """
+    Регистрация хранилища для отчёта /memory и метрик memory_store_<name>.
+    obj — объект, размер которого оценивается обходом (для небольших словарей);
+    без него в отчёте только число записей.
+    """
+    _stores[name] = (count, obj)
+
+
+def register_dict(name: str, data: Dict):
+    """Регистрация словаря-хранилища (число ключей и оценка размера)"""
+    register_store(name, data.__len__, lambda: data)
+
+
+def register_fsm_storage(storage):
+    """FSM-хранилище диспетчера (сессии по состояниям учитываются только для MemoryStorage)"""
+    global _fsm_storage
+    _fsm_storage = storage if isinstance(storage, MemoryStorage) else None
+
+
+def deep_sizeof(obj: Any, limit: int = DEEP_SIZE_LIMIT) -> Tuple[int, bool]:
+    """Оценка размера объекта со всем содержимым (байт) и признак, что обход упёрся в limit"""
+    seen = set()
+    stack = [obj]
+    size = 0
+    while stack:
+        if len(seen) >= limit:
+            return size, True
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif hasattr(item, "__dict__") and not isinstance(item, type):
+            stack.append(vars(item))
+    return size, False
+
+
+def store_sizes(measure: bool = True) -> List[Dict]:
+    """Размеры зарегистрированных хранилищ"""
+    result = []
+    for name, (count, obj) in sorted(_stores.items()):
+        entry = {'name': name, 'count': count()}
+        if measure and obj is not None:
+            try:
+                entry['bytes'], entry['truncated'] = deep_sizeof(obj())
+            except RuntimeError:
+                # При обходе в отдельном потоке хранилище могли изменить — оценка неполная
+                entry['bytes'], entry['truncated'] = 0, True
+        result.append(entry)
+    return result
+
+
+def fsm_sessions() -> Optional[Dict[str, int]]:
+    """
+    Записи MemoryStorage по состояниям. Запись создаётся при первом обращении к FSM
+    и не удаляется, поэтому «без состояния» — это пользователи, давно закончившие сценарий.
+    """
+    if _fsm_storage is None:
+        return None
+    counts = Counter(record.state or "без состояния" for record in list(_fsm_storage.storage.values()))
+    return dict(counts.most_common())
+
+
+def current_rss() -> Optional[int]:
+    """Текущий объём резидентной памяти процесса (байт); None, если узнать нельзя"""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss() -> int:
+    """Пиковый объём резидентной памяти процесса (байт)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class AllocationTracker:
+    """
+    tracemalloc по запросу: кто выделил больше всего памяти и что выросло
+    с прошлого отчёта. Пока включён, замедляет выделение памяти, поэтому по умолчанию выключен.
+    """
+
+    def __init__(self):
+        self._previous: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def active(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._previous = None
+
+    def stop(self):
+        tracemalloc.stop()
+        self._previous = None
+
+    def report(self, limit: int = 10) -> Dict:
+        """Крупнейшие места выделения памяти и рост с прошлого вызова"""
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+        top = snapshot.statistics("lineno")[:limit]
+        diff = snapshot.compare_to(self._previous, "lineno")[:limit] if self._previous is not None else None
+        self._previous = snapshot
+        return {
+            'traced': tracemalloc.get_traced_memory()[0],
+            'top': [(str(stat.traceback), stat.size, stat.count) for stat in top],
+            'diff': None if diff is None else [(str(stat.traceback), stat.size_diff, stat.count_diff) for stat in diff],
+        }
+
+
+allocation_tracker = AllocationTracker()
+
+
+async def memory_report(measure: bool = True) -> Dict:
+    """
+    Отчёт о памяти. Обход хранилищ (до DEEP_SIZE_LIMIT объектов на каждое) и снимок
+    tracemalloc выполняются в отдельном потоке, чтобы не задерживать обработку апдейтов.
+    """
+    report = {
+        'rss': current_rss(),
+        'peak_rss': peak_rss(),
+        'stores': await asyncio.to_thread(store_sizes, measure) if measure else store_sizes(False),
+        'fsm': fsm_sessions(),
+        'allocations': None,
+    }
+    if allocation_tracker.active:
+        report['allocations'] = await asyncio.to_thread(allocation_tracker.report)
+    return report
+
+
+def _mb(size: Optional[int]) -> str:
+    return "—" if size is None else f"{size / 1024 / 1024:.1f} МБ"
+
+
+def _kb(size: int) -> str:
+    return f"{size / 1024:+.1f} КБ" if size < 0 else f"{size / 1024:.1f} КБ"
+
+
+def format_memory_report(report: Dict) -> str:
+    """Текст отчёта о памяти для администратора"""
+    lines = [
+        f"🧠 RSS: {_mb(report['rss'])} (пик {_mb(report['peak_rss'])})",
+        "",
+        "Хранилища в памяти:",
+    ]
+    for store in report['stores']:
+        size = ""
+        if 'bytes' in store:
+            size = f", ~{'≥' if store['truncated'] else ''}{_kb(store['bytes'])}"
+        lines.append(f"• {store['name']}: {store['count']}{size}")
+
+    if report['fsm'] is not None:
+        lines += ["", f"Сессии FSM: {sum(report['fsm'].values())}"]
+        lines += [f"• {state}: {count}" for state, count in report['fsm'].items()]
+
+    allocations = report['allocations']
+    if allocations is None:
+        lines += ["", "tracemalloc выключен (/memory trace — включить)"]
+    else:
+        lines += ["", f"tracemalloc: отслеживается {_mb(allocations['traced'])}", "Больше всего выделено:"]
+        lines += [f"• {_kb(size)} ({count}) {where}" for where, size, count in allocations['top']]
+        if allocations['diff'] is None:
+            lines.append("Рост появится со следующего /memory")
+        else:
+            lines.append("Рост с прошлого /memory:")
+            lines += [f"• {_kb(size)} ({count:+d}) {where}" for where, size, count in allocations['diff']]
+    return "\n".join(lines)
+
+
+class MemoryMonitor:
+    """
+    Периодическая запись метрик памяти: process_rss_bytes, memory_store_<имя>, fsm_sessions.
+    При превышении warn_bytes пишется предупреждение (один раз, пока RSS не опустится ниже).
+    """
+
+    def __init__(self, interval: float, warn_bytes: int = 0):
+        self.interval = interval
+        self.warn_bytes = warn_bytes
+        self._warned = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+    def sample(self):
+        rss = current_rss()
+        if rss is not None:
+            metrics.gauge("process_rss_bytes").set(rss)
+        metrics.gauge("process_peak_rss_bytes").set(peak_rss())
+        for store in store_sizes(measure=False):
+            metrics.gauge(f"memory_store_{store['name']}").set(store['count'])
+        sessions = fsm_sessions()
+        if sessions is not None:
+            metrics.gauge("fsm_sessions").set(sum(sessions.values()))
+
+        if self.warn_bytes and rss is not None:
+            if rss > self.warn_bytes and not self._warned:
+                self._warned = True
+                stores = ", ".join(f"{s['name']}={s['count']}" for s in store_sizes(measure=False))
+                logger.warning("RSS %s больше порога %s; хранилища: %s", _mb(rss), _mb(self.warn_bytes), stores)
+            elif rss <= self.warn_bytes:
+                self._warned = False
@@ -0,0 +1,139 @@
+"""Простые внутрипроцессные метрики"""
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Counter:
+    """Монотонно растущий счётчик"""
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+    def snapshot(self) -> Dict:
+        return {'value': self.value}
+
+
+class Gauge:
+    """Текущее значение величины"""
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def snapshot(self) -> Dict:
+        return {'value': self.value}
+
+
+class Histogram:
+    """Распределение значений по последним наблюдениям (ограниченное окно)"""
+
+    def __init__(self, window: int = 1000):
+        self.count = 0
+        self.total = 0.0
+        self._recent: Deque[float] = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self._recent.append(value)
+
+    def percentile(self, p: float) -> float:
+        """Перцентиль (0-100) по последним наблюдениям"""
+        if not self._recent:
+            return 0.0
+        values = sorted(self._recent)
+        index = min(len(values) - 1, int(len(values) * p / 100))
+        return values[index]
+
+    def snapshot(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+
+_metrics: Dict[str, object] = {}
+
+
+def _get_or_create(name: str, cls):
+    metric = _metrics.get(name)
+    if metric is None:
+        metric = _metrics[name] = cls()
+    elif not isinstance(metric, cls):
+        raise TypeError(f"Метрика {name} уже зарегистрирована как {type(metric).__name__}")
+    return metric
+
+
+def counter(name: str) -> Counter:
+    """Получение (или создание) счётчика по имени"""
+    return _get_or_create(name, Counter)
+
+
+def gauge(name: str) -> Gauge:
+    """Получение (или создание) gauge по имени"""
+    return _get_or_create(name, Gauge)
+
+
+def histogram(name: str) -> Histogram:
+    """Получение (или создание) гистограммы по имени"""
+    return _get_or_create(name, Histogram)
+
+
+def snapshot() -> Dict[str, Dict]:
+    """Текущие значения всех метрик"""
+    return {name: metric.snapshot() for name, metric in sorted(_metrics.items())}
+
+
+def _format_value(value) -> str:
+    return f"{value:.6g}" if isinstance(value, float) else str(value)
+
+
+def format_snapshot(values: Dict[str, Dict]) -> List[str]:
+    """Строки снимка метрик: «имя значение» или «имя поле=значение …» для гистограмм"""
+    lines = []
+    for name, fields in values.items():
+        if list(fields) == ['value']:
+            lines.append(f"{name} {_format_value(fields['value'])}")
+        else:
+            lines.append(f"{name} " + " ".join(f"{key}={_format_value(value)}" for key, value in fields.items()))
+    return lines
+
+
+class MetricsReporter:
+    """Периодическая запись всех метрик в лог (INFO) одной строкой"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def report(self):
+        logger.info("Метрики: %s", "; ".join(format_snapshot(snapshot())))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.report()
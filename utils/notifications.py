@@ -0,0 +1,133 @@
+"""Уведомления о мэтчах: одно сообщение-дайджест на получателя"""
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+import config
+from keyboards.keyboards import MESSAGE_LIMIT, format_group_text
+from utils import metrics
+from utils.memory import register_store
+
+logger = logging.getLogger(__name__)
+
+
+def _display_name(match_user: Dict) -> str:
+    return f"@{match_user['username']}" if match_user['username'] else match_user['first_name']
+
+
+def format_match_entry(match_user: Dict) -> str:
+    """Описание одного человека для обмена"""
+    return (
+        f"👤 {_display_name(match_user)}\n"
+        f"📍 Сейчас в: {format_group_text(match_user['current_group'])}\n"
+        f"🎯 Хочет в: {format_group_text(match_user['desired_group'])} (твою группу!)"
+    )
+
+
+def format_match_digest(matches: List[Dict]) -> List[str]:
+    """
+    Тексты уведомления о мэтчах для одного получателя.
+    Все мэтчи собираются в одно сообщение; если оно длиннее MESSAGE_LIMIT — в несколько.
+    """
+    if len(matches) == 1:
+        return [
+            f"🎉 Есть мэтч!\n\n"
+            f"Нашёлся человек для обмена:\n\n"
+            f"{format_match_entry(matches[0])}\n\n"
+            f"💬 Напиши ему и договоритесь об обмене!"
+        ]
+
+    header = f"🎉 Нашлось {len(matches)} мэтч(ей)!\n\nЛюди для обмена:"
+    footer = "💬 Напиши им и договоритесь об обмене!"
+    texts = []
+    text = header
+    for match in matches:
+        entry = format_match_entry(match)
+        if len(text) + len(entry) + 2 > MESSAGE_LIMIT:
+            texts.append(text)
+            text = "🎉 Мэтчи (продолжение):"
+        text += "\n\n" + entry
+    if len(text) + len(footer) + 2 > MESSAGE_LIMIT:
+        texts.append(text)
+        text = footer
+    else:
+        text += "\n\n" + footer
+    texts.append(text)
+    return texts
+
+
+async def send_match_digest(bot, user_id: int, matches: List[Dict]) -> bool:
+    """Отправка дайджеста мэтчей пользователю"""
+    try:
+        for text in format_match_digest(matches):
+            await bot.send_message(user_id, text)
+            metrics.counter("match_notification_messages").inc()
+        return True
+    except Exception:
+        # Если не удалось отправить (пользователь заблокировал бота и т.д.)
+        return False
+
+
+async def send_match_notification(bot, user_id: int, match_user: Dict) -> bool:
+    """Отправка уведомления об одном мэтче пользователю"""
+    return await send_match_digest(bot, user_id, [match_user])
+
+
+class MatchNotifier:
+    """
+    Отправка уведомлений о мэтчах, сгруппированных по получателю.
+    При window = 0 дайджест уходит сразу. При window > 0 мэтчи получателя копятся
+    window секунд с первого из них и уходят одним сообщением.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._buffers: Dict[int, Dict[int, Dict]] = {}
+        self._timers: Dict[int, asyncio.Task] = {}
+        self._bot = None
+
+    async def notify(self, bot, user_id: int, matches: List[Dict]):
+        """Уведомление пользователя о мэтчах"""
+        if not matches:
+            return
+        if self.window <= 0:
+            await send_match_digest(bot, user_id, matches)
+            return
+
+        self._bot = bot
+        buffer = self._buffers.setdefault(user_id, {})
+        for match in matches:
+            # Повторный мэтч с тем же человеком заменяет прежний
+            buffer[match.get('telegram_id', id(match))] = match
+        if user_id not in self._timers:
+            self._timers[user_id] = asyncio.create_task(self._send_later(user_id))
+
+    async def notify_many(self, bot, digests: Dict[int, List[Dict]]):
+        """Уведомление нескольких получателей: {получатель: мэтчи}"""
+        for user_id, matches in digests.items():
+            await self.notify(bot, user_id, matches)
+
+    def pending_count(self) -> int:
+        """Количество получателей с неотправленными дайджестами"""
+        return len(self._buffers)
+
+    async def flush(self):
+        """Немедленная отправка всех накопленных дайджестов (при остановке)"""
+        timers, self._timers = self._timers, {}
+        for timer in timers.values():
+            timer.cancel()
+        await asyncio.gather(*(self._send(user_id) for user_id in list(self._buffers)))
+
+    async def _send_later(self, user_id: int):
+        await asyncio.sleep(self.window)
+        self._timers.pop(user_id, None)
+        await self._send(user_id)
+
+    async def _send(self, user_id: int):
+        buffer: Optional[Dict[int, Dict]] = self._buffers.pop(user_id, None)
+        if buffer:
+            await send_match_digest(self._bot, user_id, list(buffer.values()))
+
+
+match_notifier = MatchNotifier(config.MATCH_DIGEST_WINDOW)
+register_store("match_digests_pending", match_notifier.pending_count)
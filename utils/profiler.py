@@ -0,0 +1,187 @@
+"""Профилирование работающего бота по запросу"""
+import asyncio
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _thread_stack(frame) -> List[str]:
+    stack = []
+    while frame is not None:
+        stack.append(_frame_name(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _task_stack(task: asyncio.Task) -> List[str]:
+    """Цепочка await задачи: от корутины задачи до того, чего она ждёт"""
+    stack = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            if isinstance(awaitable, asyncio.Future):
+                stack.append(f"<{type(awaitable).__name__}>")
+            break
+        stack.append(_frame_name(frame))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return stack
+
+
+class Profiler:
+    """
+    Профилировщик, включаемый на время: на window секунд или до конца следующих updates апдейтов.
+    cProfile считает процессорное время функций в потоке цикла событий, а поток-сэмплер
+    раз в sample_interval секунд снимает стек цикла и цепочки await всех задач —
+    так видно не только занятый процессор, но и где хендлеры ждут (БД, Telegram).
+    Результат — файлы .pstats и .collapsed (формат flamegraph.pl / speedscope) в output_dir.
+    Выключенный профилировщик стоит одной проверки active на апдейт.
+    """
+
+    def __init__(self, output_dir: str, sample_interval: float):
+        self.output_dir = output_dir
+        self.sample_interval = sample_interval
+        self.active = False
+        self._profile: Optional[cProfile.Profile] = None
+        self._samples: Counter = Counter()
+        self._sample_count = 0
+        self._updates_left: Optional[int] = None
+        self._updates_done = 0
+        self._started = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._on_done: Optional[Callable[[Dict], Awaitable]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stopping: Optional[asyncio.Task] = None
+
+    def start(self, seconds: Optional[float] = None, updates: Optional[int] = None,
+              on_done: Optional[Callable[[Dict], Awaitable]] = None) -> bool:
+        """
+        Включение профилирования (из потока цикла событий). Без updates — на seconds секунд,
+        с updates — до конца стольких апдейтов, но не дольше seconds. False, если уже включено.
+        """
+        if self.active:
+            return False
+        seconds = min(seconds or config.PROFILE_DEFAULT_SECONDS, config.PROFILE_MAX_SECONDS)
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._samples = Counter()
+        self._sample_count = 0
+        self._updates_left = updates
+        self._updates_done = 0
+        self._on_done = on_done
+        self._started = time.monotonic()
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample, name="profiler-sampler", daemon=True)
+        self._sampler.start()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        self._timer = self._loop.call_later(seconds, self._finish)
+        self.active = True
+        logger.info("Профилирование включено: %sдо %.0f с", f"{updates} апдейтов, " if updates else "", seconds)
+        return True
+
+    def update_done(self):
+        """Учёт завершённого апдейта (вызывает ProfilerMiddleware, пока профилировщик включён)"""
+        self._updates_done += 1
+        if self._updates_left is not None:
+            self._updates_left -= 1
+            if self._updates_left <= 0:
+                self._finish()
+
+    def _finish(self):
+        if self.active and self._stopping is None:
+            self._stopping = asyncio.ensure_future(self.stop())
+
+    async def stop(self) -> Optional[Dict]:
+        """Выключение профилирования и запись результатов; None, если оно не было включено"""
+        if not self.active:
+            return None
+        self.active = False
+        self._profile.disable()
+        self._timer.cancel()
+        self._stop.set()
+        await asyncio.to_thread(self._sampler.join)
+        try:
+            report = await asyncio.to_thread(self._write)
+        finally:
+            self._profile = None
+            self._stopping = None
+        logger.info("Профиль записан: %s, %s", report['pstats'], report['collapsed'])
+        if self._on_done is not None:
+            try:
+                await self._on_done(report)
+            except Exception as e:
+                logger.error("Не удалось отправить отчёт профилировщика: %s", e)
+        return report
+
+    def _sample(self):
+        while not self._stop.wait(self.sample_interval):
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                self._samples[";".join(["loop"] + _thread_stack(frame))] += 1
+            try:
+                tasks = asyncio.all_tasks(self._loop)
+            except RuntimeError:
+                continue
+            for task in tasks:
+                stack = _task_stack(task)
+                if stack:
+                    self._samples[";".join([f"task {task.get_name()}"] + stack)] += 1
+            self._sample_count += 1
+
+    def _write(self) -> Dict:
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+        self._profile.dump_stats(base + ".pstats")
+        with open(base + ".collapsed", "w", encoding="utf-8") as file:
+            for stack, count in self._samples.most_common():
+                file.write(f"{stack} {count}\n")
+
+        stats = pstats.Stats(self._profile)
+        top = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:10]
+        return {
+            'pstats': base + ".pstats",
+            'collapsed': base + ".collapsed",
+            'duration': time.monotonic() - self._started,
+            'updates': self._updates_done,
+            'samples': self._sample_count,
+            'top': [
+                (f"{func[2]} ({os.path.basename(func[0])}:{func[1]})", calls, tottime)
+                for func, (_, calls, tottime, _, _) in top
+            ],
+        }
+
+
+def format_report(report: Dict) -> str:
+    """Краткий отчёт о профилировании для администратора"""
+    lines = [
+        f"⏱ Профиль за {report['duration']:.1f} с: апдейтов {report['updates']}, сэмплов {report['samples']}",
+        "",
+        "Больше всего собственного времени:",
+    ]
+    for name, calls, tottime in report['top']:
+        lines.append(f"{tottime * 1000:8.1f} мс  {calls:>7}  {name}")
+    lines += ["", f"📄 {report['pstats']}", f"🔥 {report['collapsed']}"]
+    return "\n".join(lines)
+
+
+profiler = Profiler(config.PROFILE_DIR, config.PROFILE_SAMPLE_INTERVAL)
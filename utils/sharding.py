@@ -0,0 +1,37 @@
+"""Распределение апдейтов по воркерам"""
+from typing import Dict, Optional
+
+# Типы апдейтов и поле с пользователем, от которого они пришли
+_USER_FIELDS = (
+    ("message", "from"),
+    ("edited_message", "from"),
+    ("callback_query", "from"),
+    ("inline_query", "from"),
+    ("chosen_inline_result", "from"),
+    ("shipping_query", "from"),
+    ("pre_checkout_query", "from"),
+    ("poll_answer", "user"),
+    ("my_chat_member", "from"),
+    ("chat_member", "from"),
+    ("chat_join_request", "from"),
+)
+
+
+def update_user_id(update: Dict) -> Optional[int]:
+    """Telegram id автора апдейта (по сырому JSON) или None, если апдейт не от пользователя"""
+    for update_type, field in _USER_FIELDS:
+        event = update.get(update_type)
+        if event is not None:
+            user = event.get(field)
+            return user.get("id") if user else None
+    return None
+
+
+def shard_of(user_id: Optional[int], workers: int) -> int:
+    """
+    Номер воркера для пользователя. Все апдейты одного пользователя попадают
+    в один воркер, поэтому его FSM и черновики регистрации остаются в памяти этого воркера.
+    """
+    if user_id is None:
+        return 0
+    return user_id % workers
@@ -0,0 +1,146 @@
+"""Снимок индекса мэтчей на диске для быстрого перезапуска"""
+import logging
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from utils.match_index import MatchIndex
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"GCMI"
+VERSION = 1
+
+# Массивы пишутся в порядке байт машины — снимок читается только там же, где записан
+_BYTEORDER = 1 if sys.byteorder == "little" else 2
+
+# magic, версия, порядок байт, счётчик изменений БД,
+# пользователей, всего желаемых групп, корзин, всего id в корзинах, crc32 данных
+_HEADER = struct.Struct("<4sHHQIIIII")
+_HEADER_SIZE = 40
+
+# Раскладка после заголовка (сначала 8-байтные массивы, чтобы не нарушать выравнивание):
+#   q[users]          — id пользователей
+#   q[bucket_total]   — id всех корзин подряд
+#   i[users]          — текущие группы пользователей
+#   i[users + 1]      — смещения желаемых групп пользователя в следующем массиве
+#   i[desired_total]  — желаемые группы всех пользователей подряд
+#   i[3 * buckets]    — (текущая группа, желаемая группа, размер) каждой корзины
+_TYPECODES = "qqiiii"
+_ITEM_SIZES = [array(typecode).itemsize for typecode in _TYPECODES]
+
+
+def _encode(index: MatchIndex) -> List[array]:
+    user_ids = array('q')
+    current_groups = array('i')
+    offsets = array('i', [0])
+    desired_groups = array('i')
+    for telegram_id, (current_group, desired) in index.users():
+        user_ids.append(telegram_id)
+        current_groups.append(current_group)
+        desired_groups.extend(desired)
+        offsets.append(len(desired_groups))
+
+    bucket_ids = array('q')
+    table = array('i')
+    for program in index.programs():
+        for (current_group, desired_group), users in index.buckets(program).items():
+            bucket_ids.extend(users)
+            table.extend((current_group, desired_group, len(users)))
+    return [user_ids, bucket_ids, current_groups, offsets, desired_groups, table]
+
+
+def save_snapshot(index: MatchIndex, path: str, change_counter: int) -> int:
+    """
+    Запись снимка индекса, привязанного к счётчику изменений БД.
+    Файл заменяется атомарно. Возвращает размер снимка в байтах.
+    """
+    sections = _encode(index)
+    payload = b"".join(section.tobytes() for section in sections)
+    user_ids, bucket_ids, _, _, desired_groups, table = sections
+    header = _HEADER.pack(
+        MAGIC, VERSION, _BYTEORDER, change_counter,
+        len(user_ids), len(desired_groups), len(table) // 3, len(bucket_ids), zlib.crc32(payload)
+    ).ljust(_HEADER_SIZE, b"\0")
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(header)
+        file.write(payload)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+    return _HEADER_SIZE + len(payload)
+
+
+def _decode(data: memoryview, change_counter: int) -> Optional[Tuple[Dict, List]]:
+    if len(data) < _HEADER_SIZE:
+        return None
+    (magic, version, byteorder, counter,
+     user_count, desired_total, bucket_count, bucket_total, crc) = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or byteorder != _BYTEORDER:
+        logger.info("Снимок индекса другого формата")
+        return None
+    if counter != change_counter:
+        logger.info("Снимок индекса устарел: счётчик %s, в БД %s", counter, change_counter)
+        return None
+
+    lengths = (user_count, bucket_total, user_count, user_count + 1, desired_total, 3 * bucket_count)
+    sizes = [length * item_size for length, item_size in zip(lengths, _ITEM_SIZES)]
+    payload = data[_HEADER_SIZE:]
+    if len(payload) != sum(sizes) or zlib.crc32(payload) != crc:
+        logger.warning("Снимок индекса повреждён")
+        return None
+
+    # Массивы читаются прямо из отображённого файла, без промежуточных копий
+    sections = []
+    offset = 0
+    for size, typecode in zip(sizes, _TYPECODES):
+        view = payload[offset:offset + size].cast(typecode)
+        sections.append(view.tolist())
+        view.release()
+        offset += size
+    user_ids, bucket_ids, current_groups, offsets, desired_groups, table = sections
+
+    users = dict(zip(user_ids, zip(
+        current_groups,
+        map(frozenset, map(desired_groups.__getitem__, map(slice, offsets, offsets[1:])))
+    )))
+    buckets = []
+    start = 0
+    for i in range(0, len(table), 3):
+        current_group, desired_group, size = table[i:i + 3]
+        buckets.append(((current_group, desired_group), bucket_ids[start:start + size]))
+        start += size
+    return users, buckets
+
+
+def load_snapshot(index: MatchIndex, path: str, change_counter: int) -> bool:
+    """
+    Загрузка индекса из снимка, если он цел и записан при том же счётчике изменений БД.
+    Возвращает False, если снимка нет или он не подходит — тогда индекс нужно строить из БД.
+    """
+    try:
+        file = open(path, "rb")
+    except FileNotFoundError:
+        return False
+
+    with file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return False
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            data = memoryview(mapped)
+            try:
+                decoded = _decode(data, change_counter)
+            finally:
+                data.release()
+
+    if decoded is None:
+        return False
+    index.restore(*decoded)
+    return True
+
@@ -0,0 +1,134 @@
+"""Агрегированная статистика спроса на переводы"""
+import html
+from typing import Dict, List, Tuple
+
+import config
+import database
+from utils.cache import TTLCache
+from utils.groups import catalog
+from utils.memory import register_store
+from keyboards.keyboards import MESSAGE_LIMIT
+
+# Программы с большим числом групп показываются списком ненулевых клеток, а не таблицей
+MATRIX_MAX_GROUPS = 10
+
+_cache = TTLCache(config.STATS_CACHE_TTL)
+register_store("stats_cache", _cache.__len__, lambda: _cache)
+
+
+def count_matchable_pairs(matrix: Dict[Tuple[int, int], int]) -> int:
+    """
+    Число пар, готовых к обмену прямо сейчас.
+    Каждый из matrix[(x, y)] подходит каждому из matrix[(y, x)].
+    """
+    return sum(
+        count * matrix.get((desired_group, current_group), 0)
+        for (current_group, desired_group), count in matrix.items()
+        if current_group < desired_group
+    )
+
+
+def count_unmatched_demand(matrix: Dict[Tuple[int, int], int]) -> int:
+    """Число желаний перевода, для которых нет ни одного встречного"""
+    return sum(
+        count
+        for (current_group, desired_group), count in matrix.items()
+        if not matrix.get((desired_group, current_group))
+    )
+
+
+async def _compute_stats() -> Dict:
+    population = await database.get_group_population()
+    matrix = await database.get_demand_matrix()
+    return {
+        'population': population,
+        'matrix': matrix,
+        'matchable_pairs': count_matchable_pairs(matrix),
+        'unmatched_demand': count_unmatched_demand(matrix),
+    }
+
+
+async def get_stats() -> Dict:
+    """Статистика (из кэша, пересчитывается не чаще раза в STATS_CACHE_TTL)"""
+    return await _cache.get_or_compute("stats", _compute_stats)
+
+
+def _format_matrix(program: str, matrix: Dict[Tuple[int, int], int]) -> Tuple[List[str], bool]:
+    """Строки матрицы спроса и признак, что это таблица (выводится в <pre>)"""
+    groups = catalog.program_groups(program)
+    if len(groups) > MATRIX_MAX_GROUPS:
+        cells = sorted(
+            (key, count) for key, count in matrix.items()
+            if catalog.program_of(key[0]) == program
+        )
+        return [
+            f"{html.escape(catalog.label(current))} → {html.escape(catalog.label(desired))}: {count}"
+            for (current, desired), count in cells
+        ] or ["—"], False
+
+    lines = ["из\\в" + "".join(f"{group.number:>4}" for group in groups)]
+    for row in groups:
+        cells = "".join(
+            f"{'-' if row.id == col.id else matrix.get((row.id, col.id), 0):>4}"
+            for col in groups
+        )
+        lines.append(f"{row.number:>4}{cells}")
+    return lines, True
+
+
+def _split_messages(lines: List[Tuple[str, bool]], limit: int = MESSAGE_LIMIT) -> List[str]:
+    """
+    Склейка строк (текст, внутри <pre>) в сообщения не длиннее limit.
+    Сообщение режется только между строками; открытый <pre> закрывается в конце
+    сообщения и открывается заново в следующем.
+    """
+    texts = []
+    text = ""
+    pre = False
+    # Строка длиннее сообщения (например, население тысяч групп) обрезается
+    room = limit - len("<pre></pre>")
+    for line, preformatted in lines:
+        if len(line) > room:
+            line = line[:room - 1] + "…"
+        if pre and not preformatted:
+            text += "</pre>"
+            pre = False
+        piece = ("\n" if text else "") + ("<pre>" if preformatted and not pre else "") + line
+        # Запас на закрывающий </pre>
+        if text and len(text) + len(piece) + len("</pre>") > limit:
+            texts.append(text + "</pre>" if pre else text)
+            text = ""
+            piece = ("<pre>" if preformatted else "") + line
+        text += piece
+        pre = preformatted
+    texts.append(text + "</pre>" if pre else text)
+    return texts
+
+
+def format_stats(stats: Dict) -> List[str]:
+    """Тексты статистики для администратора (HTML), каждый не длиннее MESSAGE_LIMIT"""
+    lines = [("📊 Статистика", False), ("", False)]
+    for program in catalog.programs():
+        # Текст уходит с parse_mode=HTML
+        title = html.escape(catalog.program_title(program))
+        groups = catalog.program_groups(program)
+        if len(groups) > MATRIX_MAX_GROUPS:
+            # Для больших программ только непустые группы
+            groups = [group for group in groups if stats['population'].get(group.id)]
+        population = ", ".join(
+            f"{group.number}: {stats['population'].get(group.id, 0)}"
+            for group in groups
+        ) or "—"
+        matrix_lines, preformatted = _format_matrix(program, stats['matrix'])
+        lines += [
+            (f"🎓 {title}", False),
+            (f"👥 Участников по группам: {population}", False),
+            ("🔀 Желаемые переводы (строка — откуда, столбец — куда):", False),
+        ]
+        lines += [(line, preformatted) for line in matrix_lines]
+        lines.append(("", False))
+    lines += [
+        (f"🤝 Пар для обмена сейчас: {stats['matchable_pairs']}", False),
+        (f"⏳ Желаний без встречного: {stats['unmatched_demand']}", False),
+    ]
+    return _split_messages(lines)
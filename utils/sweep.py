@@ -0,0 +1,99 @@
+"""Периодическая проверка мэтчей по всей базе"""
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import database
+from utils.matcher import _match_info
+from utils.notifications import match_notifier
+
+logger = logging.getLogger(__name__)
+
+Pair = Tuple[int, int]
+
+
+def compute_mutual_pairs(rows: Iterable[Tuple[int, int, Optional[int]]]) -> Dict[Pair, Pair]:
+    """
+    Все взаимные пары по строкам (telegram_id, current_group, desired_group).
+    Пользователи раскладываются по клеткам матрицы спроса (текущая, желаемая);
+    пары перебираются только для клеток, у которых непуста симметричная клетка.
+    Возвращает {(a, b): (группа a, группа b)} при a < b.
+
+    Время — O(строк + взаимных пар): каждая итерация внутреннего цикла даёт пару результата,
+    несовпадающие пользователи не сравниваются вовсе. Поэтому цикл упирается в размер ответа,
+    а не в перебор; замеры — python manage.py bench-sweep.
+    """
+    cells: Dict[Pair, List[int]] = {}
+    for telegram_id, current_group, desired_group in rows:
+        if desired_group is None or desired_group == current_group:
+            continue
+        cells.setdefault((current_group, desired_group), []).append(telegram_id)
+
+    pairs: Dict[Pair, Pair] = {}
+    for (current_group, desired_group), users in cells.items():
+        # Каждую пару клеток обходим один раз
+        if current_group > desired_group:
+            continue
+        partners = cells.get((desired_group, current_group))
+        if not partners:
+            continue
+        for a in users:
+            for b in partners:
+                if a < b:
+                    pairs[(a, b)] = (current_group, desired_group)
+                else:
+                    pairs[(b, a)] = (desired_group, current_group)
+    return pairs
+
+
+async def sweep_matches(bot) -> int:
+    """
+    Полная проверка мэтчей: одна выборка всех пользователей, вычисление всех взаимных
+    пар и уведомление только тех, кого ещё не уведомляли. Возвращает число новых пар.
+    """
+    pairs = compute_mutual_pairs(await database.get_match_rows())
+    notified = await database.get_notified_pairs()
+
+    # Пары, которые перестали быть мэтчем, снова получат уведомление, если мэтч вернётся
+    stale = [pair for pair in notified if pair not in pairs]
+    if stale:
+        await database.remove_notified_pairs(stale)
+
+    new_pairs = [pair for pair in pairs if pair not in notified]
+    if not new_pairs:
+        return 0
+
+    users = await database.get_users(list({user_id for pair in new_pairs for user_id in pair}))
+    # Все новые мэтчи получателя уходят одним дайджестом
+    digests: Dict[int, List[Dict]] = {}
+    for a, b in new_pairs:
+        user_a, user_b = users.get(a), users.get(b)
+        if user_a is None or user_b is None:
+            continue
+        group_a, group_b = pairs[(a, b)]
+        digests.setdefault(a, []).append(_match_info(user_b, group_b, group_a))
+        digests.setdefault(b, []).append(_match_info(user_a, group_a, group_b))
+    await match_notifier.notify_many(bot, digests)
+
+    await database.add_notified_pairs(new_pairs)
+    return len(new_pairs)
+
+
+async def run_periodic_sweep(bot, interval: float, stop: Optional[asyncio.Event] = None):
+    """
+    Фоновая задача: проверка мэтчей по всей базе раз в interval секунд.
+    После stop.set() начатая проверка доводится до конца, новые не запускаются.
+    """
+    stop = stop or asyncio.Event()
+    while True:
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+            return
+        except asyncio.TimeoutError:
+            pass
+        try:
+            new_pairs = await sweep_matches(bot)
+            if new_pairs:
+                logger.info("Периодическая проверка нашла %s новых мэтч(ей)", new_pairs)
+        except Exception as e:
+            logger.error("Ошибка периодической проверки мэтчей: %s", e)
@@ -0,0 +1,332 @@
+"""Трассировка обработки апдейтов: спаны хендлеров, запросов к БД и вызовов Bot API"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Set
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "group-changer-bot"
+
+
+class Span:
+    """Отрезок работы внутри трассы"""
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'attributes', 'start_ns', 'end_ns', 'error')
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'duration_ms': round((self.end_ns - self.start_ns) / 1e6, 3),
+            'attributes': self.attributes,
+            'error': self.error,
+        }
+
+
+# Текущий спан. Контекст копируется в задачи asyncio при создании,
+# поэтому спаны фоновых задач, начатых из хендлера, попадают в трассу апдейта.
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class JsonlExporter:
+    """Запись спанов в локальный файл JSONL (одна строка на спан)"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def export(self, spans: List[Dict]):
+        lines = "".join(json.dumps(span, ensure_ascii=False, default=str) + "\n" for span in spans)
+        await asyncio.to_thread(self._write, lines)
+
+    def _write(self, lines: str):
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(lines)
+
+    async def close(self):
+        pass
+
+
+def _otlp_value(value: Any) -> Dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _from_otlp_value(value: Dict) -> Any:
+    if 'intValue' in value:
+        return int(value['intValue'])
+    return next(iter(value.values()))
+
+
+def to_otlp(spans: List[Dict]) -> Dict:
+    """Спаны в формате OTLP/JSON (тело запроса POST /v1/traces)"""
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+            'scopeSpans': [{
+                'scope': {'name': __name__},
+                'spans': [{
+                    'traceId': span['trace_id'],
+                    'spanId': span['span_id'],
+                    'parentSpanId': span['parent_id'] or "",
+                    'name': span['name'],
+                    'kind': 1,
+                    'startTimeUnixNano': str(span['start_ns']),
+                    'endTimeUnixNano': str(span['end_ns']),
+                    'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in span['attributes'].items()],
+                    'status': {'code': 2, 'message': span['error']} if span['error'] else {'code': 1},
+                } for span in spans],
+            }],
+        }],
+    }
+
+
+def from_otlp(payload: Dict) -> List[Dict]:
+    """Обратное преобразование OTLP/JSON в записи спанов (для локального коллектора)"""
+    spans = []
+    for resource_spans in payload.get('resourceSpans', []):
+        for scope_spans in resource_spans.get('scopeSpans', []):
+            for span in scope_spans.get('spans', []):
+                start_ns, end_ns = int(span['startTimeUnixNano']), int(span['endTimeUnixNano'])
+                status = span.get('status', {})
+                spans.append({
+                    'trace_id': span['traceId'],
+                    'span_id': span['spanId'],
+                    'parent_id': span.get('parentSpanId') or None,
+                    'name': span['name'],
+                    'start_ns': start_ns,
+                    'end_ns': end_ns,
+                    'duration_ms': round((end_ns - start_ns) / 1e6, 3),
+                    'attributes': {
+                        attribute['key']: _from_otlp_value(attribute['value'])
+                        for attribute in span.get('attributes', [])
+                    },
+                    'error': status.get('message') if status.get('code') == 2 else None,
+                })
+    return spans
+
+
+class OTLPExporter:
+    """Отправка спанов коллектору по OTLP/HTTP (JSON)"""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def export(self, spans: List[Dict]):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5))
+        async with self._session.post(self.endpoint, json=to_otlp(spans)) as response:
+            if response.status >= 300:
+                raise RuntimeError(f"коллектор ответил {response.status}")
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class Tracer:
+    """
+    Создание спанов и пакетная отправка завершённых спанов экспортёру.
+    Решение о записи принимается один раз на трассу (доля sample_rate):
+    в невыбранных трассах спаны не создаются вовсе.
+    """
+
+    def __init__(self):
+        self.sample_rate = 0.0
+        self.exporter = None
+        self.batch_size = 256
+        self.flush_interval = 2.0
+        self._buffer: List[Dict] = []
+        self._flusher: Optional[asyncio.Task] = None
+        # Отправки заполненных пачек; ссылки держим, чтобы задачи не собрал сборщик мусора
+        self._exports: Set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None and self.sample_rate > 0
+
+    def configure(self, sample_rate: float, exporter):
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+
+    def start(self):
+        """Запуск фоновой отправки спанов"""
+        if self.enabled:
+            self._flusher = asyncio.create_task(self._run())
+
+    async def shutdown(self):
+        """Отправка оставшихся спанов и закрытие экспортёра"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        if self._exports:
+            await asyncio.gather(*self._exports)
+        await self.flush()
+        if self.exporter is not None:
+            await self.exporter.close()
+
+    async def flush(self):
+        spans, self._buffer = self._buffer, []
+        await self._export(spans)
+
+    async def _export(self, spans: List[Dict]):
+        if spans and self.exporter is not None:
+            try:
+                await self.exporter.export(spans)
+            except Exception as e:
+                logger.warning("Не удалось отправить %s спанов: %s", len(spans), e)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def _finish(self, span: Span):
+        span.end_ns = time.time_ns()
+        self._buffer.append(span.to_dict())
+        if len(self._buffer) >= self.batch_size and self._flusher is not None:
+            # Пачка забирается сразу, чтобы следующие спаны не запускали отправку повторно
+            spans, self._buffer = self._buffer, []
+            task = asyncio.create_task(self._export(spans))
+            self._exports.add(task)
+            task.add_done_callback(self._exports.discard)
+
+    @asynccontextmanager
+    async def trace(self, name: str, **attributes):
+        """Корневой спан новой трассы (например, на апдейт) с учётом сэмплирования"""
+        if not self.enabled or random.random() >= self.sample_rate:
+            yield None
+            return
+        span = Span(os.urandom(16).hex(), None, name, attributes)
+        async with self._activate(span):
+            yield span
+
+    @asynccontextmanager
+    async def span(self, name: str, **attributes):
+        """Дочерний спан текущей трассы; вне трассы ничего не записывается"""
+        parent = _current.get()
+        if parent is None:
+            yield None
+            return
+        span = Span(parent.trace_id, parent.span_id, name, attributes)
+        async with self._activate(span):
+            yield span
+
+    @asynccontextmanager
+    async def _activate(self, span: Span):
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            self._finish(span)
+
+
+tracer = Tracer()
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def traced(name: str):
+    """Декоратор: вызов async-функции — дочерний спан текущей трассы"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return await func(*args, **kwargs)
+            async with tracer.span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def build_trees(spans: List[Dict]) -> List[Dict]:
+    """Трассы из записей спанов: корневые спаны с вложенными 'children', по убыванию длительности"""
+    by_id = {span['span_id']: dict(span, children=[]) for span in spans}
+    roots = []
+    for span in by_id.values():
+        parent = by_id.get(span['parent_id'])
+        if parent is not None:
+            parent['children'].append(span)
+        else:
+            roots.append(span)
+    for span in by_id.values():
+        span['children'].sort(key=lambda child: child['start_ns'])
+    return sorted(roots, key=lambda root: root['duration_ms'], reverse=True)
+
+
+def format_tree(root: Dict) -> str:
+    """Текстовое дерево трассы: смещение от начала, длительность, имя и атрибуты спана"""
+    lines = []
+
+    def _walk(span: Dict, depth: int):
+        offset = (span['start_ns'] - root['start_ns']) / 1e6
+        attributes = " ".join(f"{k}={v}" for k, v in span['attributes'].items())
+        error = f" ❌ {span['error']}" if span.get('error') else ""
+        lines.append(f"{offset:>9.1f} {span['duration_ms']:>9.1f} мс  {'  ' * depth}{span['name']} {attributes}{error}")
+        for child in span['children']:
+            _walk(child, depth + 1)
+
+    _walk(root, 0)
+    return "\n".join(lines)
+
+
+def collector_app(exporter: JsonlExporter):
+    """
+    Локальная замена коллектора OpenTelemetry: принимает POST /v1/traces (OTLP/JSON)
+    и пишет спаны в JSONL в том же виде, что и JsonlExporter
+    """
+    from aiohttp import web
+
+    async def _receive(request: web.Request) -> web.Response:
+        try:
+            spans = from_otlp(await request.json())
+        except (ValueError, KeyError, TypeError):
+            return web.json_response({'error': 'bad payload'}, status=400)
+        await exporter.export(spans)
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_post("/v1/traces", _receive)
+    return app
@@ -0,0 +1,276 @@
+"""Запись входящих апдейтов и их воспроизведение через настоящий Dispatcher"""
+import asyncio
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from collections import Counter
+from contextlib import suppress
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Chat, Message, TelegramObject, Update, User
+
+from keyboards.keyboards import get_main_menu_keyboard
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Поля сообщения, которые нужны хендлерам; остальное (ответы, вложения, пересылки) не записывается
+_MESSAGE_FIELDS = ("message_id", "date", "chat", "from", "text", "entities")
+_PLACEHOLDER_TEXT = "…"
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class Anonymizer:
+    """
+    Обезличивание апдейта.
+    id пользователей и чатов заменяются на HMAC от соли (один и тот же человек получает
+    один и тот же id в пределах записи), имена и username удаляются. Текст сообщения
+    сохраняется, только если это команда (без аргументов) или кнопка главного меню.
+    """
+
+    def __init__(self, salt: str = ""):
+        self._key = salt.encode() if salt else os.urandom(16)
+        self._known_texts = {button.text for row in get_main_menu_keyboard().keyboard for button in row}
+
+    def map_id(self, value: int) -> int:
+        digest = hmac.new(self._key, str(abs(value)).encode(), hashlib.sha256).digest()
+        # 40 бит: помещается в id Telegram и почти не даёт совпадений
+        mapped = int.from_bytes(digest[:5], "big") + 1
+        return -mapped if value < 0 else mapped
+
+    def update(self, raw: Dict) -> Dict:
+        return {key: self._value(key, value) for key, value in raw.items()}
+
+    def _value(self, key: str, value: Any) -> Any:
+        if isinstance(value, dict):
+            if key in ("message", "edited_message"):
+                return self._message(value)
+            if "id" in value and ("first_name" in value or "type" in value):
+                return self._person(value)
+            return {k: self._value(k, v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._value(key, item) for item in value]
+        return value
+
+    def _person(self, person: Dict) -> Dict:
+        """Пользователь или чат: только id и служебные поля"""
+        result = {'id': self.map_id(person['id'])}
+        for field in ("is_bot", "type", "language_code"):
+            if field in person:
+                result[field] = person[field]
+        if "first_name" in person:
+            result['first_name'] = "User"
+        return result
+
+    def _message(self, message: Dict) -> Dict:
+        result = {}
+        for field in _MESSAGE_FIELDS:
+            if field in message:
+                result[field] = self._value(field, message[field])
+        text = message.get("text")
+        if text is not None:
+            if text.startswith("/"):
+                result['text'] = text.split()[0]
+                result.pop('entities', None)
+            elif text not in self._known_texts:
+                result['text'] = _PLACEHOLDER_TEXT
+                result.pop('entities', None)
+        return result
+
+
+class TrafficRecorder(BaseMiddleware):
+    """
+    Outer middleware на dp.update: записывает каждый апдейт (обезличенный) в JSONL.
+    Строка — {"t": секунды от начала записи, "u": апдейт}. Запись в файл идёт пачками в потоке.
+    """
+
+    def __init__(self, path: str, salt: str = "", batch_size: int = 256, flush_interval: float = 5.0):
+        self.path = path
+        self.anonymizer = Anonymizer(salt)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._started = time.monotonic()
+        self._buffer: List[str] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self._batch_ready = asyncio.Event()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        try:
+            self.record(event.model_dump(mode="json", exclude_none=True, by_alias=True))
+        except Exception as e:
+            logger.error("Не удалось записать апдейт: %s", e)
+        return await handler(event, data)
+
+    def record(self, raw: Dict):
+        line = {'t': round(time.monotonic() - self._started, 3), 'u': self.anonymizer.update(raw)}
+        self._buffer.append(json.dumps(line, ensure_ascii=False, separators=(",", ":")) + "\n")
+        if len(self._buffer) >= self.batch_size:
+            # Полную пачку сбрасывает фоновая задача раньше срока; без неё — close()
+            self._batch_ready.set()
+
+    def start(self):
+        """Периодический сброс записанного на диск"""
+        self._flusher = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            self._batch_ready.clear()
+            await self.flush()
+
+    async def flush(self):
+        lines, self._buffer = self._buffer, []
+        if lines:
+            await asyncio.to_thread(self._write, "".join(lines))
+
+    def _write(self, text: str):
+        with _open(self.path, "a") as file:
+            file.write(text)
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+
+
+def read_records(path: str) -> Iterator[Tuple[float, Dict]]:
+    """Записанные апдейты: пары (секунды от начала записи, апдейт)"""
+    with _open(path, "r") as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                yield record['t'], record['u']
+
+
+class StubSession(BaseSession):
+    """
+    Сессия бота без сети: считает вызовы методов Bot API и возвращает правдоподобные ответы.
+    latency — имитация задержки ответа Telegram (сек).
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._message_id = 0
+
+    async def make_request(self, bot, method, timeout: Optional[int] = None):
+        self.calls[method.__api_method__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._result(bot, method)
+
+    def _result(self, bot, method):
+        returning = method.__returning__
+        chat_id = getattr(method, "chat_id", None)
+        if returning is bool:
+            return True
+        if returning is User:
+            return User(id=bot.id, is_bot=True, first_name="Replay")
+        if Message in getattr(returning, "__args__", (returning,)):
+            if chat_id is None:
+                return True
+            self._message_id += 1
+            return Message(
+                message_id=getattr(method, "message_id", None) or self._message_id,
+                date=datetime.now(),
+                chat=Chat(id=chat_id, type="private"),
+                text=getattr(method, "text", None),
+            ).as_(bot)
+        if getattr(returning, "__origin__", None) is list:
+            return []
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        """Скачивание файла: содержимого файлов в записанном трафике нет, отдаётся пустой файл"""
+        self.calls["download"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        yield b""
+
+    async def close(self):
+        pass
+
+
+async def replay(dp, bot, records: List[Tuple[float, Dict]], speed: float = 1.0) -> Dict:
+    """
+    Воспроизведение записанных апдейтов через dp.feed_update.
+    speed — во сколько раз быстрее записи (0 — без пауз, все сразу).
+    Возвращает распределение задержек обработки и число вызовов Bot API.
+    """
+    loop = asyncio.get_running_loop()
+    latency = metrics.Histogram(window=max(1, len(records)))
+    lag = metrics.Histogram(window=max(1, len(records)))
+    errors = 0
+
+    async def _feed(raw: Dict):
+        nonlocal errors
+        update = Update.model_validate(raw, context={"bot": bot})
+        started = loop.time()
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            errors += 1
+            logger.debug("Ошибка апдейта %s: %s", raw.get('update_id'), e)
+        latency.observe(loop.time() - started)
+
+    tasks = []
+    started = loop.time()
+    first = records[0][0] if records else 0.0
+    for offset, raw in records:
+        if speed > 0:
+            due = started + (offset - first) / speed
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lag.observe(max(0.0, loop.time() - due))
+        tasks.append(asyncio.create_task(_feed(raw)))
+    await asyncio.gather(*tasks)
+
+    return {
+        'updates': len(records),
+        'errors': errors,
+        'duration': loop.time() - started,
+        'latency': {p: latency.percentile(p) for p in (50, 90, 99, 100)},
+        'mean_latency': latency.total / latency.count if latency.count else 0.0,
+        'max_lag': lag.percentile(100),
+        'api_calls': dict(bot.session.calls.most_common()) if isinstance(bot.session, StubSession) else {},
+    }
+
+
+def format_replay_report(report: Dict) -> str:
+    """Текстовый отчёт о воспроизведении"""
+    lines = [
+        f"Апдейтов: {report['updates']}, ошибок: {report['errors']}, за {report['duration']:.1f} с",
+        "Задержка обработки, мс: " + ", ".join(
+            f"{'max' if p == 100 else f'p{p}'} {value * 1000:.1f}" for p, value in report['latency'].items()
+        ) + f", среднее {report['mean_latency'] * 1000:.1f}",
+        f"Максимальное опоздание подачи апдейта: {report['max_lag'] * 1000:.1f} мс",
+        f"Вызовы Bot API: {sum(report['api_calls'].values())}",
+    ]
+    for method, count in report['api_calls'].items():
+        lines.append(f"  {method}: {count}")
+    return "\n".join(lines)